@@ -1,12 +1,16 @@
 import time
 import os
-import zipfile
-import shutil
 import asyncio
+import shutil
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, Message
-from config import DOWNLOAD_LOCATION, ADMIN
+from config import DOWNLOAD_LOCATION, ADMIN, TG_MAX_FILE_SIZE, ZIP_MODE
 from main.utils import progress_message, humanbytes
+from main.zip_builder import ZipBuilder, Member, plan_volumes, volume_paths
+from main.zip_stream import ZipStream
+from main.archive_formats import FORMATS, LEVELS
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken
 
 # Global variable to store files and user data
 user_files = {}
@@ -68,6 +72,8 @@ async def start_archive(bot, msg):
         "awaiting_zip_name": True,
         "number_zip": False,
         "use_colab": False,
+        "format": "zip",
+        "level": "normal",
         "last_msg_id": None  # to track the last status message
     }
     await msg.reply_text("🔤 **Please send the name you want for the ZIP file.**")
@@ -78,19 +84,44 @@ async def receive_zip_name(bot, msg):
     chat_id = msg.chat.id
 
     if chat_id in user_files and user_files[chat_id]["awaiting_zip_name"]:
-        zip_name = msg.text + ".zip"
-        user_files[chat_id]["zip_name"] = zip_name
-        user_files[chat_id]["awaiting_zip_name"] = False
-
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔢 Number Zipping", callback_data="number_zipping"),
-             InlineKeyboardButton("🗂️ Normal Zipping", callback_data="normal_zipping")]
-        ])
-
-        await msg.reply_text(
-            f"📦 **ZIP Name:** `{zip_name}`\nSelect your preferred zipping method:",
-            reply_markup=keyboard
-        )
+        state = user_files[chat_id]
+        state["base_name"] = msg.text
+        state["zip_name"] = msg.text + FORMATS[state["format"]]["ext"]
+        state["awaiting_zip_name"] = False
+
+        await msg.reply_text(method_text(state), reply_markup=method_keyboard(state))
+
+
+def method_text(state):
+    return f"📦 **ZIP Name:** `{state['zip_name']}`\nSelect your preferred zipping method:"
+
+
+def method_keyboard(state):
+    """Format and level pickers (✅ marks the current choice) above the method buttons"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(("✅ " if key == state["format"] else "") + fmt["label"],
+                              callback_data=f"zipfmt_{key}")
+         for key, fmt in FORMATS.items()],
+        [InlineKeyboardButton(("✅ " if key == state["level"] else "") + label,
+                              callback_data=f"ziplvl_{key}")
+         for key, label in LEVELS.items()],
+        [InlineKeyboardButton("🔢 Number Zipping", callback_data="number_zipping"),
+         InlineKeyboardButton("🗂️ Normal Zipping", callback_data="normal_zipping")]
+    ])
+
+
+@Client.on_callback_query(filters.regex(r"^zip(fmt|lvl)_"))
+async def select_format(bot, query: CallbackQuery):
+    state = user_files.get(query.message.chat.id)
+    if not state or "base_name" not in state:
+        return await query.answer("This ZIP session has expired.", show_alert=True)
+    kind, value = query.data.split("_", 1)
+    if kind == "zipfmt" and value in FORMATS:
+        state["format"] = value
+        state["zip_name"] = state["base_name"] + FORMATS[value]["ext"]
+    elif kind == "ziplvl" and value in LEVELS:
+        state["level"] = value
+    await safe_edit(query.message, method_text(state), reply_markup=method_keyboard(state))
 
 
 @Client.on_callback_query(filters.regex("number_zipping|normal_zipping"))
@@ -283,62 +314,143 @@ async def confirm_zip(bot, query: CallbackQuery):
     zip_name = user_files.get(chat_id, {}).get("zip_name", "output.zip")
     number_zip = user_files.get(chat_id, {}).get("number_zip", False)
     use_colab = user_files.get(chat_id, {}).get("use_colab", False)
+    fmt = user_files.get(chat_id, {}).get("format", "zip")
+    level = user_files.get(chat_id, {}).get("level", "normal")
 
     # Inform user ZIP creation started
     await safe_edit(query.message, "📦 **Creating your ZIP...**")
 
     zip_path = os.path.join(DOWNLOAD_LOCATION, zip_name)
-    with zipfile.ZipFile(zip_path, 'w') as archive:
-        files = user_files[chat_id]["files"]
+    files = user_files[chat_id]["files"]
+    token = CancelToken(query.message)
+    token.track(zip_path)
+    try:
+        await build_and_send(bot, query, token, chat_id, zip_name, zip_path, files, number_zip, use_colab,
+                             fmt, level)
+    except JobCancelled:
+        user_files.pop(chat_id, None)
+        await safe_edit(query.message, "🚫 **ZIP cancelled.**")
+    finally:
+        token.close()
+
+
+def member_name(idx, item, number_zip):
+    """Name of a collected message or Colab path inside the archive"""
+    if isinstance(item, str):
+        name = os.path.basename(item)
+    elif getattr(item, "photo", None):
+        name = "photo.jpg"
+    else:
+        media = item.document or item.video or item.audio
+        name = (media.file_name if media else None) or "Unknown file"
+    return f"{idx}.{name}" if number_zip else name
 
-        if use_colab:
-            for idx, file_path in enumerate(files, start=1):
-                arc_name = f"{idx}.{os.path.basename(file_path)}" if number_zip else os.path.basename(file_path)
-                archive.write(file_path, arc_name)
-        else:
-            for idx, media_msg in enumerate(files, start=1):
-                c_time = time.time()
-                file_name = f"{idx}.{media_msg.document.file_name}" if getattr(media_msg, "document", None) and number_zip else \
-                            f"{idx}.{media_msg.video.file_name}" if getattr(media_msg, "video", None) and number_zip else \
-                            f"{idx}.{media_msg.audio.file_name}" if getattr(media_msg, "audio", None) and number_zip else \
-                            (media_msg.document.file_name if getattr(media_msg, "document", None) else
-                             media_msg.video.file_name if getattr(media_msg, "video", None) else
-                             media_msg.audio.file_name if getattr(media_msg, "audio", None) else "Unknown file")
-                download_msg = f"**📥Downloading...**\n\n**📂{file_name}**"
-                file_path = await media_msg.download(progress=progress_message, progress_args=(download_msg, query.message, c_time))
-                archive.write(file_path, file_name)
-                try:
-                    os.remove(file_path)
-                except Exception:
-                    pass
-
-    # Indicate upload started (safe_edit prevents MESSAGE_NOT_MODIFIED)
-    uploading_message = await safe_edit(query.message, "🚀 **Uploading started...** 📤")
-    c_time = time.time()
-
-    # Use send_document to upload ZIP with progress callback
-    await bot.send_document(
-        chat_id,
-        document=zip_path,
-        caption=f"Here is your ZIP file: `{zip_name}`",
-        progress=progress_message,
-        progress_args=(f"📤Uploading ZIP...\n\n**📦 {zip_name}**", query.message, c_time)
-    )
 
-    # Attempt to delete the status message if it is not the original (best-effort)
-    try:
-        # If safe_edit returned a different message object (edited), delete it.
-        # If it returned the same message (no edit occurred), skip deleting to avoid removing user's message.
-        if uploading_message and uploading_message.id != query.message.id:
-            await uploading_message.delete()
-    except Exception:
-        # If deletion fails, ignore — we don't want the bot to crash for cleanup failures
-        pass
+async def build_and_send(bot, query, token, chat_id, zip_name, zip_path, files, number_zip, use_colab,
+                         fmt="zip", level="normal"):
+    members = [Member(member_name(idx, item, number_zip), item)
+               for idx, item in enumerate(files, start=1)]
+    if ZIP_MODE == "stream" and fmt == "zip" and all(m.remote for m in members):
+        return await stream_and_send(bot, query, token, chat_id, zip_name, zip_path, members)
 
-    
-    # Cleanup stored user data
-    if chat_id in user_files:
-        del user_files[chat_id]
+    builder = ZipBuilder(bot, members, query.message, token,
+                         f"📦 **Building {FORMATS[fmt]['label']}...**\n\n**📂 {zip_name}** ({len(members)} files)",
+                         fmt, level)
+    uploads = []
+
+    async def on_volume(path, number, count):
+        # 📤 Upload this volume while the builder moves on to the next
+        uploads.append(asyncio.create_task(
+            send_volume(bot, chat_id, token, path, os.path.basename(path), number, count)))
+
+    # The whole build holds one archive slot, downloads inside it still queue on "net"
+    try:
+        await scheduler.run(
+            "archive",
+            lambda: builder.build(zip_path, time.time(), on_volume, TG_MAX_FILE_SIZE, FORMATS[fmt]["ext"]),
+            name=f"zip 📦 {zip_name}",
+            on_queue=queue_notice(query.message, f"📦 ZIP • **{zip_name}**"),
+            token=token
+        )
+    except JobCancelled:
+        user_files.pop(chat_id, None)
+        return await safe_edit(query.message, "🚫 **ZIP creation cancelled.**")
+    except ValueError as e:
+        # A single file over Telegram's limit can't go into any volume
+        user_files.pop(chat_id, None)
+        return await safe_edit(query.message, f"❌ **Can't build the ZIP:** {e}")
+    finally:
+        # Volumes already handed over still finish (or stop with the token)
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+
+    user_files.pop(chat_id, None)
+    if token.cancelled:
+        return await safe_edit(query.message, "🚫 **Upload cancelled.**")
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        return await safe_edit(query.message, f"❌ **Upload failed:** {failed[0]}")
+    await safe_edit(query.message, f"✅ **ZIP sent in {len(uploads)} volumes.**" if len(uploads) > 1
+                    else "✅ **ZIP sent.**")
+
+
+async def stream_and_send(bot, query, token, chat_id, zip_name, zip_path, members):
+    """
+    Zero-disk /zip: every volume is a ZipStream that the upload pulls from
+    the members' downloads, so neither the files nor the archive are saved.
+    """
+    try:
+        volumes = plan_volumes(members, TG_MAX_FILE_SIZE)
+    except ValueError as e:
+        user_files.pop(chat_id, None)
+        return await safe_edit(query.message, f"❌ **Can't build the ZIP:** {e}")
+    names = [os.path.basename(p) for p in volume_paths(zip_path, len(volumes))]
+    await safe_edit(query.message, f"📦 **Streaming {zip_name} into the upload...**")
+
+    results = await asyncio.gather(*[
+        send_volume(bot, chat_id, token,
+                    ZipStream(bot, [members[i] for i in indexes], name),
+                    name, number, len(volumes))
+        for number, (indexes, name) in enumerate(zip(volumes, names), start=1)
+    ], return_exceptions=True)
+
+    user_files.pop(chat_id, None)
+    if token.cancelled:
+        return await safe_edit(query.message, "🚫 **Upload cancelled.**")
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        return await safe_edit(query.message, f"❌ **Upload failed:** {failed[0]}")
+    await safe_edit(query.message, f"✅ **ZIP sent in {len(volumes)} volumes.**" if len(volumes) > 1
+                    else "✅ **ZIP sent.**")
+
+
+async def send_volume(bot, chat_id, token, document, name, number, count):
+    """Upload one finished volume (a local path or a ZipStream) with its own status"""
+    status = await bot.send_message(chat_id, f"🚀 **Uploading volume {number}/{count}...** 📤")
+    token.bind(status)
+    try:
+        await scheduler.run(
+            "net",
+            lambda: bot.send_document(
+                chat_id,
+                document=document,
+                file_name=name,
+                caption=f"Here is your ZIP file: `{name}`" if count == 1
+                else f"Here is your ZIP file: `{name}` ({number}/{count})",
+                progress=progress_message,
+                progress_args=(f"📤Uploading ZIP...\n\n**📦 {name}**", status, time.time())
+            ),
+            name=f"zip ⬆️ {name}",
+            on_queue=queue_notice(status, f"📤 Upload • **{name}**"),
+            token=token
+        )
+    finally:
+        # Volumes go as soon as they are sent, only the one being written stays on disk
+        if isinstance(document, str) and os.path.exists(document):
+            os.remove(document)
+        try:
+            await status.delete()
+        except Exception:
+            pass
 
 
 @Client.on_callback_query(filters.regex("cancel_collecting"))
@@ -1,5 +1,6 @@
 from pyrogram import Client
 from config import *
+from main.tg_upload import upload_file
 import os
 
 
@@ -23,10 +24,18 @@ class Bot(Client):
         me = await self.get_me()
         print(f"{me.first_name} | @{me.username} 𝚂𝚃𝙰𝚁𝚃𝙴𝙳...⚡️")
 
+    async def save_file(self, path, file_id=None, file_part=0, progress=None, progress_args=()):
+        # Every send_video / send_document / send_audio uploads through here
+        return await upload_file(self, path, file_id=file_id, file_part=file_part,
+                                 progress=progress, progress_args=progress_args)
+
     async def stop(self, *args):
         await super().stop()
         print("Bot Restarting........")
 
 
-bot = Bot()
-bot.run()
+# Compression workers re-import this file as __mp_main__, which must not
+# start a second client
+if __name__ == "__main__":
+    bot = Bot()
+    bot.run()
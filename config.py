@@ -7,7 +7,44 @@ BOT_TOKEN = environ.get(
     "7662948776:AAGu_vIuk89zmRdCc_96pH8wJR_bxcD_Zck")
 TG_MAX_FILE_SIZE = 2097152000  # 2GB for Telegram
 CHUNK_SIZE = 1024 * 1024  # 1MB
+# Parallel MTProto media sessions used by main.tg_download.fast_download
+DOWNLOAD_CONNECTIONS = int(environ.get("DOWNLOAD_CONNECTIONS", "4"))
+# Parallel upload sessions and max big-file parts in flight (main.tg_upload)
+UPLOAD_CONNECTIONS = int(environ.get("UPLOAD_CONNECTIONS", "4"))
+UPLOAD_WINDOW = int(environ.get("UPLOAD_WINDOW", "16"))
+# 1MB parts kept in memory ahead of the uploader when streaming
+STREAM_BUFFER_PARTS = int(environ.get("STREAM_BUFFER_PARTS", "8"))
+# "stream" pipes /rename straight from download into upload, "disk" saves first
+RENAME_MODE = environ.get("RENAME_MODE", "stream")
+# "smart" re-encodes only up to the first keyframe of a trim, "fast" stream-copies
+TRIM_MODE = environ.get("TRIM_MODE", "smart")
+# Trims covering at most this share of a video are cut over byte ranges, 0 = off
+TRIM_RANGED_SHARE = float(environ.get("TRIM_RANGED_SHARE", "0.5"))
+# "stream" sends /zip of Telegram files as a STORED archive built on the fly, "disk" packs locally
+ZIP_MODE = environ.get("ZIP_MODE", "stream")
+# "stream" lists /getsub tracks from the header and pipes the download into ffmpeg
+GETSUB_MODE = environ.get("GETSUB_MODE", "stream")
+# Disk budget of the shared media cache (main.media_cache), default 10GB
+CACHE_MAX_SIZE = int(environ.get("CACHE_MAX_SIZE", str(10 * 1024 ** 3)))
+# Bytes /info may fetch in ranges before it falls back to a full download
+INFO_RANGE_BUDGET = int(environ.get("INFO_RANGE_BUDGET", str(32 * 1024 ** 2)))
+# Concurrent jobs per scheduler lane (main.scheduler)
+NET_JOBS = int(environ.get("NET_JOBS", "3"))
+FFMPEG_JOBS = int(environ.get("FFMPEG_JOBS", "2"))
+WHISPER_JOBS = int(environ.get("WHISPER_JOBS", "1"))
+ARCHIVE_JOBS = int(environ.get("ARCHIVE_JOBS", "1"))
+# Processes compressing tar.zst / tar.xz blocks for /zip (main.archive_formats), 0 = one per core
+COMPRESS_PROCESSES = int(environ.get("COMPRESS_PROCESSES", "0"))
+# Threads extracting /unzip members at once (main.extractor)
+EXTRACT_THREADS = int(environ.get("EXTRACT_THREADS", "4"))
+# Largest total uncompressed size an archive may declare before extraction is refused
+EXTRACT_MAX_SIZE = int(environ.get("EXTRACT_MAX_SIZE", str(20 * 1024 ** 3)))
+# Status message edit budget shared by all jobs (main.progress_hub)
+PROGRESS_CHAT_EDITS_PER_MIN = int(environ.get("PROGRESS_CHAT_EDITS_PER_MIN", "20"))
+PROGRESS_GLOBAL_EDITS_PER_SEC = int(environ.get("PROGRESS_GLOBAL_EDITS_PER_SEC", "20"))
 PROCESS_MAX_TIMEOUT = 300  # 5 minutes
+# ffmpeg/ffprobe processes allowed at once (main.ffmpeg_runner)
+MEDIA_PROCESSES = int(environ.get("MEDIA_PROCESSES", "4"))
 CAPTION = "{file_name}\n\n💽 size: {file_size}\n🕒 duration: {duration} seconds"
 ADMIN = int(environ.get("ADMIN", "5380833276"))
 CAPTION = environ.get("CAPTION", "video")
@@ -0,0 +1,194 @@
+# main/archive_formats.py
+import os
+import lzma
+import tarfile
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import COMPRESS_PROCESSES
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # tar.zst is only offered when it is installed
+
+# Bytes copied into the archive per read
+PACK_CHUNK = 1024 * 1024
+
+# Input compressed per job in the process pool. Every block becomes a
+# complete xz stream / zstd frame, and those concatenate into a valid file
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# Already compressed, DEFLATE would only burn CPU on these
+STORED_EXTS = {
+    ".mp4", ".mkv", ".avi", ".mov", ".webm", ".m4v", ".ts", ".flv", ".wmv",
+    ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".wma",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".zip", ".rar", ".7z", ".gz", ".bz2", ".xz", ".zst", ".apk", ".pdf", ".docx", ".xlsx",
+}
+
+# key -> button label, file extension and the level behind each level button
+FORMATS = {
+    "zip": {"label": "ZIP", "ext": ".zip", "levels": {"fast": 1, "normal": 6, "max": 9}},
+    "zst": {"label": "TAR.ZST", "ext": ".tar.zst", "levels": {"fast": 3, "normal": 9, "max": 19}},
+    "xz": {"label": "TAR.XZ", "ext": ".tar.xz", "levels": {"fast": 1, "normal": 6, "max": 9}},
+}
+if zstandard is None:
+    del FORMATS["zst"]
+
+LEVELS = {"fast": "⚡ Fast", "normal": "⚖️ Normal", "max": "🗜 Max"}
+
+WORKERS = COMPRESS_PROCESSES or os.cpu_count() or 1
+
+_pool = None
+
+
+def compress_pool():
+    """WORKERS compression processes, started on first use"""
+    global _pool
+    if _pool is None:
+        # Forking the threaded bot process can copy a held lock into the
+        # child, so workers come from a forkserver instead. They import
+        # bot.py (guarded) and this module, which keeps to config and the
+        # stdlib so they start clean
+        _pool = ProcessPoolExecutor(
+            max_workers=WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _pool
+
+
+def compress_block(codec, data, level):
+    """Runs in a pool worker: one self-contained xz stream or zstd frame"""
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    lzma_filter = {"id": lzma.FILTER_LZMA2, "preset": level}
+    if level >= 7:
+        # Presets 7-9 only grow the dictionary, which can't help past one block
+        lzma_filter["dict_size"] = BLOCK_SIZE
+    return lzma.compress(data, format=lzma.FORMAT_XZ, filters=[lzma_filter])
+
+
+class BlockCompressor:
+    """
+    Write-only file object that cuts what it gets into BLOCK_SIZE blocks,
+    compresses them in parallel on the process pool and writes the results
+    to `fp` in order. At most two blocks per worker are held at once.
+    """
+
+    def __init__(self, fp, codec, level):
+        self.fp = fp
+        self.codec = codec
+        self.level = level
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.max_pending = 2 * WORKERS
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= BLOCK_SIZE:
+            self._submit(bytes(self.buffer[:BLOCK_SIZE]))
+            del self.buffer[:BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block):
+        self.pending.append(compress_pool().submit(compress_block, self.codec, block, self.level))
+        while len(self.pending) > self.max_pending:
+            self.fp.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.pending:
+            self.fp.write(self.pending.popleft().result())
+
+
+class _Counting:
+    """Source file that reports what was read into member.packed"""
+
+    def __init__(self, fp, member):
+        self.fp = fp
+        self.member = member
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.member.packed += len(data)
+        return data
+
+
+def compression_for(name):
+    ext = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+
+
+def _set_level(info, level):
+    # open(info, "w") takes the level from the ZipInfo, not the ZipFile;
+    # the attribute only became public in Python 3.13
+    if hasattr(info, "compress_level"):
+        info.compress_level = level
+    else:
+        info._compresslevel = level
+
+
+class ZipWriter:
+    """zip64 archive, media STORED and everything else DEFLATE'd at `level`"""
+
+    def __init__(self, path, level):
+        self.level = level
+        self.archive = zipfile.ZipFile(path, "w", allowZip64=True)
+
+    def add(self, path, member):
+        info = zipfile.ZipInfo.from_file(path, member.arc_name)
+        info.compress_type = compression_for(member.arc_name)
+        _set_level(info, self.level)
+        with open(path, "rb") as src, self.archive.open(info, "w", force_zip64=True) as dst:
+            while True:
+                chunk = src.read(PACK_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                member.packed += len(chunk)
+
+    def close(self):
+        self.archive.close()
+
+
+class TarWriter:
+    """tar stream compressed on every core through a BlockCompressor"""
+
+    def __init__(self, path, codec, level):
+        self.fp = open(path, "wb")
+        self.out = BlockCompressor(self.fp, codec, level)
+        self.archive = tarfile.open(fileobj=self.out, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, path, member):
+        info = self.archive.gettarinfo(path, member.arc_name)
+        with open(path, "rb") as src:
+            self.archive.addfile(info, _Counting(src, member))
+
+    def close(self):
+        try:
+            self.archive.close()
+            self.out.close()
+        finally:
+            self.fp.close()
+
+
+def open_archive(fmt, path, level):
+    """Writer with add(path, member) / close(), both blocking"""
+    level = FORMATS[fmt]["levels"][level]
+    if fmt == "zip":
+        return ZipWriter(path, level)
+    return TarWriter(path, fmt, level)
+
+
+def worst_size(fmt, member):
+    """Upper bound of the bytes `member` adds to an archive of `fmt`"""
+    if fmt == "zip":
+        deflated = compression_for(member.arc_name) == zipfile.ZIP_DEFLATED
+        # DEFLATE adds 5 bytes per 16KB stored block on incompressible data
+        return member.worst_size + (member.size // 3000 if deflated else 0)
+    # tar header, padding and pax name records, plus xz/zstd framing
+    return member.worst_size + 2048 + member.size // 200
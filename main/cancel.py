@@ -0,0 +1,123 @@
+# main/cancel.py
+import os
+import signal
+import shutil
+import threading
+from pyrogram import Client, filters
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from main.scheduler import scheduler, JobCancelled
+
+# (chat_id, message_id) of a status message -> CancelToken
+_tokens = {}
+
+
+def _key(message):
+    chat = getattr(message, "chat", None)
+    if chat is None or not hasattr(message, "id"):
+        return None
+    return (chat.id, message.id)
+
+
+def get_token(message):
+    """Token bound to a status message, if an operation is running on it"""
+    key = _key(message)
+    return _tokens.get(key) if key else None
+
+
+def cancel_markup(message):
+    """Same Cancel button progress_message shows, for non-transfer stages"""
+    token = get_token(message)
+    if not token or token.cancelled:
+        return None
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🚫 Cancel", callback_data="del")]])
+
+
+def kill_tree(proc):
+    """Kill a process started with start_new_session=True and all its children"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CancelToken:
+    """
+    One per user-visible operation. Scheduler jobs, subprocesses and scratch
+    files register here, so pressing Cancel on any bound status message stops
+    the transfer, kills ffmpeg/rclone and frees the disk in one go.
+    """
+
+    def __init__(self, *messages):
+        # threading.Event so Whisper / yt-dlp worker threads can poll it
+        self.event = threading.Event()
+        self.keys = set()
+        self.jobs = set()
+        self.procs = set()
+        self.paths = set()
+        for message in messages:
+            self.bind(message)
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise JobCancelled()
+
+    def bind(self, message):
+        """Let the Cancel button on `message` reach this token"""
+        key = _key(message)
+        if key:
+            self.keys.add(key)
+            _tokens[key] = self
+        return message
+
+    def track(self, path):
+        """Scratch file/folder to delete as soon as the operation is cancelled"""
+        self.paths.add(path)
+        return path
+
+    def untrack(self, path):
+        self.paths.discard(path)
+
+    def cancel(self):
+        if self.event.is_set():
+            return
+        self.event.set()
+        for proc in list(self.procs):
+            kill_tree(proc)
+        for job in list(self.jobs):
+            scheduler.cancel(job)
+        for path in list(self.paths):
+            _remove(path)
+        self.paths.clear()
+
+    def close(self):
+        """Forget the bound messages once the operation is over"""
+        for key in self.keys:
+            if _tokens.get(key) is self:
+                del _tokens[key]
+        self.keys.clear()
+
+
+# 🚫 Cancel button from main.utils.progress_message
+# Runs before start_text's close handler; plain "Close" buttons fall through
+@Client.on_callback_query(filters.regex(r"^del$"), group=-1)
+async def cancel_button(bot, cb):
+    token = get_token(cb.message)
+    if not token:
+        return
+    token.cancel()
+    await cb.answer("🚫 Cancelling...")
+    cb.stop_propagation()
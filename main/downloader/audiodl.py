@@ -3,20 +3,22 @@
 import os
 import time
 import asyncio
-import requests
 import yt_dlp as youtube_dl
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from moviepy.editor import AudioFileClip
-from PIL import Image
 from config import DOWNLOAD_LOCATION
 from main.utils import progress_message, humanbytes
 from main.downloader.progress_hook import YTDLProgress
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken
+from main.probe import probe
+from main.thumbgen import url_thumbnail
 
 
 # 🎧 Callback for Audio Download Button
 @Client.on_callback_query(filters.regex(r'^audio_'))
 async def audio_callback_handler(bot, query):
+    token = CancelToken(query.message)
     try:
         data = query.data.split('_')
         format_id = data[1]
@@ -43,7 +45,8 @@ async def audio_callback_handler(bot, query):
             bot=bot,
             chat_id=query.message.chat.id,
             prefix_text=f"📥 **Downloading Audio...**\n\n🎧 **{title}**",
-            edit_msg=query.message
+            edit_msg=query.message,
+            token=token
         )
         await progress.start_updater()
 
@@ -67,7 +70,17 @@ async def audio_callback_handler(bot, query):
 
         loop = asyncio.get_event_loop()
         try:
-            info_dict, downloaded_path = await loop.run_in_executor(None, download_audio)
+            info_dict, downloaded_path = await scheduler.run(
+                "net",
+                lambda: loop.run_in_executor(None, download_audio),
+                name=f"audio ⬇️ {title}",
+                on_queue=queue_notice(query.message, f"📥 Download • **{title}**"),
+                token=token
+            )
+        except JobCancelled:
+            await progress.stop_updater()
+            await query.message.edit_caption(caption="🚫 **Audio download cancelled.**")
+            return
         except Exception as e:
             await progress.stop_updater()
             await query.message.edit_caption(
@@ -78,34 +91,14 @@ async def audio_callback_handler(bot, query):
 
         await progress.stop_updater()
         await query.message.delete()
+        token.track(downloaded_path)
 
         # Get audio duration & size
-        try:
-            final_size = os.path.getsize(downloaded_path)
-            audio = AudioFileClip(downloaded_path)
-            duration = int(audio.duration)
-            filesize = humanbytes(final_size)
-            audio.close()
-        except Exception:
-            duration = 0
-            filesize = humanbytes(os.path.getsize(downloaded_path))
-
-        # Download thumbnail if available
-        thumb_path = None
-        thumb_url = info_dict.get('thumbnail', None)
-        if thumb_url:
-            try:
-                resp = requests.get(thumb_url)
-                if resp.status_code == 200:
-                    thumb_path = os.path.join(DOWNLOAD_LOCATION, 'audio_thumb.jpg')
-                    with open(thumb_path, 'wb') as f:
-                        f.write(resp.content)
-                    # Resize for upload
-                    with Image.open(thumb_path) as img:
-                        img.thumbnail((320, 320))
-                        img.save(thumb_path)
-            except Exception:
-                thumb_path = None
+        duration = (await probe(downloaded_path)).seconds
+        filesize = humanbytes(os.path.getsize(downloaded_path))
+
+        # Download thumbnail if available, cached by main.thumbgen
+        thumb_path = await url_thumbnail(info_dict.get('thumbnail', None))
 
         # Send upload message
         upload_caption = f"🚀 **Uploading Audio...**\n\n🎧 **{info_dict['title']}**"
@@ -122,20 +115,31 @@ async def audio_callback_handler(bot, query):
                 text=upload_caption,
                 parse_mode=enums.ParseMode.MARKDOWN
             )
+        token.bind(upload_msg)
 
         # Upload as audio
         try:
-            await bot.send_audio(
-                query.message.chat.id,
-                audio=downloaded_path,
-                thumb=thumb_path if thumb_path and os.path.exists(thumb_path) else None,
-                caption=f"**🎧 {info_dict['title']} | [🔗 URL]({url})**\n\n🗂 **{filesize}**",
-                duration=duration,
-                progress=progress_message,
-                progress_args=(f"**📤 Uploading...**\n\n🎧 **{info_dict['title']}**", upload_msg, time.time()),
-                parse_mode=enums.ParseMode.MARKDOWN
+            await scheduler.run(
+                "net",
+                lambda: bot.send_audio(
+                    query.message.chat.id,
+                    audio=downloaded_path,
+                    thumb=thumb_path if thumb_path and os.path.exists(thumb_path) else None,
+                    caption=f"**🎧 {info_dict['title']} | [🔗 URL]({url})**\n\n🗂 **{filesize}**",
+                    duration=duration,
+                    progress=progress_message,
+                    progress_args=(f"**📤 Uploading...**\n\n🎧 **{info_dict['title']}**", upload_msg, time.time()),
+                    parse_mode=enums.ParseMode.MARKDOWN
+                ),
+                name=f"audio ⬆️ {info_dict['title']}",
+                on_queue=queue_notice(upload_msg, f"📤 Upload • **{info_dict['title']}**"),
+                token=token
             )
+            token.check()
             await upload_msg.delete()
+        except JobCancelled:
+            await upload_msg.edit_caption(caption="🚫 **Audio upload cancelled.**")
+            return
         except Exception as e:
             await upload_msg.edit_caption(
                 caption=f"❌ **Error during audio upload:** {str(e)}",
@@ -146,8 +150,8 @@ async def audio_callback_handler(bot, query):
         # Cleanup
         if os.path.exists(downloaded_path):
             os.remove(downloaded_path)
-        if thumb_path and os.path.exists(thumb_path):
-            os.remove(thumb_path)
 
     except Exception as e:
         await query.message.reply_text(f"❌ **Unexpected error:** {str(e)}", parse_mode=enums.ParseMode.MARKDOWN)
+    finally:
+        token.close()
@@ -1,15 +1,17 @@
 import time
 import os
-import subprocess
+import asyncio
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from yt_dlp import YoutubeDL
 from config import DOWNLOAD_LOCATION, ADMIN
 from main.utils import progress_message, humanbytes
-from moviepy.editor import VideoFileClip
-import ffmpeg
 import requests
 from pyrogram.errors import MessageNotModified
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken
+from main.ffmpeg_runner import run_media, probe_json
+from main.thumbgen import video_thumbnail, url_thumbnail
 
 # Temporary storage for callback query data
 callback_data_store = {}
@@ -17,13 +19,21 @@ callback_data_store = {}
 # Function to download Dailymotion videos
 
 
-def download_dailymotion(url):
+def download_dailymotion(url, token=None):
+    def stop_hook(d):
+        # Runs in the yt-dlp thread, raising here aborts the download
+        if token and token.cancelled:
+            if d.get("tmpfilename") and os.path.exists(d["tmpfilename"]):
+                os.remove(d["tmpfilename"])
+            raise JobCancelled()
+
     ydl_opts = {
         'format': 'best',
         'outtmpl': f'{DOWNLOAD_LOCATION}/%(title)s.%(ext)s',
         'noplaylist': True,
         'quiet': True,
         'no_warnings': True,
+        'progress_hooks': [stop_hook],
     }
     with YoutubeDL(ydl_opts) as ydl:
         info = ydl.extract_info(url, download=True)
@@ -38,11 +48,11 @@ def download_dailymotion(url):
 # Function to extract audio streams from video
 
 
-async def extract_audio(video_path, video_title, sts, bot, msg):
+async def extract_audio(video_path, video_title, sts, bot, msg, token=None):
     extract_dir = os.path.dirname(video_path) + "/extract"
     os.makedirs(extract_dir, exist_ok=True)
 
-    video_streams_data = ffmpeg.probe(video_path)
+    video_streams_data = await probe_json(video_path, "-show_streams", token=token)
     audios = []
     audio_duration = 0
 
@@ -57,7 +67,15 @@ async def extract_audio(video_path, video_title, sts, bot, msg):
             "-map", f"0:{audio['index']}", "-c", "copy",
             f"{extract_dir}/{video_title}.mka"
         ]
-        subprocess.call(extract_cmd)
+        if token:
+            token.track(f"{extract_dir}/{video_title}.mka")
+        await scheduler.run(
+            "ffmpeg",
+            lambda: run_media(extract_cmd, token),
+            name=f"daily 🎧 {video_title}",
+            on_queue=queue_notice(sts, f"🎧 Extract audio • **{video_title}**"),
+            token=token
+        )
 
     extracted_audio_path = f"{extract_dir}/{video_title}.mka"
     if os.path.exists(extracted_audio_path):
@@ -75,37 +93,11 @@ async def extract_audio(video_path, video_title, sts, bot, msg):
             progress_args=(f"🎧 Uploading {video_title}.mka... 📤", sts, c_time),
         )
         os.remove(extracted_audio_path)
+        if token:
+            token.check()
     else:
         await sts.edit(f"❌ Failed to extract audio from {video_title}")
 
-# Function to generate thumbnail from video
-
-
-def generate_thumbnail(video_path):
-    thumbnail_path = f"{video_path}_thumbnail.jpg"
-    try:
-        video_clip = VideoFileClip(video_path)
-        video_clip.save_frame(thumbnail_path, t=video_clip.duration / 2)
-        video_clip.close()
-        return thumbnail_path
-    except Exception as e:
-        print(f"Error generating thumbnail: {e}")
-        return None
-
-# Function to download thumbnail from a URL
-
-
-def download_thumbnail(thumbnail_url, title):
-    if not thumbnail_url:
-        return None
-    thumbnail_path = f"{DOWNLOAD_LOCATION}/{title}_thumbnail.jpg"
-    response = requests.get(thumbnail_url)
-    if response.status_code == 200:
-        with open(thumbnail_path, 'wb') as f:
-            f.write(response.content)
-        return thumbnail_path
-    return None
-
 # Function to extract and download images from a Facebook post
 
 
@@ -175,12 +167,19 @@ async def method_selection(bot, callback_query):
 
 async def process_dailymotion_download(bot, msg, urls, method):
     for url in urls:
+        token = CancelToken()
         try:
-            downloading_message = await msg.reply_text("📥 Starting download... 🔄")
+            downloading_message = token.bind(await msg.reply_text("📥 Starting download... 🔄"))
             c_time = time.time()
 
-            downloaded, video_title, duration, file_size, resolution, thumbnail_url = download_dailymotion(
-                url)
+            downloaded, video_title, duration, file_size, resolution, thumbnail_url = await scheduler.run(
+                "net",
+                lambda: asyncio.to_thread(download_dailymotion, url, token),
+                name=f"daily ⬇️ {url}",
+                on_queue=queue_notice(downloading_message, f"📥 Download • {url}"),
+                token=token
+            )
+            token.track(downloaded)
             human_size = humanbytes(file_size)
 
             # Update download progress safely
@@ -191,37 +190,46 @@ async def process_dailymotion_download(bot, msg, urls, method):
             except MessageNotModified:
                 pass
 
-            thumbnail_path = download_thumbnail(thumbnail_url, video_title)
-            if not thumbnail_path:
-                thumbnail_path = generate_thumbnail(downloaded)
+            # Cached by main.thumbgen, not ours to delete
+            thumbnail_path = (await url_thumbnail(thumbnail_url)
+                              or await video_thumbnail(downloaded, token=token))
 
             await downloading_message.delete()
-            uploading_message = await msg.reply_text(f"🚀 Uploading: {video_title}... 📤")
+            uploading_message = token.bind(await msg.reply_text(f"🚀 Uploading: {video_title}... 📤"))
             c_time = time.time()
 
-            await bot.send_video(
-                msg.chat.id,
-                video=downloaded,
-                thumb=thumbnail_path if thumbnail_path else None,
-                caption=(
-                    f"🎬 **{video_title}**\n\n"
-                    f"💽 Size: {human_size}\n"
-                    f"🕒 Duration: {duration // 60} mins {duration % 60} secs\n"
-                    f"📹 Resolution: {resolution}p"
+            await scheduler.run(
+                "net",
+                lambda: bot.send_video(
+                    msg.chat.id,
+                    video=downloaded,
+                    thumb=thumbnail_path if thumbnail_path else None,
+                    caption=(
+                        f"🎬 **{video_title}**\n\n"
+                        f"💽 Size: {human_size}\n"
+                        f"🕒 Duration: {duration // 60} mins {duration % 60} secs\n"
+                        f"📹 Resolution: {resolution}p"
+                    ),
+                    duration=duration,
+                    progress=progress_message,
+                    progress_args=(f"🚀 Uploading Started\n\n🎬 {video_title} 📤", uploading_message, c_time),
                 ),
-                duration=duration,
-                progress=progress_message,
-                progress_args=(f"🚀 Uploading Started\n\n🎬 {video_title} 📤", uploading_message, c_time),
+                name=f"daily ⬆️ {video_title}",
+                on_queue=queue_notice(uploading_message, f"📤 Upload • **{video_title}**"),
+                token=token
             )
+            token.check()
 
             if method == "with_audio":
-                await extract_audio(downloaded, video_title, uploading_message, bot, msg)
+                await extract_audio(downloaded, video_title, uploading_message, bot, msg, token)
 
             os.remove(downloaded)
-            if thumbnail_path:
-                os.remove(thumbnail_path)
 
+        except JobCancelled:
+            await msg.reply(f"🚫 Cancelled {url}")
         except Exception as e:
             await msg.reply(f"❌ Failed to process {url}. Error: {str(e)}")
+        finally:
+            token.close()
 
     await msg.reply_text("🎉 All URLs processed successfully!")
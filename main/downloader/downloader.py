@@ -6,13 +6,15 @@ import requests
 import yt_dlp as youtube_dl
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from moviepy.editor import VideoFileClip
-from PIL import Image
 from config import DOWNLOAD_LOCATION, ADMIN, TELEGRAPH_IMAGE_URL
-from main.utils import progress_message, humanbytes
+from main.utils import progress_message, encode_progress, humanbytes
 from main.downloader.ytdl_text import YTDL_WELCOME_TEXT
 from main.downloader.progress_hook import YTDLProgress
-from main.downloader.ytsplit import split_video
+from main.downloader.ytsplit import split_and_upload
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken
+from main.probe import probe
+from main.thumbgen import url_thumbnail, video_thumbnail
 import nest_asyncio
 
 nest_asyncio.apply()
@@ -147,6 +149,17 @@ async def youtube_link_handler(bot, msg):
 # Callback handler for download
 @Client.on_callback_query(filters.regex(r'^(yt|audio)_'))
 async def yt_callback_handler(bot, query):
+    # 🚫 Cancel on any status message of this download stops the whole chain
+    token = CancelToken(query.message)
+    try:
+        await run_yt_download(bot, query, token)
+    except JobCancelled:
+        await bot.send_message(query.message.chat.id, "🚫 **Download cancelled.**")
+    finally:
+        token.close()
+
+
+async def run_yt_download(bot, query, token):
     data = query.data.split('_')
     format_id = data[1]
     resolution = data[2]
@@ -167,7 +180,8 @@ async def yt_callback_handler(bot, query):
         bot=bot,
         chat_id=query.message.chat.id,
         prefix_text=f"📥 **Downloading...**\n\n🎞 **{title}**\n\n📹 **{resolution}**",
-        edit_msg=query.message
+        edit_msg=query.message,
+        token=token
     )
 
     await progress.start_updater()
@@ -191,7 +205,17 @@ async def yt_callback_handler(bot, query):
 
     loop = asyncio.get_event_loop()
     try:
-        info_dict, downloaded_path = await loop.run_in_executor(None, download_video)
+        info_dict, downloaded_path = await scheduler.run(
+            "net",
+            lambda: loop.run_in_executor(None, download_video),
+            name=f"ytdl ⬇️ {title}",
+            on_queue=queue_notice(query.message, f"📥 Download • **{title}**"),
+            token=token
+        )
+    except JobCancelled:
+        await progress.stop_updater()
+        await query.message.edit_caption(caption="🚫 **Download cancelled.**")
+        return
     except Exception as e:
         await progress.stop_updater()
         await query.message.edit_caption(
@@ -203,41 +227,25 @@ async def yt_callback_handler(bot, query):
     await progress.stop_updater()
     await query.message.delete()
 
+    # Scratch copy goes as soon as a later stage is cancelled
+    if not store_colab_state.get(query.message.chat.id, False):
+        token.track(downloaded_path)
+
     # Process video info
     try:
         final_size = os.path.getsize(downloaded_path)
-        video = VideoFileClip(downloaded_path)
-        duration = int(video.duration)
-        video_width, video_height = video.size
+        info = await probe(downloaded_path, token=token)
+        duration = info.seconds
+        video_width, video_height = info.width, info.height
         filesize = humanbytes(final_size)
-        video.close()
     except Exception as e:
         await bot.send_message(query.message.chat.id, f"❌ **Error processing video:** {str(e)}")
         return
 
-    # Thumbnail
-    thumb_path = None
-    thumb_url = info_dict.get('thumbnail', None)
-    if thumb_url:
-        resp = requests.get(thumb_url)
-        if resp.status_code == 200:
-            thumb_path = os.path.join(DOWNLOAD_LOCATION, 'upload_thumb.jpg')
-            with open(thumb_path, 'wb') as f:
-                f.write(resp.content)
-            try:
-                with Image.open(thumb_path) as img:
-                    img_width, img_height = img.size
-                    scale_factor = max(video_width / img_width, video_height / img_height)
-                    new_size = (int(img_width * scale_factor), int(img_height * scale_factor))
-                    img = img.resize(new_size, Image.LANCZOS)
-                    left = (img.width - video_width) / 2
-                    top = (img.height - video_height) / 2
-                    right = (img.width + video_width) / 2
-                    bottom = (img.height + video_height) / 2
-                    img = img.crop((left, top, right, bottom))
-                    img.save(thumb_path, "JPEG")
-            except:
-                thumb_path = None
+    # Thumbnail, cropped to the video's shape and cached by main.thumbgen
+    thumb_path = (await url_thumbnail(info_dict.get('thumbnail', None),
+                                      aspect=(video_width, video_height))
+                  or await video_thumbnail(downloaded_path, token=token))
 
     # ================= SPLIT CHECK =================
     if final_size > 2 * 1024 * 1024 * 1024:
@@ -263,22 +271,12 @@ async def yt_callback_handler(bot, query):
                 split_caption,
                 parse_mode=enums.ParseMode.MARKDOWN
             )
+        token.bind(split_msg)
 
-        from main.downloader.ytsplit import split_video
         split_folder = os.path.join(DOWNLOAD_LOCATION, "splitted")
 
-        parts = await loop.run_in_executor(None, split_video, downloaded_path, split_folder)
-
-        await split_msg.edit_caption(
-            caption=f"✅ **Splitting Completed**\n\n📦 **Total Parts:** {len(parts)}",
-            parse_mode=enums.ParseMode.MARKDOWN
-        )
-
-        await asyncio.sleep(2)
-        await split_msg.delete()
-
-        # Upload parts
-        for part in parts:
+        # Each part goes up as soon as ffmpeg closes it, and is deleted after
+        async def upload_part(part, number, total, part_duration):
             part_name = os.path.basename(part)
             part_size = humanbytes(os.path.getsize(part))
 
@@ -286,41 +284,61 @@ async def yt_callback_handler(bot, query):
                 upload_msg = await bot.send_photo(
                     query.message.chat.id,
                     photo=thumb_path,
-                    caption=f"🚀 **Uploading...**\n\n🎞 **{part_name}**",
+                    caption=f"🚀 **Uploading part {number}/{total}...**\n\n🎞 **{part_name}**",
                     parse_mode=enums.ParseMode.MARKDOWN
                 )
             else:
                 upload_msg = await bot.send_message(
                     query.message.chat.id,
-                    f"🚀 **Uploading...**\n\n🎞 **{part_name}**",
+                    f"🚀 **Uploading part {number}/{total}...**\n\n🎞 **{part_name}**",
                     parse_mode=enums.ParseMode.MARKDOWN
                 )
+            token.bind(upload_msg)
 
-            await bot.send_video(
-                query.message.chat.id,
-                video=part,
-                thumb=thumb_path,
-                duration=duration,
-                caption=f"**🎞 {part_name} | [🔗 URL]({url})**\n\n📦 **{part_size}**",
-                progress=progress_message,
-                progress_args=(f"📤 **Uploading {part_name}...**", upload_msg, time.time()),
-                parse_mode=enums.ParseMode.MARKDOWN
+            await scheduler.run(
+                "net",
+                lambda: bot.send_video(
+                    query.message.chat.id,
+                    video=part,
+                    thumb=thumb_path,
+                    duration=int(part_duration),
+                    caption=f"**🎞 {part_name} | [🔗 URL]({url})**\n\n📦 **{part_size}**",
+                    progress=progress_message,
+                    progress_args=(f"📤 **Uploading {part_name}...**", upload_msg, time.time()),
+                    parse_mode=enums.ParseMode.MARKDOWN
+                ),
+                name=f"ytdl ⬆️ {part_name}",
+                on_queue=queue_notice(upload_msg, f"📤 Upload • **{part_name}**"),
+                token=token
             )
 
             await upload_msg.delete()
+            token.check()
+
+        parts = await scheduler.run(
+            "ffmpeg",
+            lambda: split_and_upload(
+                downloaded_path, split_folder, upload_part, token,
+                progress=encode_progress, progress_args=(split_msg, time.time())
+            ),
+            name=f"ytdl ✂️ {info_dict['title']}",
+            on_queue=queue_notice(split_msg, f"✂️ Split • **{info_dict['title']}**"),
+            token=token
+        )
 
-        # Cleanup
-        for part in parts:
-            if os.path.exists(part):
-                os.remove(part)
+        await split_msg.edit_caption(
+            caption=f"✅ **Splitting Completed**\n\n📦 **Total Parts:** {parts}",
+            parse_mode=enums.ParseMode.MARKDOWN
+        )
+
+        await asyncio.sleep(2)
+        await split_msg.delete()
 
+        # Cleanup
         if not store_colab_state.get(query.message.chat.id, False):
             if os.path.exists(downloaded_path):
                 os.remove(downloaded_path)
 
-        if thumb_path and os.path.exists(thumb_path):
-            os.remove(thumb_path)
-
         return
     # ================= END SPLIT =================
 
@@ -340,19 +358,29 @@ async def yt_callback_handler(bot, query):
             text=upload_caption,
             parse_mode=enums.ParseMode.MARKDOWN
         )
+    token.bind(upload_msg)
 
     try:
-        await bot.send_video(
-            query.message.chat.id,
-            video=downloaded_path,
-            thumb=thumb_path,
-            caption=f"**🎞 {info_dict['title']} | [🔗 URL]({url})**\n\n🎥 **{resolution}** | 🗂 **{filesize}**",
-            duration=duration,
-            progress=progress_message,
-            progress_args=(f"📤 **Uploading...**", upload_msg, time.time()),
-            parse_mode=enums.ParseMode.MARKDOWN
+        await scheduler.run(
+            "net",
+            lambda: bot.send_video(
+                query.message.chat.id,
+                video=downloaded_path,
+                thumb=thumb_path,
+                caption=f"**🎞 {info_dict['title']} | [🔗 URL]({url})**\n\n🎥 **{resolution}** | 🗂 **{filesize}**",
+                duration=duration,
+                progress=progress_message,
+                progress_args=(f"📤 **Uploading...**", upload_msg, time.time()),
+                parse_mode=enums.ParseMode.MARKDOWN
+            ),
+            name=f"ytdl ⬆️ {info_dict['title']}",
+            on_queue=queue_notice(upload_msg, f"📤 Upload • **{info_dict['title']}**"),
+            token=token
         )
         await upload_msg.delete()
+        token.check()
+    except JobCancelled:
+        raise
     except Exception as e:
         await upload_msg.edit_caption(
             caption=f"❌ **Error during upload:** {str(e)}",
@@ -365,9 +393,6 @@ async def yt_callback_handler(bot, query):
         if os.path.exists(downloaded_path):
             os.remove(downloaded_path)
 
-    if thumb_path and os.path.exists(thumb_path):
-        os.remove(thumb_path)
-
 # Description handler
 @Client.on_callback_query(filters.regex(r'^desc_https?://'))
 async def description_callback_handler(bot, query):
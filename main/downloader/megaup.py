@@ -1,11 +1,15 @@
 import os
 import time
+import asyncio
 import subprocess
 import json
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from config import DOWNLOAD_LOCATION, ADMIN
+from config import ADMIN
 from main.utils import progress_message, humanbytes
+from main.media_cache import media_cache
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken, kill_tree
 from main.downloader.mega_progress import mega_progress
 
 
@@ -26,12 +30,25 @@ async def mega_uploader(bot, msg):
     sts = await msg.reply_text(f"📥 **Downloading:** **`{filename}`**")
 
     # Step 1: Download file from Telegram
+    token = CancelToken(sts)
     c_time = time.time()
-    downloaded_path = await reply.download(
-        file_name=os.path.join(DOWNLOAD_LOCATION, filename),
-        progress=progress_message,
-        progress_args=(f"📥 **Downloading:** **`{filename}`**", sts, c_time)
-    )
+    try:
+        downloaded_path = await scheduler.run(
+            "net",
+            lambda: media_cache.acquire(
+                bot, reply,
+                progress=progress_message,
+                progress_args=(f"📥 **Downloading:** **`{filename}`**", sts, c_time)
+            ),
+            name=f"mega ⬇️ {filename}",
+            on_queue=queue_notice(sts, f"📥 Download • **`{filename}`**"),
+            token=token
+        )
+    except JobCancelled:
+        downloaded_path = None
+    if not downloaded_path:
+        token.close()
+        return await sts.edit("🚫 **Cancelled.**" if token.cancelled else "❌ Download failed.")
 
     filesize = humanbytes(og_media.file_size)
 
@@ -42,6 +59,8 @@ async def mega_uploader(bot, msg):
     rclone_conf = os.path.join(rclone_config_path, "rclone.conf")
 
     if not os.path.exists(repo_conf):
+        media_cache.release(downloaded_path)
+        token.close()
         return await sts.edit(
             "❌ Missing `rclone.conf` in your bot directory.\n\n"
             "Please copy it once from `/root/.config/rclone/rclone.conf` after configuring rclone."
@@ -68,36 +87,47 @@ async def mega_uploader(bot, msg):
         rclone_conf
     ]
 
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
+    # Own process group so the Cancel button can kill rclone (main.cancel)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE,  # rclone writes progress to stderr
-        bufsize=0,
-        universal_newlines=True
+        start_new_session=True
     )
+    token.procs.add(proc)
 
     start_time = time.time()
     buffer = ""
 
     while True:
-        char = proc.stderr.read(1)  # read stderr for live progress
-        if not char:
+        try:
+            data = await proc.stderr.read(256)  # read stderr for live progress
+        except asyncio.CancelledError:
+            kill_tree(proc)
+            raise
+        if not data:
             break
-
-        if char in ("\r", "\n"):
-            line = buffer.strip()
-            buffer = ""
-            if line:
-                await mega_progress(
-                    line=line,
-                    text=upload_text,
-                    message=sts,
-                    start_time=start_time
-                )
-        else:
-            buffer += char
-
-    proc.wait()
+        for char in data.decode(errors="ignore"):
+            if char in ("\r", "\n"):
+                line = buffer.strip()
+                buffer = ""
+                if line:
+                    await mega_progress(
+                        line=line,
+                        text=upload_text,
+                        message=sts,
+                        start_time=start_time
+                    )
+            else:
+                buffer += char
+
+    await proc.wait()
+    token.procs.discard(proc)
+
+    if token.cancelled:
+        media_cache.release(downloaded_path)
+        token.close()
+        return await sts.edit("🚫 **Mega upload cancelled.**")
 
     # Step 5: Get Mega Storage Info
     try:
@@ -137,10 +167,8 @@ async def mega_uploader(bot, msg):
     await sts.edit(final_text, reply_markup=btn)
 
     # Step 7: Cleanup
-    try:
-        os.remove(downloaded_path)
-    except:
-        pass
+    media_cache.release(downloaded_path)
+    token.close()
 
 
 @Client.on_callback_query(filters.regex("delmegamsg"))
@@ -1,26 +1,24 @@
 # main/downloader/progress_hook.py
+import os
 import asyncio
 import time
-from pyrogram.enums import ParseMode
 from main.utils import humanbytes, progress_message
-
-# Reduce global update interval for faster updates
-last_update_time = {}
+from main.scheduler import JobCancelled
+from main.progress_hub import hub
 
 
 class YTDLProgress:
-    def __init__(self, bot, chat_id, prefix_text="", edit_msg=None):
+    def __init__(self, bot, chat_id, prefix_text="", edit_msg=None, token=None):
         self.bot = bot
         self.chat_id = chat_id
         self.prefix_text = prefix_text
         self.msg = edit_msg
+        self.token = token
         self.start_time = time.time()
         self.current_data = {}
         self.update_task = None
         self.running = True
-        self.last_telegram_update = 0
-        self.update_interval = 0.5  # Update every 500ms for faster response
-        self.telegram_limit = 1.5   # Telegram API limit every 1.5 seconds
+        self.update_interval = 0.5  # main.progress_hub decides what actually gets sent
 
     async def start_updater(self):
         """Start the background updater task"""
@@ -43,12 +41,7 @@ class YTDLProgress:
 
         while self.running and consecutive_errors < max_errors:
             try:
-                current_time = time.time()
-
-                # Check if we have data and enough time has passed for Telegram
-                # API
-                if (self.current_data and self.msg and (current_time -
-                        self.last_telegram_update) >= self.telegram_limit):
+                if self.current_data and self.msg:
 
                     data = self.current_data.copy()
 
@@ -64,7 +57,6 @@ class YTDLProgress:
                                 message=self.msg,
                                 start=self.start_time
                             )
-                            self.last_telegram_update = current_time
 
                     elif data.get("status") == "finished":
                         filename = data.get('filename', 'Unknown')
@@ -77,7 +69,6 @@ class YTDLProgress:
                             f"**📂 File:** {filename}\n\n"
                             f"**💾 Total Size:** {humanbytes(int(total_bytes)) if total_bytes > 0 else 'Unknown'}")
                         await self._update_msg(text)
-                        self.last_telegram_update = current_time
                         break
 
                     elif data.get("status") == "error":
@@ -98,34 +89,33 @@ class YTDLProgress:
 
     def hook(self, d):
         """yt-dlp progress hook - optimized for frequent updates"""
+        # Raising from the hook is the only way to stop yt-dlp mid-download
+        if self.token and self.token.cancelled:
+            tmp = d.get("tmpfilename")
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            raise JobCancelled()
         try:
             if d["status"] == "downloading":
-                # More frequent updates - every 200ms instead of 2-3 seconds
-                now = time.time()
-                if (self.chat_id not in last_update_time) or (
-                        now - last_update_time[self.chat_id] > 0.2):
-                    last_update_time[self.chat_id] = now
-
-                    # Safely handle None values
-                    total_bytes = d.get("total_bytes") or d.get(
-                        "total_bytes_estimate") or 0
-                    downloaded = d.get("downloaded_bytes") or 0
-
-                    # Convert to numbers safely
-                    try:
-                        total_bytes = float(total_bytes) if total_bytes else 0
-                        downloaded = float(downloaded) if downloaded else 0
-                    except (ValueError, TypeError):
-                        total_bytes = downloaded = 0
-
-                    # Store data for async updater - update immediately
-                    if total_bytes > 0:  # Only store valid progress
-                        self.current_data = {
-                            "status": "downloading",
-                            "total_bytes": total_bytes,
-                            "downloaded_bytes": downloaded,
-                            "timestamp": now
-                        }
+                # Just keep the latest numbers, the updater task picks them up
+                total_bytes = d.get("total_bytes") or d.get(
+                    "total_bytes_estimate") or 0
+                downloaded = d.get("downloaded_bytes") or 0
+
+                # Convert to numbers safely
+                try:
+                    total_bytes = float(total_bytes) if total_bytes else 0
+                    downloaded = float(downloaded) if downloaded else 0
+                except (ValueError, TypeError):
+                    total_bytes = downloaded = 0
+
+                if total_bytes > 0:  # Only store valid progress
+                    self.current_data = {
+                        "status": "downloading",
+                        "total_bytes": total_bytes,
+                        "downloaded_bytes": downloaded,
+                        "timestamp": time.time()
+                    }
 
             elif d["status"] == "finished":
                 # Store finished status data immediately
@@ -150,28 +140,5 @@ class YTDLProgress:
             }
 
     async def _update_msg(self, text: str):
-        """Update message with new text - optimized with retry logic"""
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                if hasattr(
-                        self.msg,
-                        'caption') and self.msg.caption is not None:
-                    # Edit caption if it's a photo message
-                    await self.msg.edit_caption(
-                        caption=text,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    # Edit text if it's a text message
-                    await self.msg.edit_text(
-                        text,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                break  # Success, exit retry loop
-
-            except Exception as e:
-                if attempt == max_retries - 1:  # Last attempt
-                    pass  # Silently fail on final attempt
-                else:
-                    await asyncio.sleep(0.5)  # Brief delay before retry
+        """Final status text, the hub waits for the edit budget if needed"""
+        await hub.update(self.msg, text, final=True)
@@ -1,51 +1,185 @@
 import os
-import math
-import subprocess
+import signal
+import asyncio
+from main.ffmpeg_runner import run_media, probe_json
 
 MAX_SIZE = 1950 * 1024 * 1024  # 1950MB
 
-def get_video_duration(input_file):
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        input_file
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return float(result.stdout)
-
-def split_video(input_file, output_dir):
+# Container overhead isn't in the packet sizes, aim a little lower
+TARGET_SIZE = int(MAX_SIZE * 0.97)
+
+async def get_stream_info(input_file, token=None):
+    info = await probe_json(input_file, "-show_streams", "-show_format",
+                            "-select_streams", "v:0", token=token)
+    video = info["streams"][0]
+    fmt = info.get("format", {})
+    return video["index"], float(fmt.get("duration") or 0), float(fmt.get("start_time") or 0)
+
+async def packet_timeline(input_file, token=None):
+    """
+    One ffprobe pass over every packet: returns the video stream's
+    keyframes as (seconds, bytes of all packets before it), plus the
+    total bytes. Cutting on a keyframe keeps `-c copy` parts clean.
+    """
+    video_index, duration, start_time = await get_stream_info(input_file, token)
+    result = await run_media(
+        ["ffprobe", "-v", "quiet", "-show_entries",
+         "packet=stream_index,pts_time,size,flags", "-of", "csv=p=0", input_file],
+        token=token, timeout=600, capture=True
+    )
+
+    keyframes = []
+    total = 0
+    for line in result.stdout.decode(errors="ignore").splitlines():
+        fields = line.split(",")
+        if len(fields) < 4:
+            continue
+        stream_index, pts_time, size, flags = fields[:4]
+        if (int(stream_index) == video_index and "K" in flags
+                and pts_time not in ("", "N/A")):
+            keyframes.append((float(pts_time) - start_time, total))
+        total += int(size)
+    keyframes.sort()
+    return keyframes, total, duration
+
+def pick_cuts(keyframes, total, max_bytes=TARGET_SIZE):
+    """Latest keyframe that keeps each part under `max_bytes`, part by part"""
+    cuts = []
+    part_start = 0
+    last = None  # latest keyframe the current part could end on
+    for seconds, offset in keyframes:
+        if offset - part_start > max_bytes and last is not None:
+            cuts.append(last[0])
+            part_start = last[1]
+            last = None
+        if offset > part_start:
+            last = (seconds, offset)
+    if total - part_start > max_bytes and last is not None:
+        cuts.append(last[0])
+    return cuts
+
+# Finished parts allowed on disk before the segmenter is paused
+MAX_READY_PARTS = 1
+
+def _pause(proc, paused):
+    if proc and proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGSTOP if paused else signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+
+def _read_segment_list(list_file, seen):
+    """New (path, start, end) rows the segment muxer appended to `list_file`"""
+    if not os.path.exists(list_file):
+        return []
+    with open(list_file) as f:
+        rows = [line.strip().split(",") for line in f if line.strip()]
+    new = rows[seen:]
+    folder = os.path.dirname(list_file)
+    return [(os.path.join(folder, r[0]), float(r[1]), float(r[2])) for r in new if len(r) >= 3]
+
+async def split_and_upload(input_file, output_dir, upload, token=None,
+                           progress=None, progress_args=()):
+    """
+    Split `input_file` in one segmenting ffmpeg pass at the keyframes
+    pick_cuts chooses to keep parts under MAX_SIZE, handing every part to
+    `upload(path, number, total, part_duration)` the moment ffmpeg closes
+    it. Parts are deleted once uploaded; while more than MAX_READY_PARTS
+    wait for the uploader ffmpeg is paused, so only about two parts are
+    ever on disk. Returns the number of parts.
+    """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    total_size = os.path.getsize(input_file)
-    duration = get_video_duration(input_file)
-
-    parts = math.ceil(total_size / MAX_SIZE)
-    part_duration = duration / parts
+    keyframes, total, duration = await packet_timeline(input_file, token)
+    cuts = pick_cuts(keyframes, total)
+    parts = len(cuts) + 1
 
     base_name = os.path.splitext(os.path.basename(input_file))[0]
+    pattern = os.path.join(output_dir, f"{base_name}_Part %02d.mp4")
+    list_file = os.path.join(output_dir, f"{base_name}_parts.csv")
+    if os.path.exists(list_file):
+        os.remove(list_file)
+    if token:
+        token.track(list_file)
+        for i in range(parts):
+            token.track(pattern % (i + 1))
+
+    cmd = ["ffmpeg", "-y", "-i", input_file, "-c", "copy",
+           "-f", "segment", "-segment_start_number", "1", "-reset_timestamps", "1",
+           "-segment_list", list_file, "-segment_list_type", "csv"]
+    if cuts:
+        # A segment ends on the first keyframe at or after its time
+        cmd += ["-segment_times", ",".join(f"{c - 0.001:.3f}" for c in cuts)]
+    cmd += [pattern]
+
+    proc = None
+    ready = asyncio.Queue()
+    state = {"waiting": 0, "seen": 0, "paused": False}
+
+    def pause(paused):
+        # run_media's stall timer stands still while the segmenter is stopped
+        state["paused"] = paused
+        _pause(proc, paused)
+
+    def started(p):
+        nonlocal proc
+        proc = p
+
+    def collect():
+        for row in _read_segment_list(list_file, state["seen"]):
+            state["seen"] += 1
+            state["waiting"] += 1
+            ready.put_nowait(row)
+        if state["waiting"] > MAX_READY_PARTS:
+            pause(True)
+
+    async def segmenter():
+        try:
+            result = await run_media(
+                cmd, token, duration=duration,
+                progress=progress,
+                progress_args=(f"✂️ **Splitting into {parts} parts...**", *progress_args),
+                started=started,
+                paused=lambda: state["paused"]
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg could not split the video (exit {result.returncode})")
+        finally:
+            collect()
+            ready.put_nowait(None)
+
+    async def watcher():
+        while True:
+            collect()
+            await asyncio.sleep(1)
+
+    async def uploader():
+        number = 0
+        while True:
+            row = await ready.get()
+            if row is None:
+                return number
+            path, start, end = row
+            number += 1
+            try:
+                await upload(path, number, parts, end - start)
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+                state["waiting"] -= 1
+                if state["waiting"] <= MAX_READY_PARTS:
+                    pause(False)
 
-    output_files = []
-
-    for i in range(parts):
-        start_time = i * part_duration
-        output_file = os.path.join(
-            output_dir,
-            f"{base_name}_Part {str(i+1).zfill(2)}.mp4"
-        )
-
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss", str(start_time),
-            "-i", input_file,
-            "-t", str(part_duration),
-            "-c", "copy",
-            output_file
-        ]
-
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        output_files.append(output_file)
-
-    return output_files
+    tasks = [asyncio.create_task(segmenter()), asyncio.create_task(watcher())]
+    try:
+        uploaded = await uploader()
+        await tasks[0]
+        return uploaded
+    finally:
+        pause(False)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if os.path.exists(list_file):
+            os.remove(list_file)
@@ -0,0 +1,578 @@
+# main/extractor.py
+import io
+import os
+import re
+import stat
+import time
+import uuid
+import shutil
+import zipfile
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pyrogram import Client, filters
+from pyrogram.types import InputMediaPhoto, InputMediaVideo, InputMediaAudio, InputMediaDocument
+from config import DOWNLOAD_LOCATION, ADMIN, EXTRACT_THREADS, EXTRACT_MAX_SIZE, TG_MAX_FILE_SIZE
+from main.utils import progress_message, humanbytes
+from main.media_cache import media_cache
+from main.tg_download import get_media
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken, cancel_markup
+from main.progress_hub import hub
+
+try:
+    import rarfile
+except ImportError:
+    rarfile = None  # RAR needs rarfile plus an unrar/unar/bsdtar backend
+
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+EXTRACT_ROOT = os.path.join(DOWNLOAD_LOCATION, "extract")
+
+# Files up to this size go out in media groups of up to GROUP_SIZE, bigger
+# ones alone with a progress bar
+GROUP_MAX_SIZE = 50 * 1024 * 1024
+GROUP_SIZE = 10
+
+# Extracted files allowed to wait for the uploader before extraction
+# pauses; room for a full media group while the previous one is sent
+MAX_READY = 2 * GROUP_SIZE
+
+# 7z members extracted per pass, handed over once the pass is done
+SEVEN_ZIP_BATCH = 16
+
+# A partial media group is sent once no new file arrived for this long
+GROUP_WAIT = 3
+
+# Messages after the first volume searched for the remaining ones
+VOLUME_LOOKAHEAD = 50
+
+COPY_CHUNK = 1024 * 1024
+
+PHOTO_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+VIDEO_EXTS = {".mp4", ".mkv", ".mov", ".webm", ".m4v"}
+AUDIO_EXTS = {".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".wav"}
+
+# name.part1.rar, name.part2.rar... / name.7z.001, name.zip.001...
+VOLUME_NAMES = (
+    (re.compile(r"^(?P<base>.+)\.part(?P<num>\d+)\.rar$", re.I), "{base}.part{num}.rar"),
+    (re.compile(r"^(?P<base>.+\.(?:7z|zip))\.(?P<num>\d{3})$", re.I), "{base}.{num}"),
+)
+
+os.makedirs(EXTRACT_ROOT, exist_ok=True)
+
+
+def archive_kind(name):
+    """"zip", "rar" or "7z" for an archive (or its first volume), else None"""
+    name = re.sub(r"\.\d{3}$", "", (name or "").lower())
+    for kind in ("zip", "rar", "7z"):
+        if name.endswith("." + kind):
+            return kind
+    return None
+
+
+def next_volume_name(name):
+    """Name of the volume after `name`, None if it isn't a numbered volume"""
+    for pattern, template in VOLUME_NAMES:
+        match = pattern.match(name)
+        if match:
+            num = match.group("num")
+            return template.format(base=match.group("base"),
+                                   num=str(int(num) + 1).zfill(len(num)))
+    return None
+
+
+def safe_target(root, name):
+    """Where member `name` goes under `root`; refuses absolute and ../ paths"""
+    root = os.path.abspath(root)
+    name = name.replace("\\", "/")
+    if name.startswith("/") or re.match(r"^[a-zA-Z]:", name):
+        raise ValueError(f"Unsafe path in archive: {name}")
+    target = os.path.abspath(os.path.join(root, name))
+    if not target.startswith(root + os.sep):
+        raise ValueError(f"Unsafe path in archive: {name}")
+    return target
+
+
+def extracted_file(root, target):
+    """True if `target` is a regular file that really lives under `root`"""
+    return (os.path.isfile(target) and not os.path.islink(target)
+            and os.path.realpath(target).startswith(os.path.realpath(root) + os.sep))
+
+
+def _is_regular(info):
+    # The high 16 bits hold the Unix mode when the archiver recorded one,
+    # and its file type bits may be left out for plain files
+    file_type = stat.S_IFMT(info.external_attr >> 16)
+    return not info.is_dir() and file_type in (0, stat.S_IFREG)
+
+
+class JoinedFile(io.RawIOBase):
+    """Read-only, seekable view of split volumes (.001, .002...) as one file"""
+
+    def __init__(self, paths):
+        self.files = [open(p, "rb") for p in paths]
+        self.starts = []
+        total = 0
+        for f in self.files:
+            self.starts.append(total)
+            total += os.fstat(f.fileno()).st_size
+        self.size = total
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+        index = max(i for i, start in enumerate(self.starts) if start <= self.pos)
+        f = self.files[index]
+        f.seek(self.pos - self.starts[index])
+        n = f.readinto(buffer)
+        self.pos += n
+        return n
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        super().close()
+
+
+def _open_volumes(paths):
+    return JoinedFile(paths) if len(paths) > 1 else open(paths[0], "rb")
+
+
+class ZipReader:
+    """Random access: every extraction thread opens its own reader"""
+    random_access = True
+
+    def __init__(self, paths, password=None):
+        self.fp = _open_volumes(paths)
+        self.archive = zipfile.ZipFile(self.fp)
+        if password:
+            self.archive.setpassword(password.encode())
+
+    def members(self):
+        """Regular files only; symlinks and devices are never written out"""
+        return [(i.filename, i.file_size) for i in self.archive.infolist() if _is_regular(i)]
+
+    def extract(self, name, size, target):
+        # Stop at the declared size, list_members only checked those
+        written = 0
+        with self.archive.open(name) as src, open(target, "wb") as dst:
+            while True:
+                chunk = src.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > size:
+                    raise ValueError(f"{name} is larger than the archive says")
+                dst.write(chunk)
+
+    def close(self):
+        self.archive.close()
+        self.fp.close()
+
+
+class RarReader(ZipReader):
+    """rarfile finds name.part2.rar... next to the first volume on its own"""
+
+    def __init__(self, paths, password=None):
+        self.archive = rarfile.RarFile(paths[0])
+        if password:
+            self.archive.setpassword(password)
+
+    def members(self):
+        return [(i.filename, i.file_size) for i in self.archive.infolist()
+                if i.is_file() and not i.is_symlink()]
+
+    def close(self):
+        self.archive.close()
+
+
+class SevenZipReader:
+    """
+    7z blocks are usually solid, so members are decoded sequentially in
+    passes of SEVEN_ZIP_BATCH and handed over after each pass
+    """
+    random_access = False
+
+    def __init__(self, paths, password=None):
+        self.fp = _open_volumes(paths)
+        self.archive = py7zr.SevenZipFile(self.fp, password=password)
+
+    def members(self):
+        """Regular files only; symlinks, junctions and sockets are never written out"""
+        regular = {f.filename for f in self.archive.files
+                   if not (f.is_directory or f.is_symlink or f.is_junction or f.is_socket)}
+        return [(i.filename, i.uncompressed) for i in self.archive.list() if i.filename in regular]
+
+    def extract_all(self, dest, names, done, stop=None):
+        # done() may block for back-pressure, so it only runs between passes,
+        # never while py7zr's own threads are still writing files
+        for i in range(0, len(names), SEVEN_ZIP_BATCH):
+            if stop and stop.is_set():
+                return
+            batch = names[i:i + SEVEN_ZIP_BATCH]
+            self.archive.reset()
+            self.archive.extract(path=dest, targets=batch)
+            for name in batch:
+                target = safe_target(dest, name)
+                if not extracted_file(dest, target):
+                    raise ValueError(f"Unsafe path in archive: {name}")
+                done(target, name)
+
+    def close(self):
+        self.archive.close()
+        self.fp.close()
+
+
+READERS = {"zip": ZipReader, "rar": RarReader, "7z": SevenZipReader}
+
+
+def missing_support(kind):
+    """Why `kind` can't be extracted here, None when it can"""
+    if kind == "rar" and rarfile is None:
+        return "RAR support needs the `rarfile` package."
+    if kind == "7z" and py7zr is None:
+        return "7z support needs the `py7zr` package."
+    return None
+
+
+def list_members(kind, paths, password=None, dest=None):
+    """
+    Blocking: (name, size) of every regular file in the archive. With
+    `dest`, every path is also checked against it and the total size
+    against EXTRACT_MAX_SIZE and the free space there before anything
+    gets written.
+    """
+    reader = READERS[kind](paths, password)
+    try:
+        members = reader.members()
+    finally:
+        reader.close()
+    if dest:
+        for name, _ in members:
+            safe_target(dest, name)
+        total = sum(size for _, size in members)
+        free = shutil.disk_usage(dest).free
+        if total > EXTRACT_MAX_SIZE:
+            raise ValueError(f"Archive unpacks to {humanbytes(total)}, "
+                             f"more than the {humanbytes(EXTRACT_MAX_SIZE)} limit")
+        if total > free:
+            raise ValueError(f"Archive unpacks to {humanbytes(total)}, "
+                             f"only {humanbytes(free)} free")
+    return members
+
+
+def extract_members(kind, paths, dest, password=None, done=None, threads=EXTRACT_THREADS,
+                    stop=None):
+    """
+    Blocking: extract every file of the archive under `dest`, `threads` at
+    a time for ZIP/RAR. `done(path, name)` is called from the extracting
+    thread as each file (for 7z each pass) is complete; it may block to
+    apply back-pressure.
+    Returns the number of files.
+    """
+    members = list_members(kind, paths, password, dest)
+    done = done or (lambda path, name: None)
+
+    if not READERS[kind].random_access:
+        reader = READERS[kind](paths, password)
+        try:
+            reader.extract_all(dest, [name for name, _ in members], done, stop)
+        finally:
+            reader.close()
+        return len(members)
+
+    local = threading.local()
+    readers = []
+    lock = threading.Lock()
+
+    def work(name, size):
+        if stop and stop.is_set():
+            return
+        if not hasattr(local, "reader"):
+            local.reader = READERS[kind](paths, password)
+            with lock:
+                readers.append(local.reader)
+        target = safe_target(dest, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        local.reader.extract(name, size, target)
+        if not extracted_file(dest, target):
+            raise ValueError(f"Unsafe path in archive: {name}")
+        done(target, name)
+
+    pool = ThreadPoolExecutor(max(1, threads))
+    try:
+        for future in [pool.submit(work, name, size) for name, size in members]:
+            future.result()
+    finally:
+        if stop:
+            stop.set()
+        pool.shutdown(cancel_futures=True)
+        for reader in readers:
+            reader.close()
+    return len(members)
+
+
+def safe_extract(archive_path, extract_to, password=None):
+    """Blocking extraction of a whole archive, the kind is taken from its name"""
+    kind = archive_kind(os.path.basename(archive_path)) or "zip"
+    return extract_members(kind, [archive_path], extract_to, password)
+
+
+def media_kind(path):
+    """Which media group a file can join, None when it goes alone"""
+    size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+    if size > GROUP_MAX_SIZE:
+        return None
+    if ext in PHOTO_EXTS and size <= 10 * 1024 * 1024:
+        return "visual"
+    if ext in VIDEO_EXTS:
+        return "visual"
+    if ext in AUDIO_EXTS:
+        return "audio"
+    return "document"
+
+
+def input_media(path, caption):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PHOTO_EXTS:
+        return InputMediaPhoto(path, caption=caption)
+    if ext in VIDEO_EXTS:
+        return InputMediaVideo(path, caption=caption, supports_streaming=True)
+    if ext in AUDIO_EXTS:
+        return InputMediaAudio(path, caption=caption)
+    return InputMediaDocument(path, caption=caption)
+
+
+async def find_volumes(bot, first):
+    """`first` plus the volumes that follow it in the chat, in order"""
+    name = get_media(first).file_name or ""
+    wanted = next_volume_name(name)
+    if not wanted:
+        return [first]
+    later = await bot.get_messages(first.chat.id,
+                                   list(range(first.id + 1, first.id + 1 + VOLUME_LOOKAHEAD)))
+    by_name = {m.document.file_name: m for m in later
+               if m and not m.empty and m.document and m.document.file_name}
+    volumes = [first]
+    while wanted in by_name:
+        volumes.append(by_name[wanted])
+        wanted = next_volume_name(wanted)
+    return volumes
+
+
+async def upload_members(bot, sts, token, ready, slots, total, archive_name):
+    """
+    Send extracted files as they arrive: small ones batched into media
+    groups, big ones alone with progress. Each file is deleted and its
+    slot freed once sent. Returns (sent, skipped names).
+    """
+    batches = {}
+    state = {"sent": 0, "skipped": []}
+
+    def finished(paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+            slots.release()
+
+    async def send_alone(path, name):
+        await scheduler.run(
+            "net",
+            lambda: bot.send_document(
+                sts.chat.id, document=path, caption=f"`{name}`",
+                progress=progress_message,
+                progress_args=(f"📤 Uploading {state['sent'] + 1}/{total}...\n\n📄 **{name}**",
+                               sts, time.time())
+            ),
+            name=f"unzip ⬆️ {name}",
+            on_queue=queue_notice(sts, f"📤 Upload • **{name}**"),
+            token=token
+        )
+
+    async def flush(kind):
+        items = batches.pop(kind, [])
+        if not items:
+            return
+        try:
+            if len(items) == 1:
+                await send_alone(*items[0])
+            else:
+                await scheduler.run(
+                    "net",
+                    lambda: bot.send_media_group(
+                        sts.chat.id, [input_media(path, f"`{name}`") for path, name in items]),
+                    name=f"unzip ⬆️ {len(items)} files",
+                    token=token
+                )
+            state["sent"] += len(items)
+        finally:
+            finished([path for path, _ in items])
+        await hub.update(
+            sts,
+            f"📂 **Extracting {archive_name}**\n\n📤 Sent {state['sent']}/{total} files",
+            cancel_markup(sts)
+        )
+
+    while True:
+        try:
+            item = await asyncio.wait_for(ready.get(), GROUP_WAIT)
+        except asyncio.TimeoutError:
+            for kind in list(batches):
+                await flush(kind)
+            continue
+        if item is None:
+            break
+        token.check()
+        path, name = item
+        size = os.path.getsize(path)
+        if size == 0 or size > TG_MAX_FILE_SIZE:
+            # Telegram takes neither empty files nor ones over its limit
+            state["skipped"].append(name)
+            finished([path])
+            continue
+        kind = media_kind(path)
+        if kind is None:
+            try:
+                await send_alone(path, name)
+                state["sent"] += 1
+            finally:
+                finished([path])
+            continue
+        batches.setdefault(kind, []).append((path, name))
+        if len(batches[kind]) >= GROUP_SIZE:
+            await flush(kind)
+
+    for kind in list(batches):
+        await flush(kind)
+    return state["sent"], state["skipped"]
+
+
+async def run_unzip(bot, sts, token, first, password):
+    archive_name = get_media(first).file_name
+    kind = archive_kind(archive_name)
+    volumes = await find_volumes(bot, first)
+
+    job_dir = token.track(os.path.join(EXTRACT_ROOT, uuid.uuid4().hex[:12]))
+    out_dir = os.path.join(job_dir, "files")
+    os.makedirs(out_dir, exist_ok=True)
+    cached = []
+    try:
+        # 📥 Volumes land in the shared cache, linked side by side under their own names
+        paths = []
+        c_time = time.time()
+        for number, volume in enumerate(volumes, start=1):
+            path = await scheduler.run(
+                "net",
+                lambda: media_cache.acquire(
+                    bot, volume, progress=progress_message,
+                    progress_args=(f"📥 Downloading volume {number}/{len(volumes)}...\n\n📦 **{archive_name}**",
+                                   sts, c_time)),
+                name=f"unzip ⬇️ {archive_name} ({number}/{len(volumes)})",
+                on_queue=queue_notice(sts, f"📥 Download • **{archive_name}**"),
+                token=token
+            )
+            if not path:
+                token.check()
+                raise RuntimeError(f"download of volume {number} failed")
+            cached.append(path)
+            link = os.path.join(job_dir, os.path.basename(get_media(volume).file_name))
+            os.symlink(os.path.abspath(path), link)
+            paths.append(link)
+
+        await hub.update(sts, f"📂 **Extracting {archive_name}...**", cancel_markup(sts), final=True)
+        members = await asyncio.to_thread(list_members, kind, paths, password, out_dir)
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Queue()
+        slots = threading.Semaphore(MAX_READY)
+        stop = threading.Event()
+
+        def done(path, name):
+            # Extraction waits here while MAX_READY files are still queued for upload
+            while not slots.acquire(timeout=1):
+                if stop.is_set() or token.cancelled:
+                    raise JobCancelled()
+            loop.call_soon_threadsafe(ready.put_nowait, (path, name))
+
+        def extract():
+            try:
+                extract_members(kind, paths, out_dir, password, done, stop=stop)
+            finally:
+                loop.call_soon_threadsafe(ready.put_nowait, None)
+
+        extraction = asyncio.create_task(scheduler.run(
+            "archive", lambda: asyncio.to_thread(extract),
+            name=f"unzip 📂 {archive_name}",
+            on_queue=queue_notice(sts, f"📂 Extract • **{archive_name}**"),
+            token=token
+        ))
+        try:
+            sent, skipped = await upload_members(bot, sts, token, ready, slots,
+                                                 len(members), archive_name)
+            await extraction
+        finally:
+            stop.set()
+            if not extraction.done():
+                extraction.cancel()
+                await asyncio.gather(extraction, return_exceptions=True)
+
+        size = sum(get_media(v).file_size or 0 for v in volumes)
+        text = (f"✅ **{archive_name}** extracted ({humanbytes(size)})\n\n"
+                f"📤 Sent **{sent}/{len(members)}** files")
+        if skipped:
+            text += "\n\n⚠️ Skipped (empty or too large):\n" + "\n".join(f"`{n}`" for n in skipped[:20])
+        await hub.update(sts, text, final=True)
+    finally:
+        for path in cached:
+            media_cache.release(path)
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+@Client.on_message(filters.private & filters.command("unzip") & filters.user(ADMIN))
+async def unzip_command(bot, msg):
+    reply = msg.reply_to_message
+    media = reply and reply.document
+    kind = archive_kind(media.file_name) if media else None
+    if not kind:
+        return await msg.reply_text(
+            "📦 Reply to a ZIP, RAR or 7z file (or its first volume) with `/unzip`.\n"
+            "Password protected? Send `/unzip password`."
+        )
+    problem = missing_support(kind)
+    if problem:
+        return await msg.reply_text(f"⚠️ {problem}")
+
+    password = msg.text.split(" ", 1)[1].strip() if len(msg.command) > 1 else None
+    sts = await msg.reply_text("🔍 **Looking for volumes...**")
+    token = CancelToken(sts)
+    try:
+        await run_unzip(bot, sts, token, reply, password)
+    except JobCancelled:
+        await hub.update(sts, "🚫 **Extraction cancelled.**", final=True)
+    except Exception as e:
+        await hub.update(sts, f"❌ **Extraction failed:** `{str(e)[:1000]}`", final=True)
+    finally:
+        token.close()
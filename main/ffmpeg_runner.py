@@ -0,0 +1,178 @@
+# main/ffmpeg_runner.py
+import os
+import json
+import time
+import asyncio
+import subprocess
+from config import PROCESS_MAX_TIMEOUT, MEDIA_PROCESSES
+from main.cancel import kill_tree
+from main.tg_download import call_progress
+
+# Caps ffmpeg/ffprobe processes across every handler and scheduler lane
+_slots = asyncio.Semaphore(MEDIA_PROCESSES)
+
+
+class ProcessTimeout(Exception):
+    """ffmpeg stopped making progress, or ffprobe ran past its limit"""
+
+
+def _out_seconds(block):
+    # out_time_ms is really microseconds, newer builds also print out_time_us
+    value = block.get("out_time_us") or block.get("out_time_ms") or "0"
+    try:
+        return max(0.0, int(value) / 1_000_000)
+    except ValueError:
+        return 0.0
+
+
+def _speed(block):
+    try:
+        return float(block.get("speed", "").rstrip("x"))
+    except ValueError:
+        return 0.0
+
+
+async def _readline(proc, timeout, paused):
+    """Next stdout line; the timeout only runs while `paused()` is false"""
+    reading = asyncio.ensure_future(proc.stdout.readline())
+    try:
+        while True:
+            done, _ = await asyncio.wait({reading}, timeout=timeout)
+            if done:
+                return reading.result()
+            if not (paused and paused()):
+                raise asyncio.TimeoutError
+    finally:
+        reading.cancel()
+
+
+async def _follow(proc, timeout, duration, progress, progress_args, paused=None):
+    """
+    Read `-progress pipe:1` blocks from ffmpeg. Long encodes are fine as
+    long as they move; `timeout` seconds without the output time
+    advancing counts as a hung process. Time spent while `paused()` is
+    true (the process was stopped on purpose) doesn't count.
+    """
+    block = {}
+    last_out, last_move = -1.0, time.monotonic()
+    while True:
+        line = await _readline(proc, timeout, paused)
+        if not line:
+            return
+        key, _, value = line.decode(errors="ignore").strip().partition("=")
+        block[key] = value
+        if key != "progress":
+            continue
+
+        out = _out_seconds(block)
+        now = time.monotonic()
+        if out > last_out or (paused and paused()):
+            last_out, last_move = max(out, last_out), now
+        elif now - last_move > timeout:
+            raise asyncio.TimeoutError
+        if progress and duration:
+            done = duration if value == "end" else min(out, duration)
+            await call_progress(progress, done, duration, (_speed(block), *progress_args))
+        block = {}
+
+
+async def _chunks(feed):
+    if isinstance(feed, (bytes, bytearray)):
+        yield feed
+    else:
+        async for chunk in feed:
+            yield chunk
+
+
+async def _feed(proc, feed):
+    """Write `feed` to stdin chunk by chunk, then close it"""
+    try:
+        async for chunk in feed:
+            proc.stdin.write(chunk)
+            await proc.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # the process stopped reading, it has what it needs
+    finally:
+        proc.stdin.close()
+
+
+async def run_media(cmd, token=None, timeout=PROCESS_MAX_TIMEOUT, capture=False,
+                    duration=None, progress=None, progress_args=(), follow=True,
+                    feed=None, started=None, paused=None):
+    """
+    Run ffmpeg/ffprobe without blocking the event loop.
+
+    ffmpeg gets `-progress pipe:1`; with `duration` (seconds of output) and
+    `progress` set, progress(done, duration, speed, *progress_args) is
+    called as it encodes. Pass follow=False when ffmpeg itself writes to
+    stdout. Other commands are killed after `timeout` seconds.
+    `feed` goes to stdin (read it as `pipe:0`): bytes, or for ffmpeg also
+    an async iterable of chunks written while it runs.
+    `started(proc)` is called once the process is up, e.g. to pause it;
+    while `paused()` returns True the stall timeout is suspended.
+    The process runs in its own group, a cancelled `token` (main.cancel)
+    or task kills it along with its children.
+    Returns a subprocess.CompletedProcess like subprocess.run.
+    """
+    follow = follow and os.path.basename(cmd[0]) == "ffmpeg"
+    if follow:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+
+    async with _slots:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.DEVNULL if feed is None else subprocess.PIPE,
+            stdout=subprocess.PIPE if (follow or capture) else subprocess.DEVNULL,
+            stderr=subprocess.PIPE if capture else subprocess.DEVNULL,
+            start_new_session=True
+        )
+        if token:
+            token.procs.add(proc)
+        if started:
+            started(proc)
+        feeder = None
+        try:
+            if follow:
+                if feed is not None:
+                    feeder = asyncio.create_task(_feed(proc, _chunks(feed)))
+                # Drain stderr alongside, a full pipe would stall ffmpeg
+                errors = asyncio.create_task(proc.stderr.read()) if capture else None
+                await _follow(proc, timeout, duration, progress, progress_args, paused)
+                await proc.wait()
+                if feeder:
+                    if token:
+                        token.check()
+                    await feeder  # surfaces errors of the source
+                stdout, stderr = b"", (await errors if errors else None)
+            else:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(feed), timeout)
+        except asyncio.TimeoutError:
+            kill_tree(proc)
+            if feeder:
+                feeder.cancel()
+            await proc.wait()
+            raise ProcessTimeout(f"{os.path.basename(cmd[0])} made no progress for {timeout}s")
+        except BaseException:
+            kill_tree(proc)
+            if feeder:
+                feeder.cancel()
+            raise
+        finally:
+            if token:
+                token.procs.discard(proc)
+
+    if token:
+        token.check()
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def probe_json(path, *args, token=None, timeout=60, feed=None):
+    """
+    ffprobe `path` and return the parsed JSON (streams/format per `args`).
+    With `feed` bytes (e.g. a file's first megabytes) path is "pipe:0".
+    """
+    result = await run_media(
+        ["ffprobe", "-v", "quiet", "-print_format", "json", *args, path],
+        token=token, timeout=timeout, capture=True, feed=feed
+    )
+    return json.loads(result.stdout or b"{}")
@@ -1,15 +1,143 @@
 import os
 import time
-import json
-import subprocess
+import asyncio
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from config import DOWNLOAD_LOCATION, ADMIN
-from main.utils import progress_message, humanbytes
+from pyrogram import StopTransmission
+from config import DOWNLOAD_LOCATION, ADMIN, GETSUB_MODE
+from main.utils import progress_message, encode_progress, humanbytes
+from main.media_cache import media_cache
+from main.tg_download import stream_parts, read_range
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken, cancel_markup
+from main.ffmpeg_runner import run_media, probe_json
 
 # Temporary storage for ongoing requests
 sub_extract_store = {}
 
+# Subtitle files sent to the chat at once
+SEND_PARALLEL = 4
+
+# Enough of an MKV for ffprobe to see the Tracks element in stream mode
+HEADER_BYTES = 4 * 1024 * 1024
+
+# codec -> (extension, ffmpeg codec), anything else is copied into .mks
+SUB_FORMATS = {
+    "subrip": ("srt", "copy"),
+    "ass": ("ass", "copy"),
+    "ssa": ("ass", "copy"),
+    "webvtt": ("vtt", "copy"),
+    "mov_text": ("srt", "srt"),
+    "hdmv_pgs_subtitle": ("sup", "copy"),
+}
+
+
+def track_label(idx, stream):
+    lang = stream.get("tags", {}).get("language", f"und_{idx}")
+    return lang, stream.get("codec_name", "unknown")
+
+
+def selection_markup(msg_id, info):
+    """One toggle per track plus All / Confirm / Cancel"""
+    rows = []
+    for idx, s in enumerate(info["subs"]):
+        lang, codec = track_label(idx, s)
+        mark = "✅" if idx in info["selected"] else "⬜"
+        rows.append([InlineKeyboardButton(
+            f"{mark} Track {idx}: {lang} ({codec})",
+            callback_data=f"sub_toggle_{msg_id}_{idx}")])
+    every = len(info["selected"]) == len(info["subs"])
+    rows.append([InlineKeyboardButton("⬜ None" if every else "☑️ All",
+                                      callback_data=f"sub_all_{msg_id}")])
+    rows.append([InlineKeyboardButton(f"✅ Confirm ({len(info['selected'])})",
+                                      callback_data=f"sub_confirm_{msg_id}")])
+    rows.append([InlineKeyboardButton("❌ Cancel", callback_data=f"sub_cancel_{msg_id}")])
+    return InlineKeyboardMarkup(rows)
+
+
+def build_extract_cmd(path, file_name, subs, selected):
+    """
+    A single ffmpeg run with one `-map` output per selected track, so the
+    MKV is demuxed once however many tracks are picked.
+    Returns (cmd, [output paths]).
+    """
+    base = os.path.splitext(file_name)[0]
+    cmd = ["ffmpeg", "-y", "-i", path]
+    outputs, used = [], set()
+    for idx in sorted(selected):
+        lang, codec = track_label(idx, subs[idx])
+        ext, encoder = SUB_FORMATS.get(codec, ("mks", "copy"))
+        name = f"{base}.{lang}.{ext}"
+        if name in used:
+            name = f"{base}.{lang}.{idx}.{ext}"
+        used.add(name)
+        out_file = os.path.join(DOWNLOAD_LOCATION, name)
+        cmd += ["-map", f"0:s:{idx}", "-c", encoder, out_file]
+        outputs.append(out_file)
+    return cmd, outputs
+
+
+async def telegram_feed(bot, message, progress_args):
+    """The file of `message` chunk by chunk, reporting download progress"""
+    total = message_size(message)
+    done = 0
+    async for chunk in stream_parts(bot, message):
+        done += len(chunk)
+        await progress_message(done, total, *progress_args)
+        yield chunk
+
+
+def message_size(message):
+    media = message.document or message.video
+    return media.file_size or 0
+
+
+async def read_source(bot, reply, sts, file_name, token):
+    """
+    Where the MKV comes from: the media cache when it is already there or
+    GETSUB_MODE is "disk", otherwise nothing is downloaded yet (stream
+    mode) and tracks are listed from the header bytes alone.
+    Returns (path or None, ffprobe JSON).
+    """
+    if GETSUB_MODE == "stream" and not media_cache.lookup(reply):
+        head = await scheduler.run(
+            "net",
+            lambda: read_range(bot, reply, 0, min(HEADER_BYTES, message_size(reply))),
+            name=f"getsub 🔎 {file_name}",
+            on_queue=queue_notice(sts, f"🔎 Header • **{file_name}**"),
+            token=token
+        )
+        info = await probe_json("pipe:0", "-show_streams", "-show_format",
+                                "-select_streams", "s", token=token, feed=head)
+        return None, info
+
+    c_time = time.time()
+    downloaded = await scheduler.run(
+        "net",
+        lambda: media_cache.acquire(
+            bot, reply,
+            progress=progress_message,
+            progress_args=("📥 **Downloading MKV...**", sts, c_time)
+        ),
+        name=f"getsub ⬇️ {file_name}",
+        on_queue=queue_notice(sts, f"📥 Download • **{file_name}**"),
+        token=token
+    )
+    if not downloaded:
+        raise JobCancelled()
+    try:
+        info = await probe_json(downloaded, "-show_streams", "-show_format",
+                                "-select_streams", "s", token=token)
+    except BaseException:
+        media_cache.release(downloaded)
+        raise
+    return downloaded, info
+
+
+def release_source(info):
+    if info["path"]:
+        media_cache.release(info["path"])
+
 
 @Client.on_message(filters.private & filters.command("getsub")
                    & filters.user(ADMIN))
@@ -25,73 +153,62 @@ async def get_subtitles(bot, msg):
     file_name = media.file_name
     file_size = humanbytes(media.file_size)
 
-    # Start downloading with progress
-    sts = await msg.reply_text("⏳ Preparing download...")
-    c_time = time.time()
+    # Read the subtitle tracks, from the header only in stream mode
+    sts = await msg.reply_text("⏳ Reading subtitle tracks...")
+    token = CancelToken(sts)
     try:
-        downloaded = await reply.download(
-            file_name=os.path.join(DOWNLOAD_LOCATION, file_name),
-            progress=progress_message,
-            progress_args=("📥 **Downloading MKV...**", sts, c_time)
-        )
+        downloaded, info = await read_source(bot, reply, sts, file_name, token)
+    except JobCancelled:
+        return await sts.edit("🚫 Download cancelled.")
     except Exception as e:
-        return await sts.edit(f"⚠️ Download failed: {e}")
+        return await sts.edit(f"⚠️ Error reading subtitle info: {e}")
+    finally:
+        token.close()
 
-    # Extract subtitle info using ffprobe
+    streams = info.get("streams", [])
     try:
-        cmd = [
-            "ffprobe", "-v", "quiet", "-print_format", "json",
-            "-show_streams", "-select_streams", "s", downloaded
-        ]
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True)
-        streams = json.loads(result.stdout).get("streams", [])
-    except Exception as e:
-        await sts.edit(f"⚠️ Error reading subtitle info: {e}")
-        os.remove(downloaded)
-        return
+        duration = float(info.get("format", {}).get("duration") or 0)
+    except ValueError:
+        duration = 0
 
     if not streams:
         await sts.edit("❌ No subtitles found in this MKV.")
-        os.remove(downloaded)
+        if downloaded:
+            media_cache.release(downloaded)
         return
 
     # Format subtitle info
     sub_info = []
     for idx, s in enumerate(streams):
-        lang = s.get("tags", {}).get("language", f"und_{idx}")
-        codec = s.get("codec_name", "unknown")
+        lang, codec = track_label(idx, s)
         sub_info.append(f"🎞️ Track {idx}: `{lang}` ({codec})")
 
-    # Save info for confirm step
+    # Save info for confirm step, every track starts selected
     sub_extract_store[msg.id] = {
         "path": downloaded,
+        "message": reply,
         "chat_id": msg.chat.id,
         "file_name": file_name,
-        "subs": streams
+        "duration": duration,
+        "subs": streams,
+        "selected": set(range(len(streams)))
     }
 
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ Confirm", callback_data=f"sub_confirm_{msg.id}")],
-        [InlineKeyboardButton("❌ Cancel", callback_data=f"sub_cancel_{msg.id}")]
-    ])
-
     await sts.delete()
     await msg.reply_text(
         f"📂 **File:** `{file_name}`\n"
         f"💾 **Size:** {file_size}\n\n"
-        f"📝 **Subtitles Found:**\n" + "\n".join(sub_info),
-        reply_markup=kb
+        f"📝 **Subtitles Found:**\n" + "\n".join(sub_info) +
+        "\n\n👇 Tap tracks to pick which ones to extract.",
+        reply_markup=selection_markup(msg.id, sub_extract_store[msg.id])
     )
 
 
 @Client.on_callback_query(filters.regex("^sub_"))
 async def sub_callbacks(bot, query: CallbackQuery):
     data = query.data
-    _, action, msg_id = data.split("_", 2)
+    _, action, rest = data.split("_", 2)
+    msg_id, _, track = rest.partition("_")
     msg_id = int(msg_id)
 
     if msg_id not in sub_extract_store:
@@ -99,67 +216,90 @@ async def sub_callbacks(bot, query: CallbackQuery):
 
     info = sub_extract_store[msg_id]
 
+    if action in ("toggle", "all"):
+        if action == "toggle":
+            info["selected"] ^= {int(track)}
+        elif len(info["selected"]) == len(info["subs"]):
+            info["selected"] = set()
+        else:
+            info["selected"] = set(range(len(info["subs"])))
+        return await query.message.edit_reply_markup(selection_markup(msg_id, info))
+
     if action == "cancel":
-        if os.path.exists(info["path"]):
-            os.remove(info["path"])
+        release_source(info)
         sub_extract_store.pop(msg_id, None)
         return await query.message.edit("❌ Cancelled by user.")
 
     if action == "confirm":
-        sts = await query.message.edit("📤 **Extracting subtitles... Please wait ⏳**")
-        output_files = []
+        if not info["selected"]:
+            return await query.answer("Pick at least one track.", show_alert=True)
+        sub_extract_store.pop(msg_id, None)
+        token = CancelToken(query.message)
+        sts = await query.message.edit("📤 **Extracting subtitles... Please wait ⏳**",
+                                       reply_markup=cancel_markup(query.message))
+        cmd, outputs = build_extract_cmd(info["path"] or "pipe:0", info["file_name"],
+                                         info["subs"], info["selected"])
+        for out_file in outputs:
+            token.track(out_file)
+        ud_type = f"📝 **Extracting {len(outputs)} subtitle track(s)...**"
 
         try:
-            for idx, s in enumerate(info["subs"]):
-                lang = s.get("tags", {}).get("language", f"und_{idx}")
-                codec = s.get("codec_name", "unknown")
-
-                # extension mapping
-                if codec == "subrip":
-                    ext = "srt"
-                elif codec in ["ass", "ssa"]:
-                    ext = "ass"
-                else:
-                    ext = "sub"  # fallback for image-based or unknown subs
-
-                out_file = os.path.join(
-                    DOWNLOAD_LOCATION,
-                    f"{os.path.splitext(info['file_name'])[0]}.{lang}.{ext}"
+            c_time = time.time()
+            if info["path"]:
+                await scheduler.run(
+                    "ffmpeg",
+                    lambda: run_media(
+                        cmd, token,
+                        duration=info["duration"],
+                        progress=encode_progress,
+                        progress_args=(ud_type, sts, c_time)
+                    ),
+                    name=f"getsub 📝 {info['file_name']}",
+                    on_queue=queue_notice(sts, f"📝 Extract • **{info['file_name']}**"),
+                    token=token
+                )
+            else:
+                # ffmpeg demuxes the download as it arrives, the MKV never hits disk
+                await scheduler.run(
+                    "net",
+                    lambda: run_media(
+                        cmd, token,
+                        feed=telegram_feed(bot, info["message"], (ud_type, sts, c_time))
+                    ),
+                    name=f"getsub 📝 {info['file_name']}",
+                    on_queue=queue_notice(sts, f"📝 Extract • **{info['file_name']}**"),
+                    token=token
                 )
 
-                cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    info["path"],
-                    "-map",
-                    f"0:s:{idx}",
-                    out_file]
-                subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE)
-
-                # verify file exists and > 0
-                if os.path.exists(out_file) and os.path.getsize(out_file) > 0:
-                    output_files.append(out_file)
+            # verify file exists and > 0
+            output_files = [f for f in outputs
+                            if os.path.exists(f) and os.path.getsize(f) > 0]
 
             if not output_files:
-                await sts.edit("⚠️ No valid subtitle files were extracted (possibly image-based subs).")
+                await sts.edit("⚠️ No valid subtitle files were extracted.")
             else:
+                slots = asyncio.Semaphore(SEND_PARALLEL)
+
+                async def send(f):
+                    async with slots:
+                        await bot.send_document(
+                            info["chat_id"],
+                            f,
+                            caption=f"📝 Extracted subtitle: `{os.path.basename(f)}`"
+                        )
+
+                await asyncio.gather(*[send(f) for f in output_files])
                 await sts.delete()
-                for f in output_files:
-                    await bot.send_document(
-                        info["chat_id"],
-                        f,
-                        caption=f"📝 Extracted subtitle: `{os.path.basename(f)}`"
-                    )
-                    os.remove(f)
+
+        except (JobCancelled, StopTransmission):
+            await sts.edit("🚫 Extraction cancelled.")
 
         except Exception as e:
             await sts.edit(f"⚠️ Error: {e}")
 
         finally:
-            if os.path.exists(info["path"]):
-                os.remove(info["path"])
-            sub_extract_store.pop(msg_id, None)
+            token.close()
+            for f in outputs:
+                if os.path.exists(f):
+                    os.remove(f)
+            release_source(info)
@@ -8,6 +8,7 @@ from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import DOWNLOAD_LOCATION, ADMIN
 from main.utils import progress_message, humanbytes
+from main.probe import probe
 
 # ----------------------
 # Paths & folders
@@ -485,14 +486,7 @@ async def handle_video_download(bot, chat_id):
     file_name = files[0]
 
     # Get video duration
-    duration = None
-    try:
-        from moviepy.editor import VideoFileClip
-        clip = VideoFileClip(file_path)
-        duration = int(clip.duration)
-        clip.close()
-    except Exception as e:
-        print(f"Could not get video duration: {e}")
+    duration = (await probe(file_path)).seconds or None
 
     filesize = humanbytes(os.path.getsize(file_path))
     cap = f"{file_name}\n\n💽 Size: {filesize}\n🕒 Duration: {duration or 'Unknown'} seconds"
@@ -0,0 +1,144 @@
+# main/media_cache.py
+import os
+import shutil
+import asyncio
+from collections import OrderedDict
+from config import DOWNLOAD_LOCATION, DOWNLOAD_CONNECTIONS, CACHE_MAX_SIZE
+from main.tg_download import fast_download, get_media
+from main.resume import has_manifest
+
+CACHE_DIR = os.path.join(DOWNLOAD_LOCATION, "cache")
+
+
+def _safe_name(name):
+    name = os.path.basename(name or "file")
+    for char in '<>:"/\\|?*':
+        name = name.replace(char, "_")
+    return name.strip() or "file"
+
+
+class MediaCache:
+    """
+    Downloads Telegram media once per file_unique_id and shares the copy.
+    Entries are reference counted, handlers call release() instead of
+    deleting the file. Unused entries are evicted LRU-first once the cache
+    grows past `budget` bytes.
+    """
+
+    def __init__(self, root, budget):
+        self.root = root
+        self.budget = budget
+        # unique_id -> {"path", "size", "refs"}; order = least recently used first
+        self.entries = OrderedDict()
+        self.paths = {}
+        self.pending = {}
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Pick up entries left over from a previous run"""
+        for uid in os.listdir(self.root):
+            folder = os.path.join(self.root, uid)
+            if not os.path.isdir(folder):
+                continue
+            files = [f for f in os.listdir(folder) if not f.endswith(".temp")]
+            if not files:
+                # Unfinished download: keep it only if main.resume can pick it up
+                if not has_manifest(f"dl-{uid}"):
+                    shutil.rmtree(folder, ignore_errors=True)
+                continue
+            if len(files) != 1:
+                continue
+            path = os.path.join(folder, files[0])
+            self._add(uid, path, os.path.getsize(path), refs=0)
+        # Oldest first so eviction order survives restarts
+        for uid in sorted(self.entries, key=lambda u: os.path.getmtime(self.entries[u]["path"])):
+            self.entries.move_to_end(uid)
+
+    def _add(self, uid, path, size, refs):
+        self.entries[uid] = {"path": path, "size": size, "refs": refs}
+        self.paths[path] = uid
+
+    def _drop(self, uid):
+        entry = self.entries.pop(uid)
+        self.paths.pop(entry["path"], None)
+        shutil.rmtree(os.path.dirname(entry["path"]), ignore_errors=True)
+
+    def used(self):
+        return sum(e["size"] for e in self.entries.values())
+
+    def _evict(self, needed):
+        total = self.used()
+        for uid in list(self.entries):
+            if total + needed <= self.budget:
+                break
+            entry = self.entries[uid]
+            if entry["refs"] == 0:
+                total -= entry["size"]
+                self._drop(uid)
+
+    def lookup(self, message):
+        """Return the cached path of a message's media without downloading"""
+        media = get_media(message)
+        entry = self.entries.get(media.file_unique_id) if media else None
+        if entry and os.path.exists(entry["path"]):
+            return entry["path"]
+        return None
+
+    async def acquire(self, client, message, progress=None, progress_args=(),
+                      connections=DOWNLOAD_CONNECTIONS):
+        """Return a local path for the media, downloading it only on a miss"""
+        media = get_media(message)
+        uid = media.file_unique_id
+
+        while uid in self.pending:
+            # Someone else is downloading the same file, share their copy
+            await asyncio.shield(self.pending[uid])
+
+        entry = self.entries.get(uid)
+        if entry and os.path.exists(entry["path"]):
+            entry["refs"] += 1
+            self.entries.move_to_end(uid)
+            os.utime(entry["path"])
+            return entry["path"]
+        if entry:
+            self._drop(uid)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[uid] = future
+        try:
+            self._evict(media.file_size or 0)
+            folder = os.path.join(self.root, uid)
+            os.makedirs(folder, exist_ok=True)
+            file_name = getattr(media, "file_name", None) or f"{uid}"
+            path = await fast_download(
+                client, message,
+                file_name=os.path.join(folder, _safe_name(file_name)),
+                progress=progress, progress_args=progress_args,
+                connections=connections
+            )
+            if not path:
+                shutil.rmtree(folder, ignore_errors=True)
+                return None
+            self._add(uid, path, os.path.getsize(path), refs=1)
+            return path
+        except asyncio.CancelledError:
+            # Cancelled on purpose; failed downloads stay for main.resume
+            shutil.rmtree(os.path.join(self.root, uid), ignore_errors=True)
+            raise
+        finally:
+            self.pending.pop(uid, None)
+            future.set_result(None)
+
+    def release(self, path):
+        """Drop one reference; the file stays until the budget needs the space"""
+        uid = self.paths.get(path)
+        if uid is None:
+            return
+        entry = self.entries[uid]
+        entry["refs"] = max(0, entry["refs"] - 1)
+        if entry["refs"] == 0:
+            self._evict(0)
+
+
+media_cache = MediaCache(CACHE_DIR, CACHE_MAX_SIZE)
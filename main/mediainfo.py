@@ -1,9 +1,14 @@
 import os
 import time
+import asyncio
 from pyrogram import Client, filters
-from config import ADMIN, DOWNLOAD_LOCATION
+from config import ADMIN, INFO_RANGE_BUDGET
 from pymediainfo import MediaInfo
 from main.utils import progress_message, humanbytes
+from main.media_cache import media_cache
+from main.scheduler import scheduler, queue_notice, JobCancelled, PRIORITY_HIGH
+from main.cancel import CancelToken
+from main.remote_file import RemoteFile, RangeBudgetExceeded
 import telegraph
 
 # Create Telegraph account
@@ -11,6 +16,27 @@ telegraph_client = telegraph.Telegraph()
 telegraph_client.create_account(short_name="InfoBot")
 
 
+def has_streams(media_info):
+    return any(t.track_type in ("Video", "Audio") for t in media_info.tracks)
+
+
+async def parse_ranges(bot, reply, token):
+    """
+    Run MediaInfo over ranged reads of the Telegram file: head and tail up
+    front, then whatever blocks the parser seeks to. Returns None when the
+    parser wanted more than INFO_RANGE_BUDGET or found no streams.
+    """
+    remote = RemoteFile(bot, reply, asyncio.get_running_loop(), INFO_RANGE_BUDGET, token)
+    try:
+        await remote.prefetch()
+        media_info = await asyncio.to_thread(MediaInfo.parse, remote)
+    except RangeBudgetExceeded as e:
+        print(f"[INFO] {remote.name}: falling back to a full download ({e})")
+        return None
+    print(f"[INFO] {remote.name}: parsed from {remote.fetched} bytes")
+    return media_info if has_streams(media_info) else None
+
+
 @Client.on_message(filters.private & filters.command("info")
                    & filters.user(ADMIN))
 async def generate_mediainfo(bot, msg):
@@ -28,25 +54,60 @@ async def generate_mediainfo(bot, msg):
     # Show initial message
     sts = await msg.reply_text(f"🔄 **Processing your file...**\n\n📁 `{file_name}`")
 
-    # Download file
+    # Already cached files are parsed locally, the rest from byte ranges
+    token = CancelToken(sts)
+    media_info = None
     try:
-        c_time = time.time()
-        downloaded_path = await reply.download(
-            file_name=os.path.join(DOWNLOAD_LOCATION, file_name),
-            progress=progress_message,
-            progress_args=("📥 Downloading...", sts, c_time)
-        )
+        if not media_cache.lookup(reply):
+            media_info = await scheduler.run(
+                "net",
+                lambda: parse_ranges(bot, reply, token),
+                priority=PRIORITY_HIGH,
+                name=f"info 🔎 {file_name}",
+                on_queue=queue_notice(sts, f"🔎 Probe • **{file_name}**"),
+                token=token
+            )
+    except JobCancelled:
+        token.close()
+        return await sts.edit("🚫 Cancelled.")
     except Exception as e:
-        return await sts.edit(f"❌ Failed to download file: {e}")
-
-    if not downloaded_path or not os.path.exists(downloaded_path):
-        return await sts.edit("❌ Downloaded file path not found.")
-
-    # Parse media info
-    try:
-        media_info = MediaInfo.parse(downloaded_path)
-    except Exception as e:
-        return await sts.edit(f"❌ Failed to parse media info: {e}")
+        print(f"[INFO] Ranged parse failed: {e}")
+
+    if media_info is None:
+        try:
+            c_time = time.time()
+            # Quick lookups jump ahead of bulk transfers in the queue
+            downloaded_path = await scheduler.run(
+                "net",
+                lambda: media_cache.acquire(
+                    bot, reply,
+                    progress=progress_message,
+                    progress_args=("📥 Downloading...", sts, c_time)
+                ),
+                priority=PRIORITY_HIGH,
+                name=f"info ⬇️ {file_name}",
+                on_queue=queue_notice(sts, f"📥 Download • **{file_name}**"),
+                token=token
+            )
+        except JobCancelled:
+            return await sts.edit("🚫 Cancelled.")
+        except Exception as e:
+            return await sts.edit(f"❌ Failed to download file: {e}")
+        finally:
+            token.close()
+
+        if not downloaded_path or not os.path.exists(downloaded_path):
+            return await sts.edit("❌ Downloaded file path not found.")
+
+        # Parse media info, the cached copy stays around for other commands
+        try:
+            media_info = await asyncio.to_thread(MediaInfo.parse, downloaded_path)
+        except Exception as e:
+            return await sts.edit(f"❌ Failed to parse media info: {e}")
+        finally:
+            media_cache.release(downloaded_path)
+    else:
+        token.close()
 
     # Format content
     def format_info(key, value, spacing=40):
@@ -104,9 +165,3 @@ async def generate_mediainfo(bot, msg):
         "✅ **Info generated successfully!**",
         disable_web_page_preview=False
     )
-
-    # Clean up
-    try:
-        os.remove(downloaded_path)
-    except Exception as e:
-        print(f"⚠️ File cleanup failed: {e}")
@@ -0,0 +1,92 @@
+# main/probe.py
+import os
+from collections import OrderedDict
+from main.ffmpeg_runner import probe_json, ProcessTimeout
+
+# How many probe results to remember
+MAX_ENTRIES = 512
+
+# (path, mtime, size) or file_unique_id -> MediaProbe
+_cache = OrderedDict()
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class MediaProbe:
+    """What a single ffprobe header read says about a file"""
+
+    def __init__(self, data):
+        fmt = data.get("format", {})
+        self.streams = data.get("streams", [])
+        self.format_name = fmt.get("format_name", "")
+        self.size = _number(fmt.get("size"), int)
+        self.bitrate = _number(fmt.get("bit_rate"), int)
+        self.duration = _number(fmt.get("duration")) or max(
+            (_number(s.get("duration")) for s in self.streams), default=0)
+
+        video = self.video_streams[0] if self.video_streams else {}
+        self.width = _number(video.get("width"), int)
+        self.height = _number(video.get("height"), int)
+        self.video_codec = video.get("codec_name")
+        audio = self.audio_streams[0] if self.audio_streams else {}
+        self.audio_codec = audio.get("codec_name")
+
+    def _of(self, kind):
+        return [s for s in self.streams if s.get("codec_type") == kind]
+
+    @property
+    def video_streams(self):
+        # Cover art in audio files shows up as a one-frame video stream
+        return [s for s in self._of("video")
+                if not s.get("disposition", {}).get("attached_pic")]
+
+    @property
+    def audio_streams(self):
+        return self._of("audio")
+
+    @property
+    def subtitle_streams(self):
+        return self._of("subtitle")
+
+    @property
+    def seconds(self):
+        """Duration as Telegram wants it, 0 when unknown"""
+        return int(self.duration)
+
+
+async def probe(path, unique_id=None, token=None):
+    """
+    Probe `path` once and remember the result by file_unique_id (when the
+    file came from Telegram) or by path + mtime + size. Files ffprobe can't
+    read give an empty MediaProbe instead of an exception.
+    """
+    if unique_id:
+        key = unique_id
+    elif "://" in path:
+        key = path  # main.range_server URLs are unique per publish
+    else:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    result = _cache.get(key)
+    if result is not None:
+        _cache.move_to_end(key)
+        return result
+
+    try:
+        data = await probe_json(path, "-show_format", "-show_streams", token=token)
+    except (OSError, ValueError, ProcessTimeout) as e:
+        print(f"[PROBE] {os.path.basename(path)}: {e}")
+        data = {}
+
+    result = MediaProbe(data)
+    if data:
+        _cache[key] = result
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,171 @@
+# main/progress_hub.py
+import time
+import asyncio
+from pyrogram.errors import FloodWait, MessageNotModified, MessageIdInvalid
+from config import PROGRESS_CHAT_EDITS_PER_MIN, PROGRESS_GLOBAL_EDITS_PER_SEC
+
+# Never edit one message more often than this
+MIN_INTERVAL = 1.0
+# A message counts as live in its chat if it was updated this recently
+ACTIVE_WINDOW = 15
+# Messages nobody updated for this long are forgotten
+STALE_AFTER = 600
+# Final edits wait at most this long for a FLOOD_WAIT or the budget
+MAX_FINAL_WAIT = 10
+
+
+class _Bucket:
+    """Token bucket: `rate` edits per second, up to `burst` saved up"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Entry:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.text = None
+        self.last_edit = 0
+        self.last_seen = time.monotonic()
+        self.dead = False
+
+
+class ProgressHub:
+    """
+    Owns every status message edit. Transfers, yt-dlp, rclone and Whisper
+    all report here; the hub decides which edits actually go out so a
+    chat's live messages share its edit budget, the bot as a whole stays
+    under the global one, and a FLOOD_WAIT pauses just that chat.
+    """
+
+    def __init__(self, chat_per_min, global_per_sec):
+        self.chat_rate = chat_per_min / 60
+        self.global_bucket = _Bucket(global_per_sec, global_per_sec)
+        self.chat_buckets = {}
+        self.blocked = {}  # chat_id -> monotonic time its FLOOD_WAIT ends
+        self.entries = {}  # (chat_id, message_id) -> _Entry
+        self.last_prune = time.monotonic()
+
+    def _entry(self, message):
+        key = (message.chat.id, message.id)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = _Entry(message.chat.id)
+        return entry
+
+    def _bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = _Bucket(self.chat_rate, 3)
+        return bucket
+
+    def _interval(self, chat_id, now):
+        # Spread the chat's budget over its live messages
+        active = sum(1 for e in self.entries.values()
+                     if e.chat_id == chat_id and now - e.last_seen < ACTIVE_WINDOW)
+        return max(MIN_INTERVAL, active / self.chat_rate)
+
+    def _wait_time(self, chat_id, now):
+        return max(self.blocked.get(chat_id, 0) - now,
+                   self.global_bucket.wait_time(now),
+                   self._bucket(chat_id).wait_time(now))
+
+    def due(self, message, final=False):
+        """Cheap check so callers can skip rendering text that won't be sent"""
+        now = time.monotonic()
+        self._prune(now)
+        entry = self._entry(message)
+        entry.last_seen = now
+        if entry.dead:
+            return False
+        if final:
+            return True
+        if now - entry.last_edit < self._interval(entry.chat_id, now):
+            return False
+        return self._wait_time(entry.chat_id, now) <= 0
+
+    async def update(self, message, text, reply_markup=None, final=False):
+        """
+        Edit `message` if the budget allows. Final edits (completion,
+        errors) wait for the budget instead of being dropped.
+        Returns True when the edit went out.
+        """
+        if not self.due(message, final):
+            return False
+        entry = self._entry(message)
+        if text == entry.text:
+            return False
+
+        for _ in range(2):
+            now = time.monotonic()
+            delay = self._wait_time(entry.chat_id, now)
+            if delay > 0:
+                if not final or delay > MAX_FINAL_WAIT:
+                    return False
+                await asyncio.sleep(delay)
+                now = time.monotonic()
+            self.global_bucket.take(now)
+            self._bucket(entry.chat_id).take(now)
+            entry.last_edit = now
+            try:
+                await _edit(message, text, reply_markup)
+            except MessageNotModified:
+                pass
+            except FloodWait as e:
+                self.blocked[entry.chat_id] = time.monotonic() + e.value
+                continue
+            except MessageIdInvalid:
+                entry.dead = True
+                return False
+            except Exception as e:
+                print(f"[PROGRESS] Edit failed: {e}")
+                return False
+            entry.text = text
+            return True
+        return False
+
+    def forget(self, message):
+        self.entries.pop((message.chat.id, message.id), None)
+
+    def _prune(self, now):
+        if now - self.last_prune < 60:
+            return
+        self.last_prune = now
+        for key, entry in list(self.entries.items()):
+            if now - entry.last_seen > STALE_AFTER:
+                del self.entries[key]
+        live = {e.chat_id for e in self.entries.values()}
+        for chat_id in list(self.chat_buckets):
+            if chat_id not in live:
+                del self.chat_buckets[chat_id]
+        for chat_id, until in list(self.blocked.items()):
+            if until < now:
+                del self.blocked[chat_id]
+
+
+async def _edit(message, text, reply_markup):
+    # Photo status messages (yt-dlp thumbnails) carry the text as caption
+    if getattr(message, "caption", None) is not None:
+        await message.edit_caption(caption=text, reply_markup=reply_markup)
+    elif hasattr(message, "edit_text"):
+        await message.edit_text(text, reply_markup=reply_markup)
+    else:
+        await message.edit(text=text, reply_markup=reply_markup)
+
+
+hub = ProgressHub(PROGRESS_CHAT_EDITS_PER_MIN, PROGRESS_GLOBAL_EDITS_PER_SEC)
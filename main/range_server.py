@@ -0,0 +1,130 @@
+# main/range_server.py
+import re
+import secrets
+import asyncio
+from urllib.parse import quote
+from main.tg_download import PART_SIZE, get_media, stream_parts
+
+# Parts fetched ahead of ffmpeg, kept small since it often seeks away
+READ_AHEAD = 4
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class _Published:
+    def __init__(self, client, message):
+        media = get_media(message)
+        self.client = client
+        self.message = message
+        self.size = media.file_size or 0
+        self.fetched = 0
+
+
+class RangeServer:
+    """
+    Tiny HTTP server on 127.0.0.1 that serves Telegram files with Range
+    support, so ffmpeg/ffprobe can open them by URL. They read the index
+    (MP4 moov/stco, Matroska Cues) and seek like on a local file, and only
+    the parts they actually touch are fetched from Telegram.
+    """
+
+    def __init__(self):
+        self.files = {}  # key -> _Published
+        self.server = None
+        self.port = None
+        self.lock = asyncio.Lock()
+
+    async def _start(self):
+        async with self.lock:
+            if self.server is None:
+                self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+                self.port = self.server.sockets[0].getsockname()[1]
+
+    async def publish(self, client, message, name="media"):
+        """Return a URL for the media of `message`, valid until withdraw()"""
+        await self._start()
+        key = secrets.token_urlsafe(12)
+        self.files[key] = _Published(client, message)
+        return f"http://127.0.0.1:{self.port}/{key}/{quote(name)}"
+
+    def withdraw(self, url):
+        """Stop serving `url`, returns how many bytes were fetched for it"""
+        key = url.rsplit("/", 2)[-2]
+        entry = self.files.pop(key, None)
+        return entry.fetched if entry else 0
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            parts = path.split("/")
+            entry = self.files.get(parts[1]) if len(parts) > 2 else None
+            if entry is None or method not in ("GET", "HEAD"):
+                return await self._reply(writer, "404 Not Found", {"Content-Length": "0"})
+
+            start, end = 0, entry.size - 1
+            match = _RANGE.fullmatch(headers.get("range", ""))
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    if match.group(2):
+                        end = min(end, int(match.group(2)))
+                else:  # suffix range: the last N bytes
+                    start = max(0, entry.size - int(match.group(2)))
+                if start >= entry.size or start > end:
+                    return await self._reply(writer, "416 Range Not Satisfiable", {
+                        "Content-Range": f"bytes */{entry.size}", "Content-Length": "0"})
+                status = "206 Partial Content"
+            else:
+                status = "200 OK"
+
+            reply = {
+                "Accept-Ranges": "bytes",
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(end - start + 1),
+            }
+            if status.startswith("206"):
+                reply["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+            await self._reply(writer, status, reply)
+            if method == "GET":
+                await self._send(writer, entry, start, end)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # ffmpeg hangs up whenever it seeks
+        except Exception as e:
+            print(f"[RANGE] {e}")
+        finally:
+            writer.close()
+
+    async def _reply(self, writer, status, headers):
+        headers["Connection"] = "close"
+        text = f"HTTP/1.1 {status}\r\n" + "".join(
+            f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(text.encode("latin-1"))
+        await writer.drain()
+
+    async def _send(self, writer, entry, start, end):
+        first = start // PART_SIZE
+        position = first * PART_SIZE
+        parts = stream_parts(entry.client, entry.message, connections=1,
+                             buffer_parts=READ_AHEAD, start=first)
+        try:
+            async for chunk in parts:
+                entry.fetched += len(chunk)
+                lo = max(start - position, 0)
+                hi = min(end + 1 - position, len(chunk))
+                position += len(chunk)
+                writer.write(chunk[lo:hi])
+                await writer.drain()
+                if position > end:
+                    break
+        finally:
+            await parts.aclose()
+
+
+range_server = RangeServer()
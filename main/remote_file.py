@@ -0,0 +1,109 @@
+# main/remote_file.py
+import io
+import asyncio
+from collections import OrderedDict
+from main.tg_download import PART_SIZE, get_media, read_range
+from main.scheduler import JobCancelled
+
+# Fetched before the parser starts: container headers live at the front,
+# MP4 `moov` boxes and Matroska Cues are often at the very end
+EDGE_BYTES = 2 * PART_SIZE
+
+# 1MB blocks kept in memory
+MAX_BLOCKS = 64
+
+
+class RangeBudgetExceeded(Exception):
+    """The parser wants more of the file than a sparse read is worth"""
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over a Telegram file that only fetches
+    the 1MB blocks that actually get read. Meant for blocking parsers such
+    as pymediainfo running in a worker thread, `loop` is the bot's loop.
+    Past `budget` fetched bytes reads raise RangeBudgetExceeded.
+    """
+
+    def __init__(self, client, message, loop, budget, token=None):
+        super().__init__()
+        media = get_media(message)
+        self.client = client
+        self.message = message
+        self.loop = loop
+        self.budget = budget
+        self.token = token
+        self.size = media.file_size or 0
+        self.name = getattr(media, "file_name", None) or media.file_unique_id
+        self.fetched = 0
+        self.pos = 0
+        self.blocks = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    async def prefetch(self):
+        """Pull the head and the tail in parallel before parsing starts"""
+        head = min(EDGE_BYTES, self.size)
+        spans = [(0, head)]
+        tail = max(head, self.size - EDGE_BYTES)
+        if tail < self.size:
+            spans.append((tail, self.size - tail))
+        await asyncio.gather(*[self._load(offset, length) for offset, length in spans])
+
+    async def _load(self, offset, length):
+        first, last = offset // PART_SIZE, (offset + length - 1) // PART_SIZE
+        missing = [i for i in range(first, last + 1) if i not in self.blocks]
+        if not missing:
+            return
+        # One contiguous request covering every missing block
+        start = missing[0] * PART_SIZE
+        end = min((missing[-1] + 1) * PART_SIZE, self.size)
+        if self.fetched + (end - start) > self.budget:
+            raise RangeBudgetExceeded(f"{self.fetched + end - start} > {self.budget} bytes")
+        data = await read_range(self.client, self.message, start, end - start)
+        self.fetched += len(data)
+        for n, index in enumerate(range(missing[0], missing[-1] + 1)):
+            self.blocks[index] = data[n * PART_SIZE:(n + 1) * PART_SIZE]
+            self.blocks.move_to_end(index)
+        while len(self.blocks) > MAX_BLOCKS:
+            self.blocks.popitem(last=False)
+
+    async def _read(self, offset, length):
+        await self._load(offset, length)
+        first, last = offset // PART_SIZE, (offset + length - 1) // PART_SIZE
+        data = b"".join(self.blocks[i] for i in range(first, last + 1))
+        skip = offset - first * PART_SIZE
+        return data[skip:skip + length]
+
+    def read(self, size=-1):
+        if self.token and self.token.cancelled:
+            raise JobCancelled()
+        if size is None or size < 0:
+            size = self.size - self.pos
+        size = min(size, self.size - self.pos)
+        if size <= 0:
+            return b""
+        data = asyncio.run_coroutine_threadsafe(
+            self._read(self.pos, size), self.loop).result()
+        self.pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
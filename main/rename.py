@@ -1,9 +1,14 @@
 import time
 import os
 from pyrogram import Client, filters, enums
-from config import DOWNLOAD_LOCATION, CAPTION, ADMIN
+from config import DOWNLOAD_LOCATION, CAPTION, ADMIN, RENAME_MODE
 from main.utils import progress_message, humanbytes
-from moviepy.editor import VideoFileClip
+from main.tg_download import MediaStream
+from main.media_cache import media_cache
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken
+from main.probe import probe
+from main.thumbgen import image_thumbnail, telegram_thumbnail
 
 
 @Client.on_message(filters.private & filters.command("rename")
@@ -18,14 +23,37 @@ async def rename_file(bot, msg):
     og_media = getattr(reply, reply.media.value)
     new_name = msg.text.split(" ", 1)[1]
     sts = await msg.reply_text("🔄 Trying to Download.....📥")
-    c_time = time.time()
-    downloaded = await reply.download(file_name=new_name, progress=progress_message, progress_args=("Download Started..... **Thanks To All Who Supported ❤**", sts, c_time))
     filesize = humanbytes(og_media.file_size)
+    token = CancelToken(sts)
+    try:
+        await run_rename(bot, msg, reply, og_media, new_name, sts, filesize, token)
+    finally:
+        token.close()
+
 
-    # Get video duration
-    video_clip = VideoFileClip(downloaded)
-    duration = int(video_clip.duration)
-    video_clip.close()
+async def run_rename(bot, msg, reply, og_media, new_name, sts, filesize, token):
+    if RENAME_MODE == "stream":
+        # Parts go from the download straight into the upload, nothing hits disk
+        source = MediaStream(bot, reply, name=new_name)
+        duration = getattr(og_media, "duration", 0) or 0
+    else:
+        c_time = time.time()
+        try:
+            source = await scheduler.run(
+                "net",
+                lambda: media_cache.acquire(bot, reply, progress=progress_message, progress_args=("Download Started..... **Thanks To All Who Supported ❤**", sts, c_time)),
+                name=f"rename ⬇️ {new_name}",
+                on_queue=queue_notice(sts, f"📥 Download • **{new_name}**"),
+                token=token
+            )
+        except JobCancelled:
+            return await sts.edit("🚫 Rename cancelled.")
+        if not source:
+            return await sts.edit("🚫 Rename cancelled.")
+
+        # Telegram usually knows the duration, probe only when it doesn't
+        duration = getattr(og_media, "duration", 0) or (
+            await probe(source, og_media.file_unique_id, token=token)).seconds
 
     if CAPTION:
         try:
@@ -38,20 +66,31 @@ async def rename_file(bot, msg):
     else:
         cap = f"{new_name}\n\n💽 size: {filesize}\n🕒 duration: {duration} seconds"
 
-    dir = os.listdir(DOWNLOAD_LOCATION)
-    if len(dir) == 0:
-        file_thumb = await bot.download_media(og_media.thumbs[0].file_id)
-        og_thumbnail = file_thumb
+    # The saved custom thumb wins, otherwise keep the one Telegram already has
+    custom_thumb = f"{DOWNLOAD_LOCATION}/thumbnail.jpg"
+    if os.path.exists(custom_thumb):
+        og_thumbnail = await image_thumbnail(custom_thumb, ("custom", os.path.getmtime(custom_thumb)))
     else:
-        try:
-            og_thumbnail = f"{DOWNLOAD_LOCATION}/thumbnail.jpg"
-        except Exception as e:
-            print(e)
-            og_thumbnail = None
+        og_thumbnail = await telegram_thumbnail(bot, og_media)
 
     await sts.edit("🚀 Uploading started..... 📤**Thanks To All Who Supported ❤**")
     c_time = time.time()
+    progress_args = ("Upload Started..... **Thanks To All Who Supported ❤**", sts, c_time)
+    if reply.audio:
+        send = lambda: bot.send_audio(msg.chat.id, audio=source, file_name=new_name, thumb=og_thumbnail, caption=cap, duration=duration, progress=progress_message, progress_args=progress_args)
+    elif reply.video or (og_media.mime_type or "").startswith("video/"):
+        send = lambda: bot.send_video(msg.chat.id, video=source, file_name=new_name, thumb=og_thumbnail, caption=cap, duration=duration, progress=progress_message, progress_args=progress_args)
+    else:
+        send = lambda: bot.send_document(msg.chat.id, document=source, file_name=new_name, thumb=og_thumbnail, caption=cap, progress=progress_message, progress_args=progress_args)
     try:
-        await bot.send_video(msg.chat.id, video=downloaded, thumb=og_thumbnail, caption=cap, duration=duration, progress=progress_message, progress_args=("Upload Started..... **Thanks To All Who Supported ❤**", sts, c_time))
+        await scheduler.run("net", send, name=f"rename ⬆️ {new_name}",
+                            on_queue=queue_notice(sts, f"📤 Upload • **{new_name}**"),
+                            token=token)
+        token.check()
+    except JobCancelled:
+        return await sts.edit("🚫 Rename cancelled.")
     except Exception as e:
         return await sts.edit(f"Error: {e}")
+    finally:
+        if RENAME_MODE != "stream":
+            media_cache.release(source)
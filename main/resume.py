@@ -0,0 +1,144 @@
+# main/resume.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+from config import DOWNLOAD_LOCATION
+
+PARTIAL_DIR = os.path.join(DOWNLOAD_LOCATION, ".partial")
+
+# Manifests nobody touched for this long belong to transfers nobody retried
+MAX_AGE = 3 * 24 * 3600
+
+# Telegram only keeps uploaded parts around for a while, after that a
+# resumed upload would hit FilePartMissing on every part
+UPLOAD_MAX_AGE = 6 * 3600
+
+# Flush the manifest at most this often while parts complete
+SAVE_INTERVAL = 2
+
+
+class PartManifest:
+    """
+    Which parts of a transfer are finished, kept as a small JSON file in
+    DOWNLOAD_LOCATION/.partial so a restarted bot continues where it stopped.
+    Saves are throttled: after a crash at most the last SAVE_INTERVAL
+    seconds of parts are transferred again. With key=None nothing is
+    written, for sources that can't outlive the process anyway.
+    """
+
+    def __init__(self, key, size, part_size, max_age=MAX_AGE, sync=None):
+        self.path = os.path.join(PARTIAL_DIR, f"{key}.json") if key else None
+        self.size = size
+        self.part_size = part_size
+        # Called before each save, e.g. to fsync the data the manifest vouches for
+        self.sync = sync
+        self.done = set()
+        self.data = {}
+        self.last_save = time.time()
+        self.saving = False
+        self._load(max_age)
+
+    def _load(self, max_age):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (saved.get("size") != self.size
+                or saved.get("part_size") != self.part_size
+                or time.time() - saved.get("started", 0) > max_age):
+            self.discard()
+            return
+        self.done = set(saved.get("done", []))
+        self.data = saved.get("data", {})
+
+    def reset(self):
+        self.done.clear()
+        self.data.clear()
+
+    def done_bytes(self):
+        return min(len(self.done) * self.part_size, self.size)
+
+    def save(self, done=None):
+        if not self.path:
+            return
+        if self.sync:
+            self.sync()
+        os.makedirs(PARTIAL_DIR, exist_ok=True)
+        payload = {
+            "size": self.size,
+            "part_size": self.part_size,
+            "started": self.data.setdefault("started", time.time()),
+            "done": sorted(self.done) if done is None else done,
+            "data": self.data,
+        }
+        temp = self.path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(payload, f)
+        os.replace(temp, self.path)
+        self.last_save = time.time()
+
+    async def mark(self, index):
+        """Record a finished part, saving in the background now and then"""
+        self.done.add(index)
+        if self.saving or time.time() - self.last_save < SAVE_INTERVAL:
+            return
+        self.saving = True
+        try:
+            # Snapshot first, workers keep adding parts while the thread writes
+            await asyncio.to_thread(self.save, sorted(self.done))
+        finally:
+            self.saving = False
+
+    def discard(self):
+        if not self.path:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def has_manifest(key):
+    return os.path.exists(os.path.join(PARTIAL_DIR, f"{key}.json"))
+
+
+def download_key(media):
+    return f"dl-{media.file_unique_id}"
+
+
+def upload_key(source):
+    """Stable key for an upload source, None when it can't be resumed"""
+    if isinstance(source, (str, os.PathLike)):
+        st = os.stat(source)
+        ident = f"{os.path.abspath(source)}:{st.st_size}:{st.st_mtime_ns}"
+    elif getattr(source, "message", None) is not None:
+        # main.tg_download.MediaStream
+        media_uid = getattr(source, "unique_id", None)
+        if not media_uid:
+            return None
+        ident = f"stream:{media_uid}:{source.name}"
+    else:
+        return None
+    return "up-" + hashlib.sha1(ident.encode()).hexdigest()
+
+
+def prune():
+    """Drop manifests of transfers that were never retried"""
+    if not os.path.isdir(PARTIAL_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(PARTIAL_DIR):
+        path = os.path.join(PARTIAL_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+prune()
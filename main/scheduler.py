@@ -0,0 +1,191 @@
+# main/scheduler.py
+import heapq
+import asyncio
+import itertools
+from pyrogram import Client, filters
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from config import ADMIN, NET_JOBS, FFMPEG_JOBS, WHISPER_JOBS, ARCHIVE_JOBS
+
+# Lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+LANE_LABELS = {
+    "net": "🌐 Transfers",
+    "ffmpeg": "🎬 FFmpeg",
+    "whisper": "🎙️ Whisper",
+    "archive": "📦 Archives",
+}
+
+
+class JobCancelled(Exception):
+    """Raised by JobScheduler.run when the job was cancelled from outside"""
+
+
+class Job:
+    def __init__(self, lane, factory, priority, name, on_queue, token=None):
+        self.id = None
+        self.lane = lane
+        self.factory = factory
+        self.priority = priority
+        self.name = name
+        self.on_queue = on_queue
+        self.token = token
+        self.position = None
+        self.task = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def state(self):
+        if self.future.done():
+            return "done"
+        return "running" if self.task else "queued"
+
+
+class Lane:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, limit)
+        self.running = set()
+        self.waiting = []  # heap of (priority, seq, job)
+
+
+class JobScheduler:
+    """
+    Runs heavy work in per-resource lanes so a burst of commands can't
+    put five encodes and a Whisper run on the CPU at the same time.
+    """
+
+    def __init__(self, limits):
+        self.lanes = {name: Lane(name, limit) for name, limit in limits.items()}
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def submit(self, lane, factory, priority=PRIORITY_NORMAL, name="", on_queue=None,
+               token=None):
+        """Queue `factory()` (a coroutine function) on a lane and return the Job"""
+        job = Job(lane, factory, priority, name, on_queue, token)
+        job.id = next(self._ids)
+        self.jobs[job.id] = job
+        heapq.heappush(self.lanes[lane].waiting, (priority, next(self._seq), job))
+        self._pump(self.lanes[lane])
+        return job
+
+    async def run(self, lane, factory, priority=PRIORITY_NORMAL, name="", on_queue=None,
+                  token=None):
+        """Submit a job and wait for its result; `token` is a main.cancel.CancelToken"""
+        if token:
+            token.check()
+        job = self.submit(lane, factory, priority, name, on_queue, token)
+        if token:
+            token.jobs.add(job)
+        try:
+            await asyncio.wait([job.future])
+        except asyncio.CancelledError:
+            self.cancel(job)
+            raise
+        finally:
+            if token:
+                token.jobs.discard(job)
+        if job.future.cancelled():
+            raise JobCancelled(job.name)
+        return job.future.result()
+
+    def cancel(self, job):
+        # Cancelling through the token also kills its processes and scratch files
+        if job.token and not job.token.cancelled:
+            return job.token.cancel()
+        if job.task:
+            job.task.cancel()
+        elif not job.future.done():
+            job.future.cancel()
+            self.jobs.pop(job.id, None)
+            self._notify(self.lanes[job.lane])
+
+    def queued(self, lane):
+        return [job for _, _, job in sorted(lane.waiting) if not job.future.done()]
+
+    def _pump(self, lane):
+        while lane.waiting and len(lane.running) < lane.limit:
+            _, _, job = heapq.heappop(lane.waiting)
+            if job.future.done():
+                continue
+            lane.running.add(job)
+            job.task = asyncio.create_task(self._execute(lane, job))
+        self._notify(lane)
+
+    async def _execute(self, lane, job):
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            job.future.cancel()
+        except BaseException as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            lane.running.discard(job)
+            self.jobs.pop(job.id, None)
+            self._pump(lane)
+
+    def _notify(self, lane):
+        for position, job in enumerate(self.queued(lane), start=1):
+            if job.on_queue and job.position != position:
+                job.position = position
+                asyncio.create_task(_safe_call(job.on_queue, position))
+
+
+async def _safe_call(callback, position):
+    try:
+        await callback(position)
+    except Exception as e:
+        print(f"[SCHEDULER] Queue notice failed: {e}")
+
+
+def queue_notice(message, label):
+    """on_queue callback that shows the queue position in a status message"""
+    async def notify(position):
+        text = f"⏳ **Waiting in queue...**\n\n{label}\n📍 **Position:** #{position}"
+        if getattr(message, "caption", None) is not None:
+            await message.edit_caption(text)
+        else:
+            await message.edit_text(text)
+    return notify
+
+
+scheduler = JobScheduler({
+    "net": NET_JOBS,
+    "ffmpeg": FFMPEG_JOBS,
+    "whisper": WHISPER_JOBS,
+    "archive": ARCHIVE_JOBS,
+})
+
+
+# 📋 Show lanes and let the admin cancel jobs
+@Client.on_message(filters.private & filters.command("jobs") & filters.user(ADMIN))
+async def list_jobs(bot, msg):
+    lines, buttons = [], []
+    for name, lane in scheduler.lanes.items():
+        lines.append(f"**{LANE_LABELS.get(name, name)}** ({len(lane.running)}/{lane.limit})")
+        for job in list(lane.running) + scheduler.queued(lane):
+            mark = "▶️" if job.state == "running" else f"#{job.position}"
+            lines.append(f"  {mark} `{job.name or job.id}`")
+            buttons.append([InlineKeyboardButton(
+                f"🚫 Cancel {job.name or job.id}"[:60], callback_data=f"jobcancel:{job.id}")])
+    await msg.reply_text(
+        "\n".join(lines) if scheduler.jobs else "✅ No jobs running.",
+        reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
+    )
+
+
+@Client.on_callback_query(filters.regex(r"^jobcancel:") & filters.user(ADMIN))
+async def cancel_job(bot, cb):
+    job = scheduler.jobs.get(int(cb.data.split(":")[1]))
+    if not job:
+        return await cb.answer("⚠️ Job already finished.", show_alert=True)
+    scheduler.cancel(job)
+    await cb.answer("🚫 Job cancelled.")
@@ -2,7 +2,6 @@ import os
 import time
 import uuid
 import shutil
-import zipfile
 import asyncio
 from pathlib import Path
 
@@ -11,6 +10,17 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from config import DOWNLOAD_LOCATION, ADMIN
 from main.utils import progress_message, humanbytes
+from main.media_cache import media_cache
+from main.scheduler import (
+    scheduler,
+    queue_notice,
+    JobCancelled,
+    PRIORITY_LOW
+)
+from main.cancel import CancelToken, cancel_markup
+from main.progress_hub import hub
+from main.extractor import safe_extract
+from main.ffmpeg_runner import run_media
 
 
 # ============================================================
@@ -103,14 +113,14 @@ async def get_whisper_model():
 
 async def _edit(sts, text):
 
-    try:
-        await sts.edit(text)
-
-    except Exception as e:
-
-        print(
-            f"[GENSUB] Message edit error: {e}"
-        )
+    # Stage changes always go out,
+    # the hub just waits for the edit budget
+    await hub.update(
+        sts,
+        text,
+        cancel_markup(sts),
+        final=True
+    )
 
 
 # ============================================================
@@ -177,94 +187,6 @@ def get_video_files(folder):
     )
 
 
-# ============================================================
-# SAFE ZIP EXTRACTION
-# ============================================================
-
-def safe_extract_zip(zip_path, extract_to):
-
-    extract_to = os.path.abspath(
-        extract_to
-    )
-
-    extracted_count = 0
-
-    with zipfile.ZipFile(
-        zip_path,
-        "r"
-    ) as zip_file:
-
-        for member in zip_file.infolist():
-
-            member_name = member.filename
-
-            if not member_name:
-                continue
-
-            # Convert ZIP separators
-            member_name = member_name.replace(
-                "\\",
-                "/"
-            )
-
-            # Prevent absolute paths
-            if member_name.startswith("/"):
-
-                raise ValueError(
-                    "Unsafe ZIP path detected."
-                )
-
-            target = os.path.abspath(
-                os.path.join(
-                    extract_to,
-                    member_name
-                )
-            )
-
-            # Prevent ../ traversal
-            if (
-                target != extract_to
-                and not target.startswith(
-                    extract_to + os.sep
-                )
-            ):
-
-                raise ValueError(
-                    "Unsafe ZIP path detected."
-                )
-
-            if member.is_dir():
-                os.makedirs(
-                    target,
-                    exist_ok=True
-                )
-                continue
-
-            os.makedirs(
-                os.path.dirname(target),
-                exist_ok=True
-            )
-
-            with zip_file.open(
-                member,
-                "r"
-            ) as source:
-
-                with open(
-                    target,
-                    "wb"
-                ) as destination:
-
-                    shutil.copyfileobj(
-                        source,
-                        destination
-                    )
-
-            extracted_count += 1
-
-    return extracted_count
-
-
 # ============================================================
 # SRT TIMESTAMP
 # ============================================================
@@ -306,7 +228,8 @@ def generate_subtitle_sync(
     model,
     video_path,
     srt_path,
-    progress_callback=None
+    progress_callback=None,
+    token=None
 ):
 
     segments, info = model.transcribe(
@@ -327,6 +250,12 @@ def generate_subtitle_sync(
 
         for segment in segments:
 
+            # Cancel lands between segments,
+            # the generator stops decoding here
+            if token:
+
+                token.check()
+
             segment_count += 1
 
             start = format_timestamp(
@@ -384,28 +313,18 @@ async def generate_subtitle(
     status_message,
     current_index,
     total_files,
-    filename
+    filename,
+    token=None,
+    status_line=None
 ):
 
     loop = asyncio.get_running_loop()
 
-    last_update = {
-        "time": 0
-    }
-
     def progress_callback(
         current_seconds,
         segment_count
     ):
 
-        now = time.time()
-
-        # Throttle Telegram updates
-        if now - last_update["time"] < 2:
-            return
-
-        last_update["time"] = now
-
         minutes = int(
             current_seconds // 60
         )
@@ -428,10 +347,18 @@ async def generate_subtitle(
             f"⚙️ <b>Whisper is processing...</b>"
         )
 
+        # Where the other pipeline stages are
+        if status_line:
+
+            text += f"\n\n{status_line()}"
+
+        # The hub drops this if the chat
+        # is out of edit budget
         asyncio.run_coroutine_threadsafe(
-            _edit(
+            hub.update(
                 status_message,
-                text
+                text,
+                cancel_markup(status_message)
             ),
             loop
         )
@@ -441,56 +368,340 @@ async def generate_subtitle(
         model,
         video_path,
         srt_path,
-        progress_callback
+        progress_callback,
+        token
     )
 
     return result
 
 
 # ============================================================
-# COUNTDOWN
+# PIPELINE
+#
+# ffmpeg pulls 16 kHz mono audio out of the next episodes
+# while Whisper works on the current one, and finished SRTs
+# upload in the background. Bounded queues keep the stages
+# in step, so at most AUDIO_AHEAD WAVs wait on disk.
 # ============================================================
 
-async def countdown(
+# Decoded episodes waiting for Whisper
+AUDIO_AHEAD = 2
+
+# Finished subtitles waiting for the uploader
+UPLOAD_AHEAD = 4
+
+
+async def extract_audio(
+    video_path,
+    audio_path,
+    token=None
+):
+
+    # Whisper resamples to 16 kHz mono anyway,
+    # doing it here keeps the decode off its thread
+    result = await run_media(
+        [
+            "ffmpeg", "-y",
+            "-i", video_path,
+            "-map", "0:a:0",
+            "-vn",
+            "-ac", "1",
+            "-ar", "16000",
+            "-c:a", "pcm_s16le",
+            audio_path
+        ],
+        token
+    )
+
+    if result.returncode != 0 or not os.path.exists(audio_path):
+
+        raise RuntimeError(
+            f"ffmpeg could not extract audio "
+            f"(exit {result.returncode})"
+        )
+
+
+async def subtitle_pipeline(
+    bot,
     sts,
-    processed,
-    total,
-    next_filename,
-    seconds
+    videos,
+    work_dir,
+    token
 ):
 
-    processed_text = "\n".join(
-        f"  ├─ ✅ {name}"
-        for name in processed
+    total_files = len(
+        videos
     )
 
-    if not processed_text:
-        processed_text = "  └─ None"
+    audio_dir = os.path.join(
+        work_dir,
+        "audio"
+    )
 
-    for remaining in range(
-        seconds,
-        0,
-        -1
-    ):
+    os.makedirs(
+        audio_dir,
+        exist_ok=True
+    )
 
-        text = (
-            f"⏳ <b>Preparing Next Subtitle</b>\n\n"
-            f"📊 <b>Progress:</b> "
-            f"{len(processed)}/{total}\n\n"
-            f"📋 <b>Completed Files</b>\n"
-            f"{processed_text}\n\n"
-            f"🎬 <b>Next:</b>\n"
-            f"<code>{next_filename}</code>\n\n"
-            f"🚀 Starting in "
-            f"<b>{remaining}s</b>..."
+    audio_queue = asyncio.Queue(
+        maxsize=AUDIO_AHEAD
+    )
+
+    upload_queue = asyncio.Queue(
+        maxsize=UPLOAD_AHEAD
+    )
+
+    state = {
+        "decoded": 0,
+        "processed": [],
+        "failed": []
+    }
+
+    def status_line():
+
+        return (
+            f"🎧 <b>Decoded:</b> {state['decoded']}/{total_files} • "
+            f"📤 <b>Sent:</b> {len(state['processed'])}/{total_files}"
         )
 
-        await _edit(
-            sts,
-            text
+    # --------------------------------------------------------
+    # Stage 1: ffmpeg
+    # --------------------------------------------------------
+
+    async def decoder():
+
+        for index, video_path in enumerate(
+            videos,
+            start=1
+        ):
+
+            video_name = os.path.basename(
+                video_path
+            )
+
+            audio_path = os.path.join(
+                audio_dir,
+                f"{index}.wav"
+            )
+
+            error = None
+
+            try:
+
+                await scheduler.run(
+                    "ffmpeg",
+                    lambda: extract_audio(
+                        video_path,
+                        audio_path,
+                        token
+                    ),
+                    priority=PRIORITY_LOW,
+                    name=f"gensub 🎧 {video_name}",
+                    token=token
+                )
+
+                state["decoded"] += 1
+
+            except JobCancelled:
+                raise
+
+            except Exception as e:
+
+                error = e
+
+            # Only the audio is needed from here on
+            if os.path.exists(video_path):
+
+                os.remove(
+                    video_path
+                )
+
+            await audio_queue.put(
+                (index, video_name, audio_path, error)
+            )
+
+        await audio_queue.put(
+            None
+        )
+
+    # --------------------------------------------------------
+    # Stage 2: Whisper
+    # --------------------------------------------------------
+
+    async def transcriber():
+
+        # Loads while the first episode decodes
+        model = await get_whisper_model()
+
+        while True:
+
+            item = await audio_queue.get()
+
+            if item is None:
+                break
+
+            index, video_name, audio_path, error = item
+
+            title = os.path.splitext(
+                video_name
+            )[0]
+
+            srt_path = os.path.join(
+                work_dir,
+                f"{index}.srt"
+            )
+
+            try:
+
+                if error:
+                    raise error
+
+                await scheduler.run(
+                    "whisper",
+                    lambda: generate_subtitle(
+                        model=model,
+                        video_path=audio_path,
+                        srt_path=srt_path,
+                        status_message=sts,
+                        current_index=index,
+                        total_files=total_files,
+                        filename=video_name,
+                        token=token,
+                        status_line=status_line
+                    ),
+                    priority=PRIORITY_LOW,
+                    name=f"gensub 🎙️ {video_name}",
+                    on_queue=queue_notice(
+                        sts,
+                        f"🎙️ Whisper • <code>{video_name}</code>"
+                    ),
+                    token=token
+                )
+
+            except JobCancelled:
+                raise
+
+            except Exception as e:
+
+                print(
+                    f"[GENSUB] Whisper error "
+                    f"for {video_name}: {e}"
+                )
+
+                state["failed"].append(
+                    video_name
+                )
+
+                await _edit(
+                    sts,
+                    f"❌ <b>Subtitle Generation Failed</b>\n\n"
+                    f"🎬 <code>{video_name}</code>\n\n"
+                    f"⚠️ <b>Error:</b>\n"
+                    f"<code>{str(e)[:1000]}</code>\n\n"
+                    f"⏭️ Moving to the next file..."
+                )
+
+                continue
+
+            finally:
+
+                if os.path.exists(audio_path):
+
+                    os.remove(
+                        audio_path
+                    )
+
+            await upload_queue.put(
+                (video_name, title, srt_path)
+            )
+
+        await upload_queue.put(
+            None
+        )
+
+    # --------------------------------------------------------
+    # Stage 3: uploader
+    # --------------------------------------------------------
+
+    async def uploader():
+
+        while True:
+
+            item = await upload_queue.get()
+
+            if item is None:
+                break
+
+            video_name, title, srt_path = item
+
+            try:
+
+                await scheduler.run(
+                    "net",
+                    lambda: bot.send_document(
+                        chat_id=sts.chat.id,
+                        document=srt_path,
+                        file_name=f"{title}.srt",
+                        caption=(
+                            f"📝 <b>{title}.srt</b>\n\n"
+                            f"🇬🇧 English Subtitle"
+                        )
+                    ),
+                    name=f"gensub ⬆️ {title}.srt",
+                    token=token
+                )
+
+                token.check()
+
+            except JobCancelled:
+                raise
+
+            except Exception as e:
+
+                state["failed"].append(
+                    video_name
+                )
+
+                await _edit(
+                    sts,
+                    f"❌ <b>Subtitle Upload Failed</b>\n\n"
+                    f"📝 <code>{title}.srt</code>\n\n"
+                    f"⚠️ <code>{str(e)[:1000]}</code>"
+                )
+
+                continue
+
+            state["processed"].append(
+                video_name
+            )
+
+    # --------------------------------------------------------
+    # Run all three; one failing stops the others
+    # --------------------------------------------------------
+
+    stages = [
+        asyncio.create_task(decoder()),
+        asyncio.create_task(transcriber()),
+        asyncio.create_task(uploader())
+    ]
+
+    try:
+
+        await asyncio.gather(
+            *stages
         )
 
-        await asyncio.sleep(1)
+    finally:
+
+        for stage in stages:
+            stage.cancel()
+
+        await asyncio.gather(
+            *stages,
+            return_exceptions=True
+        )
+
+    return state["processed"]
 
 
 # ============================================================
@@ -714,6 +925,12 @@ async def gensub_confirm(
 
     zip_name = job["zip_name"]
 
+    # Cancel button on the progress message
+    # stops whichever stage is running
+    cancel = CancelToken(
+        sts
+    )
+
     # --------------------------------------------------------
     # Unique working directory
     # --------------------------------------------------------
@@ -730,11 +947,13 @@ async def gensub_confirm(
         exist_ok=True
     )
 
-    zip_path = os.path.join(
-        job_dir,
-        zip_name
+    cancel.track(
+        job_dir
     )
 
+    # Filled in once the shared media cache hands us the ZIP
+    zip_path = None
+
     extract_dir = os.path.join(
         job_dir,
         "files"
@@ -778,16 +997,29 @@ async def gensub_confirm(
             job["reply_message_id"]
         )
 
-        await reply_message.download(
-            file_name=zip_path,
-            progress=progress_message,
-            progress_args=(
-                f"📥 Downloading • {zip_name}",
+        zip_path = await scheduler.run(
+            "net",
+            lambda: media_cache.acquire(
+                bot,
+                reply_message,
+                progress=progress_message,
+                progress_args=(
+                    f"📥 Downloading • {zip_name}",
+                    sts,
+                    c_time
+                )
+            ),
+            priority=PRIORITY_LOW,
+            name=f"gensub ⬇️ {zip_name}",
+            on_queue=queue_notice(
                 sts,
-                c_time
-            )
+                f"📥 Download • <code>{zip_name}</code>"
+            ),
+            token=cancel
         )
 
+        cancel.check()
+
         # ====================================================
         # DOWNLOAD COMPLETE
         # ====================================================
@@ -818,9 +1050,20 @@ async def gensub_confirm(
             f"⚙️ Extracting..."
         )
 
-        safe_extract_zip(
-            zip_path,
-            extract_dir
+        await scheduler.run(
+            "archive",
+            lambda: asyncio.to_thread(
+                safe_extract,
+                zip_path,
+                extract_dir
+            ),
+            priority=PRIORITY_LOW,
+            name=f"gensub 📂 {zip_name}",
+            on_queue=queue_notice(
+                sts,
+                f"📂 Extract • <code>{zip_name}</code>"
+            ),
+            token=cancel
         )
 
         videos = get_video_files(
@@ -879,206 +1122,20 @@ async def gensub_confirm(
             f"📂 <b>Files found:</b> {total_files}\n"
             f"🇮🇳 Hindi → 🇬🇧 English\n"
             f"📝 SRT subtitles\n\n"
-            f"⏳ First file will start shortly..."
-        )
-
-        # Requested 10-second wait
-        await asyncio.sleep(
-            10
+            f"⚙️ Decoding audio and loading Faster-Whisper..."
         )
 
-        # ====================================================
-        # LOAD MODEL ONCE
-        # ====================================================
-
-        await _edit(
-            sts,
-            "⚙️ <b>Preparing Faster-Whisper...</b>\n\n"
-            "🔄 Loading subtitle engine..."
-        )
-
-        model = await get_whisper_model()
-
         # ====================================================
         # PROCESS FILES
         # ====================================================
 
-        processed = []
-
-        for index, video_path in enumerate(
+        processed = await subtitle_pipeline(
+            bot,
+            sts,
             videos,
-            start=1
-        ):
-
-            video_name = os.path.basename(
-                video_path
-            )
-
-            title = os.path.splitext(
-                video_name
-            )[0]
-
-            srt_path = os.path.join(
-                extract_dir,
-                f"{title}.srt"
-            )
-
-            # =================================================
-            # GENERATING
-            # =================================================
-
-            await _edit(
-                sts,
-                f"🎙️ <b>Generating Subtitles</b>\n\n"
-                f"🎬 <b>Current File</b>\n"
-                f"<code>{video_name}</code>\n\n"
-                f"📊 <b>Progress:</b> "
-                f"{index}/{total_files}\n"
-                f"🇮🇳 Hindi → 🇬🇧 English\n\n"
-                f"⚙️ <b>Processing...</b>"
-            )
-
-            try:
-
-                result = await generate_subtitle(
-                    model=model,
-                    video_path=video_path,
-                    srt_path=srt_path,
-                    status_message=sts,
-                    current_index=index,
-                    total_files=total_files,
-                    filename=video_name
-                )
-
-            except Exception as e:
-
-                print(
-                    f"[GENSUB] Whisper error "
-                    f"for {video_name}: {e}"
-                )
-
-                await _edit(
-                    sts,
-                    f"❌ <b>Subtitle Generation Failed</b>\n\n"
-                    f"🎬 <code>{video_name}</code>\n\n"
-                    f"⚠️ <b>Error:</b>\n"
-                    f"<code>{str(e)[:1000]}</code>\n\n"
-                    f"⏭️ Moving to the next file..."
-                )
-
-                await asyncio.sleep(
-                    3
-                )
-
-                continue
-
-            # =================================================
-            # SUBTITLE GENERATED
-            # =================================================
-
-            processed.append(
-                video_name
-            )
-
-            await _edit(
-                sts,
-                f"✅ <b>Subtitle Generated</b>\n\n"
-                f"🎬 <b>Video:</b>\n"
-                f"<code>{video_name}</code>\n\n"
-                f"📝 <b>Subtitle:</b>\n"
-                f"<code>{title}.srt</code>\n\n"
-                f"📊 <b>Processed:</b> "
-                f"{len(processed)}/{total_files}"
-            )
-
-            await asyncio.sleep(
-                1
-            )
-
-            # =================================================
-            # UPLOAD
-            # =================================================
-
-            upload_sts = sts
-
-            await _edit(
-                upload_sts,
-                f"📤 <b>Uploading Subtitle</b>\n\n"
-                f"📝 <code>{title}.srt</code>\n"
-                f"📊 {index}/{total_files}"
-            )
-
-            c_time = time.time()
-
-            try:
-
-                await bot.send_document(
-                    chat_id=sts.chat.id,
-                    document=srt_path,
-                    file_name=f"{title}.srt",
-                    caption=(
-                        f"📝 <b>{title}.srt</b>\n\n"
-                        f"🇬🇧 English Subtitle"
-                    ),
-                    progress=progress_message,
-                    progress_args=(
-                        f"📤 Uploading • {title}.srt",
-                        upload_sts,
-                        c_time
-                    )
-                )
-
-            except Exception as e:
-
-                await _edit(
-                    sts,
-                    f"❌ <b>Subtitle Upload Failed</b>\n\n"
-                    f"📝 <code>{title}.srt</code>\n\n"
-                    f"⚠️ <code>{str(e)[:1000]}</code>"
-                )
-
-                await asyncio.sleep(
-                    3
-                )
-
-                continue
-
-            # =================================================
-            # COMPLETED FILE LIST
-            # =================================================
-
-            processed_text = "\n".join(
-                f"  ├─ ✅ {name}"
-                for name in processed
-            )
-
-            await _edit(
-                sts,
-                f"🎉 <b>Subtitle Sent Successfully</b>\n\n"
-                f"📝 <code>{title}.srt</code>\n\n"
-                f"📊 <b>Processed:</b> "
-                f"{len(processed)}/{total_files}\n\n"
-                f"📋 <b>Completed Files</b>\n"
-                f"{processed_text}"
-            )
-
-            # =================================================
-            # WAIT BEFORE NEXT FILE
-            # =================================================
-
-            if index < total_files:
-
-                next_video = os.path.basename(
-                    videos[index]
-                )
-
-                await countdown(
-                    sts=sts,
-                    processed=processed,
-                    total=total_files,
-                    next_filename=next_video,
-                    seconds=30
-                )
+            job_dir,
+            cancel
+        )
 
         # ====================================================
         # ALL FILES COMPLETE
@@ -1112,6 +1169,13 @@ async def gensub_confirm(
                 f"📦 <code>{zip_name}</code>"
             )
 
+    except JobCancelled:
+
+        await _edit(
+            sts,
+            "🚫 <b>Subtitle Process Cancelled</b>"
+        )
+
     except Exception as e:
 
         print(
@@ -1131,6 +1195,14 @@ async def gensub_confirm(
         # CLEANUP
         # ====================================================
 
+        cancel.close()
+
+        if zip_path:
+
+            media_cache.release(
+                zip_path
+            )
+
         try:
 
             if os.path.isdir(
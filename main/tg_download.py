@@ -0,0 +1,323 @@
+# main/tg_download.py
+import os
+import math
+import asyncio
+import inspect
+from collections import deque
+from pyrogram import raw, StopTransmission
+from pyrogram.errors import AuthBytesInvalid, FloodWait, FileReferenceExpired
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Auth, Session
+from config import DOWNLOAD_LOCATION, DOWNLOAD_CONNECTIONS, STREAM_BUFFER_PARTS
+from main.resume import PartManifest, download_key
+
+# Telegram serves at most 1MB per upload.GetFile and the offset has to be
+# a multiple of the limit, so every part is one aligned 1MB block.
+PART_SIZE = 1024 * 1024
+
+# Files smaller than this are not worth opening extra sessions for
+MIN_PARALLEL_SIZE = 10 * 1024 * 1024
+
+MEDIA_KINDS = ("document", "video", "audio", "animation", "voice",
+               "video_note", "sticker", "photo")
+
+# dc_id -> list of started media sessions, shared by every download
+_session_pool = {}
+_pool_lock = asyncio.Lock()
+
+
+def get_media(message):
+    """Return the media object of a message (or the media itself)"""
+    for kind in MEDIA_KINDS:
+        media = getattr(message, kind, None)
+        if media:
+            return media
+    if getattr(message, "file_id", None):
+        return message
+    return None
+
+
+def get_location(file_id: FileId):
+    if file_id.file_type == FileType.PHOTO:
+        return raw.types.InputPhotoFileLocation(
+            id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumb_size=file_id.thumbnail_size
+        )
+    return raw.types.InputDocumentFileLocation(
+        id=file_id.media_id,
+        access_hash=file_id.access_hash,
+        file_reference=file_id.file_reference,
+        thumb_size=file_id.thumbnail_size
+    )
+
+
+async def _new_session(client, dc_id):
+    test_mode = await client.storage.test_mode()
+
+    if dc_id == await client.storage.dc_id():
+        session = Session(
+            client, dc_id, await client.storage.auth_key(),
+            test_mode, is_media=True
+        )
+        await session.start()
+        return session
+
+    session = Session(
+        client, dc_id, await Auth(client, dc_id, test_mode).create(),
+        test_mode, is_media=True
+    )
+    await session.start()
+
+    for _ in range(3):
+        exported = await client.invoke(
+            raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+        )
+        try:
+            await session.invoke(
+                raw.functions.auth.ImportAuthorization(
+                    id=exported.id,
+                    bytes=exported.bytes
+                )
+            )
+        except AuthBytesInvalid:
+            continue
+        return session
+
+    await session.stop()
+    raise AuthBytesInvalid
+
+
+async def get_sessions(client, dc_id, count):
+    """Return `count` media sessions for a DC, opening new ones on demand"""
+    async with _pool_lock:
+        pool = _session_pool.setdefault(dc_id, [])
+        while len(pool) < count:
+            pool.append(await _new_session(client, dc_id))
+        return pool[:count]
+
+
+async def fetch_part(session, location, index, retries=5):
+    """Fetch one aligned PART_SIZE block of a file"""
+    for attempt in range(retries):
+        try:
+            r = await session.invoke(
+                raw.functions.upload.GetFile(
+                    location=location,
+                    offset=index * PART_SIZE,
+                    limit=PART_SIZE
+                ),
+                sleep_threshold=60
+            )
+            return r.bytes
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+        except FileReferenceExpired:
+            raise
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            await asyncio.sleep(1 + attempt)
+    # Only reached when the last attempts all hit FloodWait
+    raise RuntimeError(f"part {index} failed after {retries} attempts")
+
+
+async def _refresh_location(client, message):
+    """File references expire after a while, fetch the message again"""
+    fresh = await client.get_messages(message.chat.id, message.id)
+    media = get_media(fresh)
+    return get_location(FileId.decode(media.file_id))
+
+
+def _resolve_path(media, file_name):
+    media_name = getattr(media, "file_name", None) or f"{media.file_unique_id}"
+    if not file_name:
+        return os.path.join(DOWNLOAD_LOCATION, media_name)
+    directory, name = os.path.split(file_name)
+    if not directory:
+        directory = DOWNLOAD_LOCATION
+    return os.path.join(directory, name or media_name)
+
+
+def _preallocate(fd, size):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+
+async def call_progress(progress, current, total, progress_args):
+    if not progress:
+        return
+    if inspect.iscoroutinefunction(progress):
+        await progress(current, total, *progress_args)
+    else:
+        progress(current, total, *progress_args)
+
+
+async def fast_download(client, message, file_name=None, progress=None,
+                        progress_args=(), connections=DOWNLOAD_CONNECTIONS):
+    """
+    Download the media of `message` over several media sessions at once.
+    Parts are written with positional writes into a preallocated file, so
+    they can land in any order. Finished parts are recorded in a manifest,
+    a download of the same file to the same path after a crash or restart
+    only fetches what is missing. Works as a drop-in for `Message.download`.
+    """
+    media = get_media(message)
+    if not media:
+        raise ValueError("This message doesn't contain any downloadable media")
+
+    file_size = getattr(media, "file_size", 0) or 0
+    path = _resolve_path(media, file_name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if connections <= 1 or file_size < MIN_PARALLEL_SIZE:
+        return await client.download_media(
+            message, file_name=path,
+            progress=progress, progress_args=progress_args
+        )
+
+    file_id = FileId.decode(media.file_id)
+    sessions = await get_sessions(client, file_id.dc_id, connections)
+    state = {"location": get_location(file_id), "done": 0}
+    refresh_lock = asyncio.Lock()
+
+    total_parts = math.ceil(file_size / PART_SIZE)
+    temp_path = path + ".temp"
+    manifest = PartManifest(download_key(media), file_size, PART_SIZE)
+    resume = (bool(manifest.done) and os.path.exists(temp_path)
+              and os.path.getsize(temp_path) == file_size)
+    if not resume:
+        manifest.reset()
+
+    fd = os.open(temp_path, os.O_RDWR | os.O_CREAT, 0o644)
+    if not resume:
+        _preallocate(fd, file_size)
+    # Parts only count as done once they are on disk
+    manifest.sync = lambda: os.fsync(fd)
+    state["done"] = manifest.done_bytes()
+
+    queue = asyncio.Queue()
+    for index in range(total_parts):
+        if index not in manifest.done:
+            queue.put_nowait(index)
+
+    async def worker(session):
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            location = state["location"]
+            try:
+                chunk = await fetch_part(session, location, index)
+            except FileReferenceExpired:
+                async with refresh_lock:
+                    if state["location"] is location:
+                        state["location"] = await _refresh_location(client, message)
+                chunk = await fetch_part(session, state["location"], index)
+
+            await asyncio.to_thread(os.pwrite, fd, chunk, index * PART_SIZE)
+            await manifest.mark(index)
+            state["done"] += len(chunk)
+            await call_progress(progress, min(state["done"], file_size),
+                                file_size, progress_args)
+
+    tasks = [asyncio.create_task(worker(s)) for s in sessions]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException as e:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if isinstance(e, (StopTransmission, asyncio.CancelledError)):
+            # Stopped on purpose, nothing worth resuming
+            os.close(fd)
+            os.remove(temp_path)
+            manifest.discard()
+        else:
+            # Network trouble and the like, the next attempt picks up from here
+            manifest.save()
+            os.close(fd)
+        # Same contract as Message.download: a stopped transfer returns None
+        if isinstance(e, StopTransmission):
+            return None
+        raise
+
+    os.close(fd)
+    os.replace(temp_path, path)
+    manifest.discard()
+    return path
+
+
+async def stream_parts(client, message, connections=DOWNLOAD_CONNECTIONS,
+                       buffer_parts=STREAM_BUFFER_PARTS, start=0):
+    """
+    Yield the file of `message` part by part, in order, without touching disk.
+    At most `buffer_parts` parts are fetched ahead, which bounds memory use.
+    """
+    media = get_media(message)
+    file_id = FileId.decode(media.file_id)
+    sessions = await get_sessions(client, file_id.dc_id, max(1, connections))
+    location = get_location(file_id)
+    total_parts = math.ceil((media.file_size or 0) / PART_SIZE)
+
+    pending = deque()
+    next_index = start
+    try:
+        while next_index < total_parts or pending:
+            while next_index < total_parts and len(pending) < buffer_parts:
+                session = sessions[next_index % len(sessions)]
+                pending.append(asyncio.create_task(
+                    fetch_part(session, location, next_index)))
+                next_index += 1
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def read_range(client, message, offset, length):
+    """Read `length` bytes at `offset` straight from Telegram"""
+    media = get_media(message)
+    file_id = FileId.decode(media.file_id)
+    session = (await get_sessions(client, file_id.dc_id, 1))[0]
+    location = get_location(file_id)
+
+    end = min(offset + length, media.file_size or offset + length)
+    first, last = offset // PART_SIZE, (end - 1) // PART_SIZE
+    blocks = await asyncio.gather(*[
+        fetch_part(session, location, index)
+        for index in range(first, last + 1)
+    ])
+    data = b"".join(blocks)
+    skip = offset - first * PART_SIZE
+    return data[skip:skip + (end - offset)]
+
+
+class MediaStream:
+    """
+    Stand-in for a local file that send_video / send_document / send_audio
+    accept as-is: main.tg_upload pulls the parts from Telegram while uploading.
+    """
+
+    def __init__(self, client, message, name=None, connections=DOWNLOAD_CONNECTIONS,
+                 buffer_parts=STREAM_BUFFER_PARTS):
+        media = get_media(message)
+        self.client = client
+        self.message = message
+        self.size = media.file_size or 0
+        self.unique_id = media.file_unique_id
+        self.name = name or getattr(media, "file_name", None) or media.file_unique_id
+        self.connections = connections
+        self.buffer_parts = buffer_parts
+
+    def parts(self, start=0):
+        return stream_parts(self.client, self.message, self.connections,
+                            self.buffer_parts, start=start)
+
+    async def read(self, offset, length):
+        return await read_range(self.client, self.message, offset, length)
@@ -0,0 +1,260 @@
+# main/tg_upload.py
+import io
+import os
+import math
+import asyncio
+import pyrogram
+from pyrogram import raw, StopTransmission
+from pyrogram.errors import FloodWait
+from config import UPLOAD_CONNECTIONS, UPLOAD_WINDOW
+from main.tg_download import PART_SIZE, MediaStream, get_sessions, call_progress
+from main.resume import PartManifest, upload_key, UPLOAD_MAX_AGE
+from main.zip_stream import ZipStream
+
+# Telegram accepts at most 512KB per big-file part
+UPLOAD_PART_SIZE = 512 * 1024
+
+# Anything at or below this is a "small" file (md5 checked, sequential)
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+
+class _PartReader:
+    """Thread-safe positional reads for a path or a binary file object"""
+
+    def __init__(self, path):
+        self.lock = None
+        if isinstance(path, (str, os.PathLike)):
+            self.fp = open(path, "rb")
+            self.owned = True
+            self.name = os.path.basename(path)
+        else:
+            self.fp = path
+            self.owned = False
+            self.name = os.path.basename(getattr(path, "name", "file"))
+        self.fp.seek(0, os.SEEK_END)
+        self.size = self.fp.tell()
+        self.fp.seek(0)
+        try:
+            self.fd = self.fp.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            self.fd = None
+
+    async def read(self, index):
+        offset = index * UPLOAD_PART_SIZE
+        if self.fd is not None:
+            return await asyncio.to_thread(os.pread, self.fd, UPLOAD_PART_SIZE, offset)
+        # In-memory objects can't pread, serialize seek + read instead
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.fp.seek(offset)
+            return self.fp.read(UPLOAD_PART_SIZE)
+
+    def close(self):
+        if self.owned:
+            self.fp.close()
+
+
+async def send_part(session, file_id, index, total_parts, chunk, retries=5):
+    """Send one big-file part, retrying only this part on failure"""
+    for attempt in range(retries):
+        try:
+            await session.invoke(
+                raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id,
+                    file_part=index,
+                    file_total_parts=total_parts,
+                    bytes=chunk
+                ),
+                sleep_threshold=60
+            )
+            return
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            await asyncio.sleep(1 + attempt)
+    # Only reached when the last attempts all hit FloodWait
+    raise RuntimeError(f"part {index} failed after {retries} attempts")
+
+
+async def upload_file(client, path, file_id=None, file_part=0, progress=None,
+                      progress_args=(), connections=UPLOAD_CONNECTIONS,
+                      window=UPLOAD_WINDOW):
+    """
+    Replacement for Client.save_file that keeps up to `window` big-file
+    parts in flight over several media sessions. The file id and the parts
+    already sent are kept in a manifest, so an interrupted upload of the
+    same file continues instead of starting over.
+    Returns the same InputFile objects pyrogram's send_* methods expect.
+    """
+    if path is None:
+        return None
+
+    if isinstance(path, (MediaStream, ZipStream)):
+        return await upload_stream(
+            client, path, file_id=file_id, file_part=file_part,
+            progress=progress, progress_args=progress_args,
+            connections=connections, window=window
+        )
+
+    reader = _PartReader(path)
+    try:
+        if reader.size == 0:
+            raise ValueError("File size equals to 0 B")
+
+        limit_mib = 4000 if client.me.is_premium else 2000
+        if reader.size > limit_mib * 1024 * 1024:
+            raise ValueError(f"Can't upload files bigger than {limit_mib} MiB")
+
+        # Small files need an md5 over the whole file, pyrogram already does
+        # it well, FilePartMissing resends included
+        if reader.size <= BIG_FILE_SIZE:
+            reader.fp.seek(0)
+            return await pyrogram.Client.save_file(
+                client, path, file_id=file_id, file_part=file_part,
+                progress=progress, progress_args=progress_args
+            )
+
+        total_parts = math.ceil(reader.size / UPLOAD_PART_SIZE)
+        sessions = await get_sessions(client, await client.storage.dc_id(), connections)
+
+        # FilePartMissing on a big file: resend only that 512KB part
+        if file_id is not None:
+            chunk = await reader.read(file_part)
+            await send_part(sessions[0], file_id, file_part, total_parts, chunk)
+            return None
+
+        manifest = _open_manifest(path, reader.size)
+        file_id = manifest.data.setdefault("file_id", client.rnd_id())
+
+        async def chunks():
+            for index in range(total_parts):
+                if index not in manifest.done:
+                    yield index, await reader.read(index)
+
+        await _upload_tracked(
+            manifest, chunks(), sessions, file_id, total_parts, reader.size,
+            progress, progress_args, window
+        )
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=reader.name)
+    finally:
+        reader.close()
+
+
+async def upload_stream(client, stream, file_id=None, file_part=0, progress=None,
+                        progress_args=(), connections=UPLOAD_CONNECTIONS,
+                        window=UPLOAD_WINDOW):
+    """Upload a MediaStream (or ZipStream) while it is still being downloaded"""
+    big = stream.size > BIG_FILE_SIZE
+
+    # FilePartMissing on a big file: resend only that 512KB part
+    if big and file_id is not None:
+        total_parts = math.ceil(stream.size / UPLOAD_PART_SIZE)
+        sessions = await get_sessions(client, await client.storage.dc_id(), connections)
+        chunk = await stream.read(file_part * UPLOAD_PART_SIZE, UPLOAD_PART_SIZE)
+        await send_part(sessions[0], file_id, file_part, total_parts, chunk)
+        return None
+
+    if not big:
+        # Small files go up as small parts with an md5, resends included:
+        # save_file sends SaveFilePart from `file_part` on under `file_id`
+        data = io.BytesIO()
+        async for chunk in stream.parts():
+            data.write(chunk)
+        data.name = stream.name
+        return await pyrogram.Client.save_file(
+            client, data, file_id=file_id, file_part=file_part,
+            progress=progress, progress_args=progress_args
+        )
+
+    total_parts = math.ceil(stream.size / UPLOAD_PART_SIZE)
+    sessions = await get_sessions(client, await client.storage.dc_id(), connections)
+
+    # Each 1MB download part is exactly two 512KB upload parts
+    per_block = PART_SIZE // UPLOAD_PART_SIZE
+
+    manifest = _open_manifest(stream, stream.size)
+    file_id = manifest.data.setdefault("file_id", client.rnd_id())
+    missing = [i for i in range(total_parts) if i not in manifest.done]
+    # Skip the blocks that were fully sent before the interruption
+    start = missing[0] // per_block if missing else 0
+
+    async def chunks():
+        block = start
+        async for data in stream.parts(start=start):
+            for n in range(per_block):
+                index = block * per_block + n
+                piece = data[n * UPLOAD_PART_SIZE:(n + 1) * UPLOAD_PART_SIZE]
+                if piece and index not in manifest.done:
+                    yield index, piece
+            block += 1
+
+    await _upload_tracked(
+        manifest, chunks(), sessions, file_id, total_parts, stream.size,
+        progress, progress_args, window
+    )
+    return raw.types.InputFileBig(id=file_id, parts=total_parts, name=stream.name)
+
+
+def _open_manifest(source, size):
+    # In-memory sources get no key, their manifest never touches disk
+    return PartManifest(upload_key(source), size, UPLOAD_PART_SIZE, max_age=UPLOAD_MAX_AGE)
+
+
+async def _upload_tracked(manifest, chunks, sessions, file_id, total_parts, size,
+                          progress, progress_args, window):
+    """_upload_parts that keeps the manifest in sync with what was sent"""
+    try:
+        await _upload_parts(
+            chunks, sessions, file_id, total_parts, size,
+            progress, progress_args, window, manifest
+        )
+    except (StopTransmission, asyncio.CancelledError):
+        manifest.discard()
+        raise
+    except Exception:
+        manifest.save()
+        raise
+    manifest.discard()
+
+
+async def _upload_parts(chunks, sessions, file_id, total_parts, size,
+                        progress, progress_args, window, manifest=None):
+    """Send (index, bytes) pairs from `chunks` with at most `window` in flight"""
+    slots = asyncio.Semaphore(window)
+    state = {"done": manifest.done_bytes() if manifest else 0}
+    tasks = set()
+    failure = []
+
+    async def run(index, chunk, session):
+        try:
+            await send_part(session, file_id, index, total_parts, chunk)
+            if manifest:
+                await manifest.mark(index)
+            state["done"] += len(chunk)
+            await call_progress(progress, min(state["done"], size),
+                                size, progress_args)
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            slots.release()
+
+    try:
+        async for index, chunk in chunks:
+            await slots.acquire()
+            if failure:
+                break
+            session = sessions[index % len(sessions)]
+            task = asyncio.create_task(run(index, chunk, session))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await chunks.aclose()
+
+    if failure:
+        raise failure[0]
@@ -0,0 +1,202 @@
+# main/thumbgen.py
+import os
+import hashlib
+import asyncio
+import requests
+from PIL import Image, ImageFilter, ImageStat
+from config import DOWNLOAD_LOCATION
+from main.ffmpeg_runner import run_media, ProcessTimeout
+from main.probe import probe
+
+THUMB_DIR = os.path.join(DOWNLOAD_LOCATION, "thumbs")
+
+# Telegram only shows JPEG thumbnails up to 320px a side and 200KB
+MAX_SIDE = 320
+MAX_BYTES = 200 * 1024
+
+# Where in the video (or clip) the candidate frames are taken
+CANDIDATES = (0.1, 0.3, 0.5, 0.7)
+
+# Frames with a lower mean luma count as black
+MIN_BRIGHTNESS = 24
+
+# Thumbnails kept on disk, least recently used go first
+MAX_CACHED = 500
+
+os.makedirs(THUMB_DIR, exist_ok=True)
+
+
+def _cache_path(*key):
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+    return os.path.join(THUMB_DIR, f"{digest}.jpg")
+
+
+def _cached(path):
+    if os.path.exists(path):
+        os.utime(path)  # mtime doubles as the LRU stamp
+        return path
+    return None
+
+
+def _source_key(source, unique_id):
+    if unique_id:
+        return unique_id
+    if "://" in source:
+        return source
+    st = os.stat(source)
+    return (os.path.abspath(source), st.st_mtime_ns, st.st_size)
+
+
+def _prune():
+    files = [os.path.join(THUMB_DIR, f) for f in os.listdir(THUMB_DIR) if f.endswith(".jpg")]
+    files.sort(key=os.path.getmtime)
+    for path in files[:-MAX_CACHED]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save_jpeg(img, out_path, aspect=None):
+    """Write `img` as a Telegram-ready thumbnail, center-cropped to `aspect` (w, h)"""
+    img = img.convert("RGB")
+    if aspect and all(aspect):
+        ratio = aspect[0] / aspect[1]
+        if img.width / img.height > ratio:
+            width = round(img.height * ratio)
+            left = (img.width - width) // 2
+            img = img.crop((left, 0, left + width, img.height))
+        else:
+            height = round(img.width / ratio)
+            top = (img.height - height) // 2
+            img = img.crop((0, top, img.width, top + height))
+    img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+
+    tmp = out_path + ".part"
+    for quality in (90, 80, 70, 60, 50, 40):
+        img.save(tmp, "JPEG", quality=quality, optimize=True)
+        if os.path.getsize(tmp) <= MAX_BYTES:
+            break
+    os.replace(tmp, out_path)
+    _prune()
+    return out_path
+
+
+def _score(path):
+    """
+    Sharpest frame that isn't black wins, the brightest one if they all
+    are. Edge variance stands in for focus.
+    """
+    with Image.open(path) as img:
+        gray = img.convert("L")
+        brightness = ImageStat.Stat(gray).mean[0]
+        if brightness < MIN_BRIGHTNESS:
+            return False, brightness
+        return True, ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES)).var[0]
+
+
+def _pick(frames, out_path):
+    best = max(frames, key=_score)
+    with Image.open(best) as img:
+        return save_jpeg(img, out_path)
+
+
+async def _grab(source, seconds, frame_path, token):
+    # -ss before -i seeks to the nearest keyframe instead of decoding up to it
+    try:
+        await run_media(
+            ["ffmpeg", "-y", "-ss", str(seconds), "-i", source,
+             "-map", "0:v:0", "-frames:v", "1",
+             "-vf", "scale='min(640,iw)':-2", "-q:v", "2", frame_path],
+            token, timeout=60
+        )
+    except (OSError, ProcessTimeout) as e:
+        print(f"[THUMB] Frame at {seconds:.1f}s failed: {e}")
+
+
+async def video_thumbnail(source, unique_id=None, token=None, start=0, duration=None):
+    """
+    Thumbnail for a video file or URL: the best of a few frames between
+    `start` and `start + duration` (the whole video by default).
+    Cached per source and window, so callers must not delete the result.
+    Returns None when no frame could be grabbed.
+    """
+    out_path = _cache_path("video", _source_key(source, unique_id), start, duration)
+    if _cached(out_path):
+        return out_path
+
+    if duration is None:
+        info = await probe(source, unique_id, token=token)
+        duration = max(0, info.duration - start)
+    times = [start + duration * f for f in CANDIDATES] if duration > 2 else [start]
+    frames = [f"{out_path}.{i}.jpg" for i in range(len(times))]
+    try:
+        await asyncio.gather(*[_grab(source, t, f, token) for t, f in zip(times, frames)])
+        grabbed = [f for f in frames if os.path.exists(f) and os.path.getsize(f) > 0]
+        if not grabbed:
+            return None
+        return await asyncio.to_thread(_pick, grabbed, out_path)
+    finally:
+        for f in frames:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+async def image_thumbnail(image_path, key, aspect=None):
+    """Telegram-ready copy of an image file, cached under `key`"""
+    out_path = _cache_path("image", key, aspect)
+    if _cached(out_path):
+        return out_path
+
+    def convert():
+        with Image.open(image_path) as img:
+            return save_jpeg(img, out_path, aspect)
+
+    try:
+        return await asyncio.to_thread(convert)
+    except OSError as e:
+        print(f"[THUMB] {os.path.basename(image_path)}: {e}")
+        return None
+
+
+async def url_thumbnail(url, aspect=None):
+    """Thumbnail from an image URL (yt-dlp `thumbnail`), None if it can't be fetched"""
+    if not url:
+        return None
+    out_path = _cache_path("image", url, aspect)
+    if _cached(out_path):
+        return out_path
+
+    source = out_path + ".src"
+    try:
+        resp = await asyncio.to_thread(requests.get, url, timeout=30)
+        if resp.status_code != 200:
+            return None
+        with open(source, "wb") as f:
+            f.write(resp.content)
+        return await image_thumbnail(source, url, aspect)
+    except requests.RequestException as e:
+        print(f"[THUMB] {url}: {e}")
+        return None
+    finally:
+        if os.path.exists(source):
+            os.remove(source)
+
+
+async def telegram_thumbnail(client, media):
+    """The thumbnail Telegram already has for `media`, None if it has none"""
+    thumbs = getattr(media, "thumbs", None)
+    if not thumbs:
+        return None
+    key = thumbs[0].file_unique_id
+    out_path = _cache_path("image", key, None)
+    if _cached(out_path):
+        return out_path
+
+    source = os.path.abspath(out_path + ".src")
+    try:
+        await client.download_media(thumbs[0].file_id, file_name=source)
+        return await image_thumbnail(source, key)
+    finally:
+        if os.path.exists(source):
+            os.remove(source)
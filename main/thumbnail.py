@@ -2,12 +2,10 @@ from pyrogram import Client, filters
 from config import ADMIN, DOWNLOAD_LOCATION
 import os
 
-dir = os.listdir(DOWNLOAD_LOCATION)
-
-
 @Client.on_message(filters.private & filters.photo & filters.user(ADMIN))
 async def set_tumb(bot, msg):
-    if len(dir) == 0:
+    # DOWNLOAD_LOCATION also holds the media cache, so check the thumb itself
+    if not os.path.exists(f"{DOWNLOAD_LOCATION}/thumbnail.jpg"):
         await bot.download_media(message=msg.photo.file_id, file_name=f"{DOWNLOAD_LOCATION}/thumbnail.jpg")
         return await msg.reply(f"Your permanent thumbnail is saved in dictionary ✅️ \nif you change yur server or recreate the server app to again reset your thumbnail⚠️")
     else:
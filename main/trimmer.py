@@ -1,16 +1,37 @@
 # main/trimmer.py
 import os
+import re
 import time
-import subprocess
+import shutil
+import asyncio
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config import DOWNLOAD_LOCATION, ADMIN, VID_TRIMMER_URL
-from main.utils import progress_message, humanbytes
+from config import DOWNLOAD_LOCATION, ADMIN, VID_TRIMMER_URL, TRIM_MODE, TRIM_RANGED_SHARE
+from main.utils import progress_message, encode_progress, humanbytes
+from main.media_cache import media_cache
+from main.scheduler import scheduler, queue_notice, JobCancelled
+from main.cancel import CancelToken, cancel_markup
+from main.ffmpeg_runner import run_media, probe_json, ProcessTimeout
+from main.probe import probe
+from main.range_server import range_server
+from main.thumbgen import video_thumbnail
 from main.downloader.ytdl_text import VID_TRIMMER_TEXT
 
 # In-memory store for per-chat trimming state
 trim_data = {}
 
+# Source codecs a smart cut can encode a matching head for
+SMART_CODECS = {"h264", "hevc"}
+
+# Stream fields the encoded head and the copied tail must agree on
+JOIN_FIELDS = ("codec_name", "profile", "width", "height", "pix_fmt")
+
+# How far past the start a smart cut looks for the next keyframe
+KEYFRAME_WINDOW = 30
+
+# Most ranges one trim job takes
+MAX_RANGES = 20
+
 # ⏰ Convert HH:MM:SS → seconds
 
 
@@ -31,6 +52,34 @@ def seconds_to_hms(s: int):
     sec = s % 60
     return f"{h:02d}:{m:02d}:{sec:02d}"
 
+# 📋 "HH:MM:SS HH:MM:SS" per line (or separated by , ;) → [(start, end)]
+
+
+def parse_ranges(text: str):
+    ranges = []
+    for line in re.split(r"[\n,;]+", text.strip()):
+        if not line.strip():
+            continue
+        start_txt, end_txt = line.split()
+        start_s, end_s = hms_to_seconds(start_txt), hms_to_seconds(end_txt)
+        if end_s <= start_s:
+            raise ValueError(f"{line.strip()}: end must be after start")
+        ranges.append((start_s, end_s))
+    if not ranges or len(ranges) > MAX_RANGES:
+        raise ValueError(f"send 1 to {MAX_RANGES} ranges")
+    return ranges
+
+# 🌐 Cut over byte ranges when the clips are a small part of an uncached video
+
+
+def use_ranges(media_msg, ranges):
+    if TRIM_RANGED_SHARE <= 0 or media_cache.lookup(media_msg):
+        return False
+    media = media_msg.document or media_msg.video
+    total = getattr(media, "duration", 0) or 0
+    wanted = sum(end_s - start_s for start_s, end_s in ranges)
+    return total > 0 and wanted / total <= TRIM_RANGED_SHARE
+
 
 # 🎬 Trim command
 @Client.on_message(filters.private & filters.command("trim")
@@ -63,7 +112,8 @@ async def trim_receive_media(bot, msg):
     await bot.send_message(
         chat_id,
         f"📝 Please send start & end times for trimming ⏳\n\n"
-        f"➡️ Format: `HH:MM:SS HH:MM:SS`\n📂 File: `{orig_name}`",
+        f"➡️ Format: `HH:MM:SS HH:MM:SS`\n"
+        f"✂️ Several clips: one range per line\n📂 File: `{orig_name}`",
         parse_mode=enums.ParseMode.MARKDOWN
     )
 
@@ -75,33 +125,36 @@ async def trim_receive_times(bot, msg):
     if chat_id not in trim_data:
         return
 
-    try:
-        start_txt, end_txt = msg.text.strip().split()
-        start_s = hms_to_seconds(start_txt)
-        end_s = hms_to_seconds(end_txt)
-    except Exception:
-        return await msg.reply_text("❌ Invalid format!\nUse: `HH:MM:SS HH:MM:SS`", parse_mode=enums.ParseMode.MARKDOWN)
-
-    if end_s <= start_s:
-        return await msg.reply_text("⚠️ End time must be greater than start time!")
-
-    trim_data[chat_id].update({
-        "start_s": start_s,
-        "end_s": end_s,
-        "start_hms": seconds_to_hms(start_s),
-        "end_hms": seconds_to_hms(end_s)
-    })
-
-    kb = InlineKeyboardMarkup([[
-        InlineKeyboardButton("✅ Confirm", callback_data=f"trim_confirm:{chat_id}"),
-        InlineKeyboardButton("❌ Cancel", callback_data=f"trim_cancel:{chat_id}")
-    ]])
+    if "media_msg" not in trim_data[chat_id]:
+        return
 
+    try:
+        ranges = parse_ranges(msg.text)
+    except ValueError as e:
+        return await msg.reply_text(
+            f"❌ Invalid format! ({e})\nUse: `HH:MM:SS HH:MM:SS`, one range per line",
+            parse_mode=enums.ParseMode.MARKDOWN)
+
+    trim_data[chat_id]["ranges"] = ranges
+
+    if len(ranges) == 1:
+        kb = InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ Confirm", callback_data=f"trim_confirm:{chat_id}"),
+            InlineKeyboardButton("❌ Cancel", callback_data=f"trim_cancel:{chat_id}")
+        ]])
+    else:
+        kb = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"✅ {len(ranges)} Clips", callback_data=f"trim_confirm:{chat_id}"),
+             InlineKeyboardButton("🔗 Join Into One", callback_data=f"trim_join:{chat_id}")],
+            [InlineKeyboardButton("❌ Cancel", callback_data=f"trim_cancel:{chat_id}")]
+        ])
+
+    listing = "\n".join(
+        f"▶️ `{seconds_to_hms(s)}` ➡️ ⏹ `{seconds_to_hms(e)}`" for s, e in ranges)
     await bot.send_message(
         chat_id,
         f"✂️ Ready to trim `{trim_data[chat_id]['orig_name']}`\n"
-        f"▶️ Start: `{trim_data[chat_id]['start_hms']}`\n"
-        f"⏹ End: `{trim_data[chat_id]['end_hms']}`\n\n"
+        f"{listing}\n\n"
         f"👉 Confirm to start trimming!",
         reply_markup=kb,
         parse_mode=enums.ParseMode.MARKDOWN
@@ -119,74 +172,282 @@ async def trim_cancel(bot, cb):
 
 
 # ✅ Confirm trim → download → trim → upload
-@Client.on_callback_query(filters.regex(r"^trim_confirm:")
+@Client.on_callback_query(filters.regex(r"^trim_(confirm|join):")
                           & filters.user(ADMIN))
 async def trim_confirm(bot, cb):
-    chat_id = int(cb.data.split(":")[1])
+    action, chat_id = cb.data.split(":")
+    chat_id = int(chat_id)
     state = trim_data.get(chat_id)
-    if not state:
+    if not state or "ranges" not in state:
         return await cb.answer("⚠️ Session expired!", show_alert=True)
 
+    sts = await cb.message.edit_text("📥 Downloading your file...")
+    token = CancelToken(sts)
+    try:
+        await run_trim(bot, sts, token, chat_id, state, join=action == "trim_join")
+    finally:
+        token.close()
+
+
+async def run_trim(bot, sts, token, chat_id, state, join=False):
     media_msg = state["media_msg"]
     orig_name = state["orig_name"]
-    start_s, end_s = state["start_s"], state["end_s"]
-    duration = end_s - start_s
-    start_hms, end_hms = state["start_hms"], state["end_hms"]
-
-    sts = await cb.message.edit_text("📥 Downloading your file...")
-    download_path = os.path.join(
-        DOWNLOAD_LOCATION,
-        f"trim_{chat_id}_{int(time.time())}{os.path.splitext(orig_name)[1]}")
+    ranges = state["ranges"]
 
+    # ffmpeg reads the index and seeks over HTTP, only touched parts get fetched
+    ranged = use_ranges(media_msg, ranges)
     c_time = time.time()
     try:
-        downloaded = await media_msg.download(
-            file_name=download_path,
-            progress=progress_message,
-            progress_args=(f"⬇️ Downloading...\n📂 {orig_name}", sts, c_time)
-        )
+        if ranged:
+            downloaded = await range_server.publish(bot, media_msg, orig_name)
+        else:
+            downloaded = await scheduler.run(
+                "net",
+                lambda: media_cache.acquire(
+                    bot, media_msg,
+                    progress=progress_message,
+                    progress_args=(f"⬇️ Downloading...\n📂 {orig_name}", sts, c_time)
+                ),
+                name=f"trim ⬇️ {orig_name}",
+                on_queue=queue_notice(sts, f"⬇️ Download • `{orig_name}`"),
+                token=token
+            )
+    except JobCancelled:
+        return await sts.edit("🚫 Trim cancelled.")
     except Exception as e:
         return await sts.edit(f"❌ Download failed: {e}")
+    if not downloaded:
+        if token.cancelled:
+            return await sts.edit("🚫 Trim cancelled.")
+        return await sts.edit("❌ Download failed!")
 
-    # 🔹 Extract real thumbnail from downloaded video using ffmpeg
-    thumb_path = os.path.join(DOWNLOAD_LOCATION, f"thumb_{chat_id}.jpg")
-    try:
-        subprocess.run(["ffmpeg",
-                        "-y",
-                        "-i",
-                        downloaded,
-                        "-ss",
-                        "00:00:01",
-                        "-vframes",
-                        "1",
-                        thumb_path],
-                       stdout=subprocess.DEVNULL,
-                       stderr=subprocess.DEVNULL)
-    except BaseException:
-        thumb_path = None
-
-    # Paths
+    # Paths, removed straight away if the trim gets cancelled
     name_root, ext = os.path.splitext(orig_name)
-    out_path = os.path.join(DOWNLOAD_LOCATION, f"{name_root}_trimmed{ext}")
-
-    # 🎬 Fast trim
-    await sts.edit("✂️ Trimming video (fast mode)...")
-    cmd = [
-        "ffmpeg", "-y",
-        "-ss", str(start_s), "-i", downloaded,
-        "-t", str(duration),
-        "-c", "copy",
-        out_path
-    ]
-    success = subprocess.run(
-        cmd,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL).returncode == 0
+    single = len(ranges) == 1 or join
+    clips = []
+    for n, (start_s, end_s) in enumerate(ranges, 1):
+        suffix = "_trimmed" if len(ranges) == 1 else f"_clip{n:02d}"
+        clips.append({
+            "n": n,
+            "start_s": start_s,
+            "duration": end_s - start_s,
+            "path": token.track(os.path.join(DOWNLOAD_LOCATION, f"{name_root}{suffix}{ext}")),
+            "thumb": None,
+            "caption": f"🎬 **{name_root}{suffix}{ext}**\n"
+                       f"🕒 Trimmed: `{seconds_to_hms(start_s)}` ➡️ `{seconds_to_hms(end_s)}`"
+        })
+
+    # Clips go up while the next ones are still being cut
+    uploads = []
+    failed = []
+    try:
+        unique_id = (media_msg.document or media_msg.video).file_unique_id
+        async for clip in cut_clips(sts, downloaded, unique_id, clips, token):
+            if not clip["ok"]:
+                failed.append(clip["n"])
+            elif not single:
+                uploads.append(asyncio.create_task(upload_clip(bot, sts, token, chat_id, clip)))
+
+        if single and not failed:
+            clip = clips[0]
+            if join:
+                clip = await join_clips(sts, clips, name_root, ext, chat_id, token)
+                clips.append(clip)
+            uploads.append(asyncio.create_task(upload_clip(bot, sts, token, chat_id, clip)))
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+    except JobCancelled:
+        for task in uploads:
+            task.cancel()
+        return await sts.edit("🚫 Trim cancelled.")
+    except Exception as e:
+        for task in uploads:
+            task.cancel()
+        return await sts.edit(f"❌ Trimming failed: {e}")
+    finally:
+        if ranged:
+            fetched = range_server.withdraw(downloaded)
+            print(f"[TRIM] {orig_name}: cut from {humanbytes(fetched)} of byte ranges")
+        else:
+            # The source stays in the shared cache for other commands
+            media_cache.release(downloaded)
+        for clip in clips:
+            try:
+                if os.path.exists(clip["path"]):
+                    os.remove(clip["path"])
+            except BaseException:
+                pass
+
+    if token.cancelled or any(isinstance(r, JobCancelled) for r in results):
+        return await sts.edit("🚫 Trim cancelled.")
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        return await sts.edit(f"❌ Upload failed: {errors[0]}")
+    if failed:
+        if single:
+            return await sts.edit("❌ Trimming failed!")
+        return await sts.edit(f"⚠️ Trimming failed for clip(s): {', '.join(map(str, failed))}")
+
+    await sts.delete()
+    trim_data.pop(chat_id, None)
+
+
+# ✂️ Cut every clip, yielding each as soon as it's ready
+async def cut_clips(sts, downloaded, unique_id, clips, token):
+    if TRIM_MODE == "fast" and len(clips) > 1:
+        # One ffmpeg run, one seeked input and output per clip
+        ok = await scheduler.run(
+            "ffmpeg",
+            lambda: fast_cut_many(sts, downloaded, clips, token),
+            name=f"trim ✂️ {len(clips)} clips",
+            on_queue=queue_notice(sts, f"✂️ Trim • {len(clips)} clips"),
+            token=token
+        )
+        for clip in clips:
+            clip["ok"] = ok and os.path.exists(clip["path"]) and os.path.getsize(clip["path"]) > 0
+            clip["thumb"] = await clip_thumbnail(downloaded, unique_id, clip, token)
+            yield clip
+        return
+
+    for clip in clips:
+        clip["ok"] = await scheduler.run(
+            "ffmpeg",
+            lambda: trim_video(sts, downloaded, clip["path"],
+                               clip["start_s"], clip["duration"], token),
+            name=f"trim ✂️ clip {clip['n']}/{len(clips)}",
+            on_queue=queue_notice(sts, f"✂️ Trim • clip {clip['n']}/{len(clips)}"),
+            token=token
+        )
+        clip["thumb"] = await clip_thumbnail(downloaded, unique_id, clip, token)
+        yield clip
+
+
+# 🖼️ Thumbnail from the clip's own range of the source, cached per range
+async def clip_thumbnail(downloaded, unique_id, clip, token):
+    if not clip["ok"]:
+        return None
+    return await video_thumbnail(downloaded, unique_id, token,
+                                 start=clip["start_s"], duration=clip["duration"])
+
+
+# 📤 Upload one clip in the net lane
+async def upload_clip(bot, sts, token, chat_id, clip):
+    name = os.path.basename(clip["path"])
+    c_time = time.time()
+    await scheduler.run(
+        "net",
+        lambda: bot.send_video(
+            chat_id,
+            video=clip["path"],
+            caption=clip["caption"],
+            duration=int(clip["duration"]),
+            thumb=clip["thumb"],
+            progress=progress_message,
+            progress_args=(f"⬆️ Uploading...\n📂 {name}", sts, c_time)
+        ),
+        name=f"trim ⬆️ {name}",
+        on_queue=queue_notice(sts, f"⬆️ Upload • `{name}`"),
+        token=token
+    )
+    token.check()
+
+
+# 🔗 Join the cut clips losslessly into one video
+async def join_clips(sts, clips, name_root, ext, chat_id, token):
+    out_path = token.track(os.path.join(DOWNLOAD_LOCATION, f"{name_root}_joined{ext}"))
+    listing = token.track(os.path.join(DOWNLOAD_LOCATION, f"trim_{chat_id}_concat.txt"))
+    with open(listing, "w") as f:
+        f.writelines(f"file '{clip['path']}'\n" for clip in clips)
+    duration = sum(clip["duration"] for clip in clips)
+    c_time = time.time()
+    try:
+        result = await scheduler.run(
+            "ffmpeg",
+            lambda: run_media(
+                ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", listing,
+                 "-map", "0", "-c", "copy", out_path],
+                token, duration=duration,
+                progress=encode_progress,
+                progress_args=("🔗 Joining clips...", sts, c_time)
+            ),
+            name=f"trim 🔗 {name_root}",
+            on_queue=queue_notice(sts, f"🔗 Join • `{name_root}`"),
+            token=token
+        )
+    finally:
+        # A cancelled token has already removed it
+        if os.path.exists(listing):
+            os.remove(listing)
+    if result.returncode != 0:
+        raise RuntimeError("joining the clips failed")
+    for clip in clips:
+        os.remove(clip["path"])
+    return {
+        "path": out_path,
+        "thumb": clips[0]["thumb"],
+        "duration": duration,
+        "caption": f"🎬 **{os.path.basename(out_path)}**\n🔗 Joined {len(clips)} clips"
+    }
+
+
+# ⚡ Stream-copy every clip in one ffmpeg run (TRIM_MODE=fast)
+async def fast_cut_many(sts, downloaded, clips, token=None):
+    cmd = ["ffmpeg", "-y"]
+    for clip in clips:
+        cmd += ["-ss", str(clip["start_s"]), "-t", str(clip["duration"]), "-i", downloaded]
+    for i, clip in enumerate(clips):
+        cmd += ["-map", f"{i}:v:0", "-map", f"{i}:a?", "-c", "copy", clip["path"]]
+    # Inputs are read side by side, so the longest clip sets the pace
+    duration = max(clip["duration"] for clip in clips)
+    try:
+        result = await run_media(
+            cmd, token, duration=duration,
+            progress=encode_progress,
+            progress_args=(f"✂️ Trimming {len(clips)} clips (fast mode)...", sts, time.time())
+        )
+    except ProcessTimeout:
+        return False
+    return result.returncode == 0
+
+
+# 🎬 Cut one clip, runs in the scheduler's ffmpeg lane
+async def trim_video(sts, downloaded, out_path, start_s, duration, token=None):
+    success = False
+    if TRIM_MODE == "smart":
+        # 🎯 Frame-accurate cut, only the first partial GOP gets encoded
+        await sts.edit("✂️ Trimming video (smart cut)...", reply_markup=cancel_markup(sts))
+        try:
+            success = await smart_cut(sts, downloaded, out_path, start_s, duration, token)
+        except (OSError, ValueError, ProcessTimeout) as e:
+            print(f"[TRIM] Smart cut failed: {e}")
+        if not success:
+            await sts.edit("⚠️ Smart cut not possible, trimming at keyframes...",
+                           reply_markup=cancel_markup(sts))
+
+    if not success:
+        # 🎬 Fast trim, also what a failed smart cut falls back to
+        if TRIM_MODE != "smart":
+            await sts.edit("✂️ Trimming video (fast mode)...", reply_markup=cancel_markup(sts))
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(start_s), "-i", downloaded,
+            "-t", str(duration),
+            "-c", "copy",
+            out_path
+        ]
+        c_time = time.time()
+        try:
+            success = (await run_media(
+                cmd, token, duration=duration,
+                progress=encode_progress,
+                progress_args=("✂️ Trimming video (fast mode)...", sts, c_time)
+            )).returncode == 0
+        except ProcessTimeout:
+            success = False
 
     # fallback re-encode
     if not success or not os.path.exists(
             out_path) or os.path.getsize(out_path) == 0:
-        await sts.edit("⚠️ Fast trim failed. Retrying with re-encode...")
+        await sts.edit("⚠️ Fast trim failed. Retrying with re-encode...", reply_markup=cancel_markup(sts))
         cmd = [
             "ffmpeg", "-y",
             "-ss", str(start_s), "-i", downloaded,
@@ -195,38 +456,182 @@ async def trim_confirm(bot, cb):
             "-c:a", "aac", "-b:a", "128k",
             out_path
         ]
-        success = subprocess.run(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL).returncode == 0
-
-    if not success:
-        return await sts.edit("❌ Trimming failed!")
-
-    # 📤 Upload
-    caption = f"🎬 **{os.path.basename(out_path)}**\n🕒 Trimmed: `{start_hms}` ➡️ `{end_hms}`"
-    await sts.edit("📤 Uploading trimmed file...")
+        c_time = time.time()
+        try:
+            success = (await run_media(
+                cmd, token, duration=duration,
+                progress=encode_progress,
+                progress_args=("🎞️ Re-encoding trimmed part...", sts, c_time)
+            )).returncode == 0
+        except ProcessTimeout:
+            success = False
+
+    return success
+
+
+# 🔑 First keyframe at or after `start_s`, None if there's none before `end_s`
+async def next_keyframe(path, start_s, end_s, token=None):
+    window = min(end_s - start_s, KEYFRAME_WINDOW)
+    info = await probe_json(
+        path,
+        "-select_streams", "v:0",
+        "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time,best_effort_timestamp_time:format=start_time",
+        "-read_intervals", f"{start_s}%+{window}",
+        token=token
+    )
+    # ffprobe reports file timestamps, ffmpeg's -ss counts from the file start
+    offset = float(info.get("format", {}).get("start_time") or 0)
+    for frame in info.get("frames", []):
+        pts = frame.get("pts_time") or frame.get("best_effort_timestamp_time")
+        if pts in (None, "N/A"):
+            continue
+        pts = float(pts) - offset
+        if pts >= start_s - 0.001:
+            return pts if pts < end_s else None
+    return None
+
+
+# ffprobe profile -> encoder -profile:v, for encoding a head that matches the source
+X264_PROFILES = {
+    "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main",
+    "High": "high", "High 10": "high10", "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+X265_PROFILES = {"Main": "main", "Main 10": "main10", "Main Still Picture": "mainstillpicture"}
+
+
+async def video_stream(path, token=None):
+    """First video stream as ffprobe reports it"""
+    info = await probe_json(path, "-select_streams", "v:0", "-show_streams", token=token)
+    streams = info.get("streams") or [{}]
+    return streams[0]
+
+
+def matching_encoder_args(stream):
+    """
+    Encoder settings that reproduce the source's profile, level, pixel
+    format, reference frames and B-frames, None if the profile is unknown.
+    Headers go in-band so both pieces carry their own SPS/PPS(/VPS).
+    """
+    codec = stream.get("codec_name")
+    refs = max(1, int(stream.get("refs") or 1))
+    bframes = 3 if int(stream.get("has_b_frames") or 0) else 0
+    level = int(stream.get("level") or 0)
+    if codec == "h264":
+        profile = X264_PROFILES.get(stream.get("profile"))
+        if not profile:
+            return None
+        args = ["-c:v", "libx264", "-profile:v", profile,
+                "-x264-params", f"ref={refs}:bframes={bframes}"]
+        if level > 0:
+            args += ["-level:v", f"{level / 10:.1f}"]
+    elif codec == "hevc":
+        profile = X265_PROFILES.get(stream.get("profile"))
+        if not profile:
+            return None
+        params = f"ref={refs}:bframes={bframes}:repeat-headers=1"
+        if level > 0:
+            params += f":level-idc={level / 30:.1f}"
+        args = ["-c:v", "libx265", "-profile:v", profile, "-x265-params", params]
+    else:
+        return None
+    return args + ["-crf", "18", "-preset", "veryfast",
+                   "-pix_fmt", stream.get("pix_fmt") or "yuv420p"]
+
+
+# 🎯 Re-encode start → next keyframe with the source's settings, copy the rest
+async def smart_cut(sts, downloaded, out_path, start_s, duration, token=None):
+    info = await probe(downloaded, token=token)
+    if info.video_codec not in SMART_CODECS:
+        return False
+    source = await video_stream(downloaded, token)
+    encoder_args = matching_encoder_args(source)
+    if not encoder_args:
+        return False
+    end_s = start_s + duration
+    keyframe = await next_keyframe(downloaded, start_s, end_s, token)
+    if keyframe is None:
+        return False
+
+    work = out_path + ".parts"
+    os.makedirs(work, exist_ok=True)
+    if token:
+        token.track(work)
+    # MPEG-TS keeps both pieces Annex-B with their parameter sets in-band:
+    # the encoder repeats them and mp4toannexb adds the source's to the copy
+    head = os.path.join(work, "head.ts")
+    tail = os.path.join(work, "tail.ts")
+    listing = os.path.join(work, "concat.txt")
+    pieces = []
     c_time = time.time()
     try:
-        await bot.send_video(
-            chat_id,
-            video=out_path,
-            caption=caption,
-            duration=duration,
-            thumb=thumb_path if os.path.exists(thumb_path) else None,
-            progress=progress_message,
-            progress_args=(f"⬆️ Uploading...\n📂 {os.path.basename(out_path)}", sts, c_time)
+        if keyframe - start_s > 0.001:
+            cmd = [
+                "ffmpeg", "-y",
+                "-ss", str(start_s), "-i", downloaded,
+                "-t", str(keyframe - start_s),
+                "-map", "0:v:0", "-an", "-sn",
+                *encoder_args,
+                head
+            ]
+            result = await run_media(
+                cmd, token, duration=keyframe - start_s,
+                progress=encode_progress,
+                progress_args=("🎞️ Encoding up to the first keyframe...", sts, c_time)
+            )
+            if result.returncode != 0:
+                return False
+            pieces.append(head)
+
+        # Seeking a hair past the keyframe makes sure the copy starts on it
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(keyframe + 0.001), "-i", downloaded,
+            "-t", str(end_s - keyframe),
+            "-map", "0:v:0", "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+            tail
+        ]
+        result = await run_media(
+            cmd, token, duration=end_s - keyframe,
+            progress=encode_progress,
+            progress_args=("✂️ Copying from the keyframe on...", sts, c_time)
         )
-    except Exception as e:
-        return await sts.edit(f"❌ Upload failed: {e}")
-
-    # Cleanup
-    for f in [downloaded, out_path, thumb_path]:
-        try:
-            if f and os.path.exists(f):
-                os.remove(f)
-        except BaseException:
-            pass
-
-    await sts.delete()
-    trim_data.pop(chat_id, None)
+        if result.returncode != 0:
+            return False
+        pieces.append(tail)
+
+        # PPS contents may differ, the tail's in-band copies take over at its
+        # keyframe; a different profile, size or pixel format can't be joined
+        if head in pieces:
+            head_stream = await video_stream(head, token)
+            tail_stream = await video_stream(tail, token)
+            if any(head_stream.get(k) != tail_stream.get(k) for k in JOIN_FIELDS):
+                print("[TRIM] Head and tail streams don't match, cutting at keyframes instead")
+                return False
+
+        with open(listing, "w") as f:
+            f.writelines(f"file '{p}'\n" for p in pieces)
+
+        # Joined video + audio copied straight from the source range
+        cmd = [
+            "ffmpeg", "-y",
+            "-f", "concat", "-safe", "0", "-i", listing,
+            "-ss", str(start_s), "-t", str(duration), "-i", downloaded,
+            "-map", "0:v:0", "-map", "1:a?",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+            out_path
+        ]
+        result = await run_media(
+            cmd, token, duration=duration,
+            progress=encode_progress,
+            progress_args=("🔗 Joining trimmed parts...", sts, c_time)
+        )
+        return (result.returncode == 0 and os.path.exists(out_path)
+                and os.path.getsize(out_path) > 0)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        if token:
+            token.untrack(work)
@@ -1,4 +1,7 @@
 from pyrogram.types import *
+from pyrogram import StopTransmission
+from main.cancel import get_token
+from main.progress_hub import hub
 import math
 import os
 import time
@@ -19,6 +22,20 @@ PROGRESS_BAR = (
     "╰━━━━━━━━━━━━━━━➣"
 )
 
+# Same look for ffmpeg jobs, media time instead of bytes
+ENCODE_BAR = (
+    "\n╭━━━━❰ ᴘʀᴏɢʀᴇss ʙᴀʀ ❱━━━━━━━━━━➣\n"
+    "┃\n"
+    "┣ ⪼ [{bar}] {a}%\n"
+    "┃\n"
+    "┣ ⪼ 🎞️ **Pᴏsɪᴛɪᴏɴ: {b} | {c}**\n"
+    "┃\n"
+    "┣ ⪼ 🚀 **Sᴩᴇᴇᴅ: {d}x**\n"
+    "┃\n"
+    "┣ ⪼ ⏰️ **Eᴛᴀ: {f}**\n"
+    "╰━━━━━━━━━━━━━━━➣"
+)
+
 # Function to generate a gradient-style progress bar
 
 
@@ -30,27 +47,20 @@ def generate_progress_bar(percentage, length=20):
     return bar
 
 
-# Store last update time per message to prevent spam
-message_update_times = {}
+async def progress_message(current, total, ud_type, message, start):
+    # Cancel pressed: pyrogram and main.tg_download drop the transfer on this
+    token = get_token(message)
+    if token and token.cancelled:
+        raise StopTransmission
 
+    # main.progress_hub decides how often this message may be edited
+    final = current == total
+    if not hub.due(message, final):
+        return
 
-async def progress_message(current, total, ud_type, message, start):
     now = time.time()
     diff = now - start
 
-    # Get message identifier for tracking
-    msg_id = f"{message.chat.id}_{message.id}" if hasattr(
-        message, 'id') else str(
-        id(message))
-
-    # More frequent updates - every 1 second instead of 10
-    if msg_id in message_update_times:
-        time_since_last = now - message_update_times[msg_id]
-        if time_since_last < 1.0 and current != total:  # Update every 1 second
-            return
-
-    message_update_times[msg_id] = now
-
     # Avoid division by zero
     if diff <= 0:
         diff = 0.1
@@ -82,26 +92,38 @@ async def progress_message(current, total, ud_type, message, start):
         f=estimated_total_time if estimated_total_time != '' else "0 s"
     )
 
-    try:
-        # Cancel button
-        chance = [[InlineKeyboardButton("🚫 Cancel", callback_data="del")]]
-
-        # Try to update the message
-        full_text = "{}\n{}".format(ud_type, tmp)
-
-        if hasattr(message, 'edit'):
-            await message.edit(text=full_text, reply_markup=InlineKeyboardMarkup(chance))
-        elif hasattr(message, 'edit_text'):
-            await message.edit_text(full_text, reply_markup=InlineKeyboardMarkup(chance))
-        elif hasattr(message, 'edit_caption'):
-            await message.edit_caption(caption=full_text, reply_markup=InlineKeyboardMarkup(chance))
-
-    except Exception as e:
-        # Handle rate limiting more gracefully
-        if "Too Many Requests" in str(e) or "FLOOD_WAIT" in str(e):
-            # Increase update interval for this message
-            message_update_times[msg_id] = now + 2  # Wait 2 extra seconds
-        pass
+    # Cancel button
+    chance = [[InlineKeyboardButton("🚫 Cancel", callback_data="del")]]
+    full_text = "{}\n{}".format(ud_type, tmp)
+
+    # Unchanged text, budget and FLOOD_WAIT are all handled by the hub
+    await hub.update(message, full_text, InlineKeyboardMarkup(chance), final=final)
+
+
+async def encode_progress(done, total, speed, ud_type, message, start):
+    """progress callback for main.ffmpeg_runner.run_media"""
+    final = done >= total
+    if not hub.due(message, final):
+        return
+
+    percentage = done * 100 / total if total > 0 else 0
+    # speed is a multiple of realtime, e.g. 2.5x
+    if speed > 0:
+        eta = TimeFormatter(int((total - done) / speed * 1000))
+    else:
+        eta = "Calculating..."
+
+    tmp = ENCODE_BAR.format(
+        bar=generate_progress_bar(percentage),
+        a=round(percentage, 1),
+        b=TimeFormatter(int(done * 1000)),
+        c=TimeFormatter(int(total * 1000)),
+        d=round(speed, 2),
+        f=eta
+    )
+    chance = [[InlineKeyboardButton("🚫 Cancel", callback_data="del")]]
+    await hub.update(message, "{}\n{}".format(ud_type, tmp),
+                     InlineKeyboardMarkup(chance), final=final)
 
 
 def humanbytes(size):
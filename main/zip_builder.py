@@ -0,0 +1,183 @@
+# main/zip_builder.py
+import os
+import asyncio
+from pyrogram import StopTransmission
+from main.utils import progress_message
+from main.media_cache import media_cache
+from main.tg_download import get_media
+from main.scheduler import scheduler, queue_notice
+from main.archive_formats import open_archive, worst_size
+
+# Members downloaded ahead of the one being packed
+DOWNLOAD_AHEAD = 3
+
+# End of central directory records (zip64 included) of one volume
+ARCHIVE_OVERHEAD = 1024
+
+
+class Member:
+    """One archive entry: a Telegram message to download or a local file"""
+
+    def __init__(self, arc_name, source):
+        self.arc_name = arc_name
+        self.source = source
+        if isinstance(source, str):
+            self.size = os.path.getsize(source)
+        else:
+            self.size = get_media(source).file_size or 0
+        self.downloaded = 0 if self.remote else self.size
+        self.packed = 0
+
+    @property
+    def remote(self):
+        return not isinstance(self.source, str)
+
+    @property
+    def worst_size(self):
+        """Bytes it can take in an archive: stored as-is plus both headers"""
+        return self.size + 512 + 2 * len(self.arc_name.encode())
+
+
+def plan_volumes(members, limit, size_of=None):
+    """
+    Group members, in order, into standalone archives that each stay under
+    `limit` bytes even if nothing compresses. `size_of(member)` bounds what
+    one member adds (stored ZIP entry by default). Returns lists of indexes.
+    """
+    size_of = size_of or (lambda member: member.worst_size)
+    volumes, current, used = [], [], ARCHIVE_OVERHEAD
+    for i, member in enumerate(members):
+        size = size_of(member)
+        if size + ARCHIVE_OVERHEAD > limit:
+            raise ValueError(f"{member.arc_name} alone is larger than a volume")
+        if current and used + size > limit:
+            volumes.append(current)
+            current, used = [], ARCHIVE_OVERHEAD
+        current.append(i)
+        used += size
+    if current:
+        volumes.append(current)
+    return volumes
+
+
+def volume_paths(zip_path, count, ext=None):
+    """name.zip when it all fits, name.part01.zip, name.part02.zip... otherwise"""
+    if count == 1:
+        return [zip_path]
+    ext = ext or os.path.splitext(zip_path)[1]
+    root = zip_path[:-len(ext)]
+    return [f"{root}.part{n:02d}{ext}" for n in range(1, count + 1)]
+
+
+class ZipBuilder:
+    """
+    Builds an archive (any main.archive_formats format) from Telegram
+    messages and/or local files. Up to DOWNLOAD_AHEAD members download at
+    once while earlier ones are packed, members land in the archive in the
+    given order, and the writers only ever run in worker threads.
+    Progress covers the whole archive: half downloading, half packing.
+    """
+
+    def __init__(self, client, members, status, token, label, fmt="zip", level="normal"):
+        self.client = client
+        self.members = members
+        self.status = status
+        self.token = token
+        self.label = label
+        self.fmt = fmt
+        self.level = level
+        self.total = sum(m.size for m in members)
+
+    def done_bytes(self):
+        return sum(min(m.downloaded, m.size) + m.packed for m in self.members) // 2
+
+    async def _report(self, start):
+        while True:
+            try:
+                await progress_message(self.done_bytes(), self.total, self.label, self.status, start)
+            except StopTransmission:
+                return
+            await asyncio.sleep(1)
+
+    async def _fetch(self, member):
+        """Local path of a member, downloaded through the shared media cache"""
+        if not member.remote:
+            return member.source
+
+        async def on_progress(current, total):
+            member.downloaded = current
+
+        path = await scheduler.run(
+            "net",
+            lambda: media_cache.acquire(self.client, member.source, progress=on_progress),
+            name=f"zip ⬇️ {member.arc_name}",
+            on_queue=queue_notice(self.status, f"📥 Download • **{member.arc_name}**"),
+            token=self.token
+        )
+        if not path:
+            self.token.check()
+            raise RuntimeError(f"download of {member.arc_name} failed")
+        member.downloaded = member.size
+        return path
+
+    async def _pack_all(self, volumes, paths, on_volume):
+        fetches = {}
+        consumed = set()
+        volume_of = {i: v for v, indexes in enumerate(volumes) for i in indexes}
+        archive, current = None, None
+
+        def prefetch(upto):
+            for i in range(len(fetches), min(upto, len(self.members))):
+                fetches[i] = asyncio.create_task(self._fetch(self.members[i]))
+
+        try:
+            for i, member in enumerate(self.members):
+                prefetch(i + 1 + DOWNLOAD_AHEAD)
+                if volume_of[i] != current:
+                    # Previous volume is complete, it can go up while this one fills
+                    if archive:
+                        await asyncio.to_thread(archive.close)
+                        await on_volume(paths[current], current + 1, len(volumes))
+                    current = volume_of[i]
+                    archive = await asyncio.to_thread(
+                        open_archive, self.fmt, paths[current], self.level)
+                path = await fetches[i]
+                consumed.add(i)
+                try:
+                    self.token.check()
+                    await asyncio.to_thread(archive.add, path, member)
+                finally:
+                    if member.remote:
+                        media_cache.release(path)
+            await asyncio.to_thread(archive.close)
+            archive = None
+            await on_volume(paths[current], current + 1, len(volumes))
+        finally:
+            if archive:
+                await asyncio.to_thread(archive.close)
+            for task in fetches.values():
+                if not task.done():
+                    task.cancel()
+            # Downloads that finished but were never packed still hold a cache ref
+            for i, task in fetches.items():
+                if (i not in consumed and self.members[i].remote and task.done()
+                        and not task.cancelled() and task.exception() is None):
+                    media_cache.release(task.result())
+
+    async def build(self, zip_path, start, on_volume, limit, ext=".zip"):
+        """
+        Write the archive, rolling over to numbered standalone volumes so
+        none exceeds `limit`. `on_volume(path, number, count)` is awaited
+        as soon as each volume is closed, before the next one fills.
+        Returns the volume paths.
+        """
+        volumes = plan_volumes(self.members, limit, lambda m: worst_size(self.fmt, m))
+        paths = volume_paths(zip_path, len(volumes), ext)
+        for path in paths:
+            self.token.track(path)
+        reporter = asyncio.create_task(self._report(start))
+        try:
+            await self._pack_all(volumes, paths, on_volume)
+        finally:
+            reporter.cancel()
+        return paths
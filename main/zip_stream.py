@@ -0,0 +1,144 @@
+# main/zip_stream.py
+import time
+import zlib
+import struct
+from main.tg_download import PART_SIZE, stream_parts, read_range
+
+# Bit 3: CRC goes in a data descriptor after the data, bit 11: UTF-8 names
+FLAGS = 0x0808
+VERSION = 20
+
+# Telegram's 2000/4000 MiB caps are below the classic ZIP limits, so a
+# volume never needs zip64 records
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def _dos_time(stamp):
+    t = time.localtime(stamp)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class ZipStream:
+    """
+    A STORED .zip of Telegram messages that is never written anywhere:
+    main.tg_upload pulls it part by part like a MediaStream. Sizes are
+    known up front, so the archive size is exact before the first byte;
+    each CRC is computed while its member streams through and goes into
+    the data descriptor that follows it and into the central directory.
+    Only the download buffers of the member being sent are ever held.
+    """
+
+    def __init__(self, client, members, name):
+        self.client = client
+        self.members = members
+        self.name = name
+        self.crcs = {}
+        self.stamp = _dos_time(time.time())
+        self.names = [m.arc_name.encode() for m in members]
+
+        # (offset, local header offset) of every member's data
+        self.layout = []
+        offset = 0
+        for i, member in enumerate(members):
+            header = offset
+            offset += 30 + len(self.names[i])
+            self.layout.append((offset, header))
+            offset += member.size + 16
+        self.central_offset = offset
+        self.central_size = sum(46 + len(n) for n in self.names)
+        self.size = offset + self.central_size + 22
+        if self.size > ZIP32_LIMIT or len(members) > 0xFFFF:
+            raise ValueError(f"{name} is too large for a single ZIP volume")
+
+    def _local_header(self, i):
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034b50, VERSION, FLAGS, 0, *self.stamp,
+            0, 0, 0, len(self.names[i]), 0
+        ) + self.names[i]
+
+    def _descriptor(self, i):
+        size = self.members[i].size
+        return struct.pack("<IIII", 0x08074b50, self.crcs[i], size, size)
+
+    def _central(self):
+        records = []
+        for i, member in enumerate(self.members):
+            records.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014b50, VERSION, VERSION, FLAGS, 0,
+                *self.stamp, self.crcs[i], member.size, member.size,
+                len(self.names[i]), 0, 0, 0, 0, 0, self.layout[i][1]
+            ) + self.names[i])
+        records.append(struct.pack(
+            "<IHHHHIIH", 0x06054b50, 0, 0, len(self.members), len(self.members),
+            self.central_size, self.central_offset, 0
+        ))
+        return b"".join(records)
+
+    async def _pieces(self):
+        """The whole archive, in order, as byte strings of any length"""
+        for i, member in enumerate(self.members):
+            yield self._local_header(i)
+            crc = 0
+            async for block in stream_parts(self.client, member.source):
+                crc = zlib.crc32(block, crc)
+                member.downloaded += len(block)
+                yield block
+            self.crcs[i] = crc
+            yield self._descriptor(i)
+        yield self._central()
+
+    async def parts(self, start=0):
+        """PART_SIZE blocks from block `start` on, like MediaStream.parts"""
+        skip = start * PART_SIZE
+        buffer = bytearray()
+        pieces = self._pieces()
+        try:
+            async for piece in pieces:
+                if skip:
+                    # Earlier bytes still stream through, the CRCs need them
+                    dropped = min(skip, len(piece))
+                    piece, skip = piece[dropped:], skip - dropped
+                buffer += piece
+                while len(buffer) >= PART_SIZE:
+                    yield bytes(buffer[:PART_SIZE])
+                    del buffer[:PART_SIZE]
+            if buffer:
+                yield bytes(buffer)
+        finally:
+            await pieces.aclose()
+
+    async def read(self, offset, length):
+        """
+        Bytes at `offset` for resending a lost part. Only ranges whose CRCs
+        are already known can be rebuilt, which covers every part that was
+        sent before.
+        """
+        end = min(offset + length, self.size)
+        out = bytearray()
+        while offset < end:
+            chunk = await self._read_at(offset, end)
+            out += chunk
+            offset += len(chunk)
+        return bytes(out)
+
+    async def _read_at(self, offset, end):
+        """Bytes from `offset` up to `end` or the next segment boundary"""
+        if offset >= self.central_offset:
+            data = self._central()
+            start = offset - self.central_offset
+            return data[start:start + end - offset]
+        for i, (data_offset, header) in enumerate(self.layout):
+            size = self.members[i].size
+            if offset < data_offset:
+                data = self._local_header(i)[offset - header:]
+            elif offset < data_offset + size:
+                stop = min(end, data_offset + size)
+                return await read_range(self.client, self.members[i].source,
+                                        offset - data_offset, stop - offset)
+            elif offset < data_offset + size + 16:
+                data = self._descriptor(i)[offset - data_offset - size:]
+            else:
+                continue
+            return data[:end - offset]
+        raise ValueError(f"offset {offset} is past the end of {self.name}")